@@ -0,0 +1,105 @@
+"""Benchmark: ``difflib.unified_diff`` vs :mod:`diffs` on large files.
+
+Generates synthetic source files of tens of thousands of lines, applies a
+batch of random edits, and times producing the patch with both engines,
+plus applying it with :func:`diffs.apply_patch`. The ``repetitive`` case is
+mostly blank lines and ``pass`` bodies, which is where difflib degrades.
+
+Run from the repository root::
+
+    python benchmarks/diff_engine.py [lines] [edits]
+"""
+
+from __future__ import annotations
+
+import difflib
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from diffs import apply_patch, diff_files, unified_diff
+
+
+def _source(lines: int, rnd: random.Random) -> list[str]:
+    out = []
+    for i in range(lines // 4):
+        out += [f"def func_{i}(x):\n", f"    y = x * {rnd.randint(0, 99)}\n"]
+        out += ["    return y\n", "\n"]
+    return out
+
+
+def _repetitive(lines: int, rnd: random.Random) -> list[str]:
+    # boilerplate with a unique header every 25 lines, like generated fixtures
+    return [
+        f"# case {i}\n" if i % 25 == 0 else rnd.choice(["    pass\n", "\n", "}\n"])
+        for i in range(lines)
+    ]
+
+
+def _edit(lines: list[str], edits: int, rnd: random.Random) -> list[str]:
+    lines = list(lines)
+    for k in range(edits):
+        at = rnd.randrange(len(lines))
+        if k % 3 == 0:
+            lines.insert(at, f"    # note {k}\n")
+        elif k % 3 == 1:
+            del lines[at]
+        else:
+            lines[at] = f"    changed_{k} = {k}\n"
+    return lines
+
+
+def _time(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def case(before: list[str], after: list[str]) -> dict:
+    old, new = "".join(before), "".join(after)
+    patch = "".join(unified_diff(old, new, "a/f.py", "b/f.py"))
+    assert apply_patch({"f.py": old}, patch) == {"f.py": new}
+    return {
+        "lines": len(before),
+        "difflib_s": _time(
+            lambda: "".join(difflib.unified_diff(before, after, "a/f.py", "b/f.py"))
+        ),
+        "diffs_s": _time(lambda: "".join(unified_diff(old, new, "a/f.py", "b/f.py"))),
+        "apply_s": _time(lambda: apply_patch({"f.py": old}, patch)),
+        "patch_bytes": len(patch),
+    }
+
+
+def main(lines: int = 20_000, edits: int = 200) -> dict:
+    rnd = random.Random(0)
+    results = {}
+    for name, make in (("source", _source), ("repetitive", _repetitive)):
+        before = make(lines, rnd)
+        result = case(before, _edit(before, edits, rnd))
+        result["speedup"] = result["difflib_s"] / result["diffs_s"]
+        results[name] = result
+
+    tree = {f"pkg/mod_{i}.py": "".join(_source(lines // 20, rnd)) for i in range(20)}
+    changed = {
+        path: "".join(_edit(text.splitlines(keepends=True), edits // 20, rnd))
+        for path, text in tree.items()
+    }
+    results["multi_file"] = {
+        "files": len(tree),
+        "diffs_s": _time(lambda: "".join(diff_files(tree, changed))),
+        "apply_s": _time(lambda: apply_patch(tree, "".join(diff_files(tree, changed)))),
+    }
+    return results
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(json.dumps(main(n, k), indent=2))
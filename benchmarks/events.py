@@ -0,0 +1,82 @@
+"""Micro-benchmark: per-event cost of encoding graph events for SSE.
+
+Compares the original path (recursive ``asdict`` then ``json.dumps`` per
+subscriber) with :mod:`events`, which encodes each event once with
+precompiled contract encoders, in full and delta form.
+
+Run from the repository root::
+
+    python benchmarks/events.py [iterations] [subscribers]
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import timeit
+from dataclasses import asdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from contracts import Critique, Patch, Tests
+from events import EventEncoder
+
+TESTS = Tests(code="def test_upload():\n    assert False\n" * 100)
+PATCH = Patch(diff="-    assert False\n+    assert True\n" * 100)
+EVENTS = [
+    {"tests": {"tests": TESTS}},
+    {"code": {"patch": PATCH}},
+    {"critic": {"critique": Critique(score=0.5, feedback="needs work")}},
+    {"code": {"patch": PATCH}},
+]
+
+
+def _serialise(val):
+    if hasattr(val, "__dataclass_fields__"):
+        return asdict(val)
+    if isinstance(val, dict):
+        return {k: _serialise(v) for k, v in val.items()}
+    return val
+
+
+def original(subscribers: int) -> int:
+    size = 0
+    for event in EVENTS:
+        serialised = {k: _serialise(v) for k, v in event.items()}
+        for _ in range(subscribers):
+            size += len(json.dumps(serialised))
+    return size
+
+
+def encoded(subscribers: int, delta: bool) -> int:
+    encoder = EventEncoder()
+    size = 0
+    for event in EVENTS:
+        payload = encoder.encode(event)
+        size += len(payload.delta if delta else payload.full) * subscribers
+    return size
+
+
+def main(iterations: int = 2000, subscribers: int = 2) -> dict:
+    per_event = iterations * len(EVENTS)
+    results = {
+        "original_us": timeit.timeit(lambda: original(subscribers), number=iterations)
+        / per_event
+        * 1e6,
+        "encoder_us": timeit.timeit(
+            lambda: encoded(subscribers, False), number=iterations
+        )
+        / per_event
+        * 1e6,
+        "full_bytes": encoded(subscribers, False),
+        "delta_bytes": encoded(subscribers, True),
+    }
+    results["speedup"] = results["original_us"] / results["encoder_us"]
+    return results
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    subs = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    print(json.dumps(main(n, subs), indent=2))
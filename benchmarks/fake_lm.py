@@ -0,0 +1,117 @@
+"""Deterministic stand-in for ``dspy.LM`` used by the offline benchmarks.
+
+The fake answers every prompt in DSPy's chat-adapter format, filling each
+requested output field from ``RESPONSES`` (or ``"ok"``), after sleeping for
+a fixed ``latency``. It never touches the network, so timings measure this
+project's overhead plus a known, configurable model delay.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+import warnings
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import dspy
+
+RESPONSES = {
+    "endpoint": "/files",
+    "method": "POST",
+    "request_schema": "{}",
+    "response_schema": "{}",
+    "spec": "- accept a file upload",
+    "code": "def upload(file):\n    return file",
+    "evaluation": "looks good",
+}
+
+_OUTPUT_FIELDS = re.compile(r"Your output fields are:\n((?:\d+\. `\w+`.*\n)+)")
+_FIELD = re.compile(r"\d+\. `(\w+)`")
+
+
+class _Response(dict):
+    """OpenAI-style response dict whose keys also read as attributes, the
+    way dspy's usage tracking reads ``response.usage``."""
+
+    def __getattr__(self, name: str):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class FakeLM(dspy.BaseLM):
+    """Chat LM that returns canned field values after ``latency`` seconds."""
+
+    def __init__(self, latency: float = 0.0, tokens: int = 64):
+        super().__init__("fake/bench", cache=False)
+        self.latency = latency
+        self.tokens = tokens
+        self.calls = 0
+
+    def _response(self, messages: list[dict] | None) -> dict:
+        self.calls += 1
+        system = messages[0]["content"] if messages else ""
+        match = _OUTPUT_FIELDS.search(system)
+        fields = _FIELD.findall(match.group(1)) if match else []
+        text = "".join(
+            f"[[ ## {name} ## ]]\n{RESPONSES.get(name, 'ok')}\n\n" for name in fields
+        )
+        return _Response(
+            {
+                "id": f"fake-{self.calls}",
+                "model": self.model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {
+                            "role": "assistant",
+                            "content": text + "[[ ## completed ## ]]",
+                        },
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": self.tokens // 2,
+                    "completion_tokens": self.tokens - self.tokens // 2,
+                    "total_tokens": self.tokens,
+                },
+            }
+        )
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._response(messages)
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._response(messages)
+
+
+@contextmanager
+def fake_lm(latency: float = 0.0) -> Iterator[FakeLM]:
+    """Install a :class:`FakeLM` as the global DSPy LM for the block.
+
+    Also gives ``spec_agent`` an uncompiled predictor bound to the fake, so
+    no SIMBA pass or artifact lookup runs against it and the pooled
+    OpenRouter LM is never called.
+    """
+    from nodes import spec_agent
+
+    lm = FakeLM(latency)
+    previous_lm = dspy.settings.lm
+    previous_predictor = spec_agent.spec_predictor
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        dspy.configure(lm=lm)
+        spec_agent.spec_predictor = spec_agent._new_predictor()
+        spec_agent.spec_predictor.set_lm(lm)
+        try:
+            yield lm
+        finally:
+            spec_agent.spec_predictor = previous_predictor
+            dspy.configure(lm=previous_lm)
@@ -0,0 +1,117 @@
+"""Benchmark: goodput against a rate-limited provider.
+
+A simulated provider accepts ``quota`` requests per one-second sliding
+window and answers the rest with 429. ``workers`` threads each make
+``calls`` calls, first retrying a 429 at once (the old behaviour), then
+through :class:`ratelimit.RateLimiter` sized to the quota. Reports
+successful calls (and their rate), requests the provider saw, 429s and
+calls that gave up.
+
+Run from the repository root::
+
+    python benchmarks/rate_limiting.py [quota]
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from ratelimit import RateLimiter
+
+RETRIES = 5
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class Provider:
+    """``quota`` requests per second, ``latency`` seconds each."""
+
+    def __init__(self, quota: int, latency: float = 0.005):
+        self.quota = quota
+        self.latency = latency
+        self.requests = 0
+        self.rejected = 0
+        self._recent: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def __call__(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.quota:
+                self.rejected += 1
+                raise RateLimited()
+            self._recent.append(now)
+        time.sleep(self.latency)
+        return "ok"
+
+
+def _naive(provider: Provider) -> str:
+    for attempt in range(RETRIES + 1):
+        try:
+            return provider()
+        except RateLimited:
+            if attempt == RETRIES:
+                raise
+    raise AssertionError("unreachable")
+
+
+def _run(call: Callable[[], str], provider: Provider, workers: int, calls: int):
+    failed = 0
+
+    def worker() -> None:
+        nonlocal failed
+        for _ in range(calls):
+            try:
+                call()
+            except RateLimited:
+                failed += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        for _ in range(workers):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - start
+    done = workers * calls - failed
+    return {
+        "succeeded": done,
+        "succeeded_per_s": done / elapsed,
+        "elapsed_s": elapsed,
+        "provider_requests": provider.requests,
+        "rejected_429": provider.rejected,
+        "gave_up": failed,
+    }
+
+
+def main(quota: int = 50, workers: int = 8, calls: int = 25) -> dict:
+    provider = Provider(quota)
+    naive = _run(lambda: _naive(provider), provider, workers, calls)
+
+    provider = Provider(quota)
+    # a little under the quota, with a small burst: a token bucket admits
+    # burst + rate * t in any window t, and this provider's window slides
+    limiter = RateLimiter(
+        rpm=quota * 60 * 0.95, path=None, burst=0.05, backoff=0.05, retries=RETRIES
+    )
+    limited = _run(lambda: limiter.call(provider), provider, workers, calls)
+    return {"quota_per_s": quota, "immediate_retry": naive, "rate_limited": limited}
+
+
+if __name__ == "__main__":
+    logging.getLogger("ratelimit").setLevel(logging.ERROR)
+    q = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(json.dumps(main(q), indent=2))
@@ -0,0 +1,80 @@
+"""Benchmark: cold and warm refresh of :class:`repo_index.RepoIndex`.
+
+Writes a synthetic repository of ``files`` small modules, then times the
+first (cold) index build, a refresh with nothing changed, a refresh after
+touching one file's mtime and editing another, and a context query.
+
+Run from the repository root::
+
+    python benchmarks/repo_indexing.py [files]
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from repo_index import RepoIndex
+
+MODULE = '''"""Module {i}."""
+from pkg{next_pkg} import mod{next_i}
+
+
+class Upload{i}:
+    """Upload handler {i}."""
+
+    def save_file(self, path: str) -> None:
+        return None
+
+
+def parse_{i}(value):
+    return value
+'''
+
+
+def _write_repo(root: Path, files: int) -> None:
+    for i in range(files):
+        pkg = root / f"pkg{i // 100}"
+        pkg.mkdir(exist_ok=True)
+        text = MODULE.format(i=i, next_pkg=(i + 1) // 100, next_i=i + 1)
+        (pkg / f"mod{i}.py").write_text(text)
+
+
+def _timed(fn) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(files: int = 10_000) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _write_repo(root, files)
+        index = RepoIndex(root)
+        cold, _ = _timed(index.refresh)
+        warm, _ = _timed(index.refresh)
+        os.utime(root / "pkg0" / "mod1.py")
+        (root / "pkg0" / "mod2.py").write_text("def changed():\n    pass\n")
+        incremental, stats = _timed(index.refresh)
+        query, context = _timed(lambda: index.context("upload a file"))
+        index.close()
+    return {
+        "files": files,
+        "cold_s": cold,
+        "unchanged_s": warm,
+        "incremental_s": incremental,
+        "incremental": stats,
+        "context_s": query,
+        "context_chars": len(context),
+    }
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    print(json.dumps(main(n), indent=2))
@@ -0,0 +1,142 @@
+"""Benchmark: near-duplicate story lookups against a large story index.
+
+Fills a :class:`story_index.StoryIndex` (SQLite file in a temp dir) with
+``stories`` synthetic user stories built from a shared vocabulary, then
+times lookups of paraphrases of stored stories (reworded boilerplate,
+plurals, the product area moved to the front) and of unseen stories.
+Reports build time, lookup latency percentiles, how often a paraphrase
+matched anything and how often that match was its own original (many
+stored stories differ from it only in the role).
+
+Run from the repository root::
+
+    python benchmarks/story_lookup.py [stories]
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from story_index import StoryIndex
+
+ROLES = ["admin", "customer", "editor", "guest", "manager", "owner", "support agent"]
+VERBS = [
+    "upload", "download", "delete", "archive", "rename", "share", "export",
+    "import", "tag", "search", "filter", "sort", "preview", "approve", "reject",
+    "schedule", "cancel", "duplicate", "move", "lock", "unlock", "restore",
+    "comment on", "subscribe to", "print", "sync", "merge", "split", "publish",
+    "review",
+]  # fmt: skip
+NOUNS = [
+    "file", "invoice", "report", "photo", "contract", "order", "ticket",
+    "playlist", "document", "folder", "project", "task", "message", "backup",
+    "receipt", "profile", "team", "calendar event", "dashboard", "comment",
+    "payment", "shipment", "note", "template", "survey", "coupon", "product",
+    "review", "article", "video",
+]  # fmt: skip
+QUALIFIERS = [
+    "from my phone", "in bulk", "by date", "for last month", "with a link",
+    "as pdf", "without logging in", "from the archive", "for my team",
+    "by owner", "in the background", "with a due date", "from email",
+    "by status", "as csv", "for a customer", "with tags", "in draft",
+]  # fmt: skip
+AREAS = [
+    "billing", "checkout", "inventory", "onboarding", "reporting", "search",
+    "settings", "support", "warehouse", "marketing", "payroll", "analytics",
+    "mobile app", "admin console", "partner portal", "help center", "crm",
+    "scheduler", "notifications", "audit log", "catalog", "loyalty program",
+    "returns", "shipping", "learning portal", "forum", "wiki", "kanban board",
+    "expense tracker", "booking system",
+]  # fmt: skip
+
+
+Parts = tuple[str, str, str, str, str]
+
+
+def story(rng: random.Random) -> Parts:
+    return (
+        rng.choice(ROLES),
+        rng.choice(VERBS),
+        rng.choice(NOUNS),
+        rng.choice(QUALIFIERS),
+        rng.choice(AREAS),
+    )
+
+
+def original(role: str, verb: str, noun: str, qualifier: str, area: str) -> str:
+    return f"As a {role} I want to {verb} a {noun} {qualifier} in the {area}"
+
+
+def paraphrase(role: str, verb: str, noun: str, qualifier: str, area: str) -> str:
+    return f"{area}: let {role}s {verb} their {noun}s {qualifier}, please"
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def _timings(index: StoryIndex, stories: list[str]) -> tuple[dict, list]:
+    seconds, matches = [], []
+    for text in stories:
+        start = time.perf_counter()
+        matches.append(index.lookup(text))
+        seconds.append(time.perf_counter() - start)
+    return {
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 3),
+        "p50_ms": round(_percentile(seconds, 50) * 1000, 3),
+        "p99_ms": round(_percentile(seconds, 99) * 1000, 3),
+    }, matches
+
+
+def main(stories: int = 100_000, lookups: int = 1000, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    parts = list({story(rng) for _ in range(stories)})
+    with tempfile.TemporaryDirectory() as tmp:
+        index = StoryIndex(path=Path(tmp) / "stories.sqlite", enabled=True)
+        start = time.perf_counter()
+        index.add_many(
+            (original(*p), {"endpoint": f"/{i}", "method": "GET"})
+            for i, p in enumerate(parts)
+        )
+        built = time.perf_counter() - start
+        size = len(index)
+
+        sample = rng.sample(range(len(parts)), min(lookups, len(parts)))
+        seen, found = _timings(index, [paraphrase(*parts[i]) for i in sample])
+        hits = sum(
+            m is not None and m.spec["endpoint"] == f"/{i}"
+            for i, m in zip(sample, found)
+        )
+        unseen_stories = [
+            f"As a visitor I want to {rng.choice(['track', 'rate', 'pin'])} "
+            f"{rng.choice(['a recipe', 'the weather', 'a parking spot'])}"
+            for _ in range(lookups)
+        ]
+        unseen, misses = _timings(index, unseen_stories)
+    return {
+        "stories": size,
+        "build_s": round(built, 2),
+        "paraphrase_lookup": {
+            **seen,
+            "matched": round(sum(m is not None for m in found) / len(sample), 3),
+            "found_original": round(hits / len(sample), 3),
+            "reusable": round(sum(bool(m and m.reuse) for m in found) / len(sample), 3),
+        },
+        "unseen_lookup": {
+            **unseen,
+            "false_matches": sum(m is not None for m in misses),
+        },
+    }
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(json.dumps(main(n), indent=2))
@@ -0,0 +1,65 @@
+"""Micro-benchmark: per-call cost of MCP envelope validation.
+
+Compares the original implementation (read schema + build validator on every
+call) with the cached :class:`utils.SchemaRegistry`.
+
+Run from the repository root::
+
+    python benchmarks/validators.py [iterations]
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from jsonschema import Draft7Validator, RefResolver
+
+from utils import validate_envelope, validate_envelopes
+
+ENVELOPE = {
+    "context": {},
+    "payload": {
+        "endpoint": "/files",
+        "method": "POST",
+        "request_schema": "{}",
+        "response_schema": "{}",
+    },
+    "tool_calls": [],
+}
+
+
+def uncached_validate(data: dict, schema_name: str) -> None:
+    schema_path = Path("schemas/mcp") / f"{schema_name}.json"
+    schema = json.loads(schema_path.read_text())
+    base = schema_path.parent.resolve().as_uri() + "/"
+    validator = Draft7Validator(
+        schema, resolver=RefResolver(base_uri=base, referrer=schema)
+    )
+    validator.validate(data)
+
+
+def main(iterations: int = 2000) -> dict:
+    validate_envelope(ENVELOPE, "spec")  # warm the registry
+    batch = [ENVELOPE] * iterations
+    results = {
+        "uncached_us": timeit.timeit(
+            lambda: uncached_validate(ENVELOPE, "spec"), number=iterations
+        ),
+        "cached_us": timeit.timeit(
+            lambda: validate_envelope(ENVELOPE, "spec"), number=iterations
+        ),
+        "batch_us": timeit.timeit(lambda: validate_envelopes(batch, "spec"), number=1),
+    }
+    results = {k: v / iterations * 1e6 for k, v in results.items()}
+    results["speedup"] = results["uncached_us"] / results["cached_us"]
+    return results
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(json.dumps(main(n), indent=2))
@@ -0,0 +1,184 @@
+"""Offline benchmark of the workflow graph and gateway with a fake LM.
+
+Every LLM call is served by :class:`fake_lm.FakeLM`, which answers after a
+fixed ``--latency``, so the numbers track this project's own overhead and
+can be compared across commits. The response cache and checkpointing are
+off by default (set ``ASGA_LLM_CACHE`` / ``ASGA_CHECKPOINT_PATH`` to
+measure them). Measures:
+
+* per-node latency of ``spec``, ``tests``, ``code``, ``critic``, ``repair``
+* end-to-end ``graph.stream`` throughput
+* gateway ``POST /jobs`` + SSE throughput at several concurrency levels
+
+Run from the repository root::
+
+    python benchmarks/workflow.py [-n 50] [--latency 0.01] [-o out.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+os.environ.setdefault("ASGA_LLM_CACHE", "0")
+os.environ.setdefault("ASGA_CHECKPOINT_PATH", "")
+
+from fake_lm import fake_lm
+from httpx import ASGITransport, AsyncClient
+
+from contracts import FeatureRequest
+from gateway import create_app
+from graph import workflow
+
+STORY = "As a user I want to upload a file"
+
+
+def _summary(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(statistics.fmean(ordered) * 1e3, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1e3, 3),
+        "p95_ms": round(
+            ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e3, 3
+        ),
+        "min_ms": round(ordered[0] * 1e3, 3),
+    }
+
+
+def _time(fn: Callable[[], Any], iterations: int) -> list[float]:
+    fn()  # warm up imports, validators and the predictor
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_nodes(iterations: int) -> dict[str, dict]:
+    """Latency of each node called directly with a representative state."""
+    state: dict[str, Any] = {"feature_request": FeatureRequest(user_story=STORY)}
+    for name in ("spec", "tests", "code", "critic"):
+        state.update(workflow.SYNC_NODES[name](state))
+    return {
+        name: _summary(_time(lambda node=node: node(state), iterations))
+        for name, node in workflow.SYNC_NODES.items()
+    }
+
+
+def bench_graph(iterations: int) -> dict[str, Any]:
+    """Sequential end-to-end runs of ``graph.stream``."""
+    graph = workflow.create_graph()
+
+    def run() -> None:
+        for _ in graph.stream({"feature_request": FeatureRequest(user_story=STORY)}):
+            pass
+
+    samples = _time(run, iterations)
+    return {
+        "runs": iterations,
+        "runs_per_s": round(len(samples) / sum(samples), 3),
+    } | _summary(samples)
+
+
+async def _gateway_level(client: AsyncClient, jobs: int, concurrency: int) -> dict:
+    slots = asyncio.Semaphore(concurrency)
+    samples: list[float] = []
+
+    async def one() -> None:
+        async with slots:
+            start = time.perf_counter()
+            res = await client.post("/jobs", json={"user_story": STORY})
+            res.raise_for_status()
+            async with client.stream("GET", f"/jobs/{res.json()['job_id']}") as sse:
+                async for _ in sse.aiter_lines():
+                    pass
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(jobs)))
+    elapsed = time.perf_counter() - start
+    return {"jobs": jobs, "jobs_per_s": round(jobs / elapsed, 3)} | _summary(samples)
+
+
+async def bench_gateway(jobs: int, levels: list[int], async_graph: bool) -> dict:
+    """``/jobs`` + SSE round trips through the ASGI app at each concurrency."""
+    app = create_app(max_pending=jobs, async_graph=async_graph)
+    results = {}
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        await _gateway_level(client, 1, 1)
+        for level in levels:
+            results[str(level)] = await _gateway_level(client, jobs, level)
+    app.state.scheduler.shutdown()
+    return results
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def main(
+    iterations: int = 50,
+    latency: float = 0.0,
+    jobs: int = 50,
+    levels: tuple[int, ...] = (1, 8, 32),
+    async_graph: bool = True,
+) -> dict:
+    with fake_lm(latency) as lm:
+        results = {
+            "meta": {
+                "commit": _commit(),
+                "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "latency_s": latency,
+                "iterations": iterations,
+                "async_graph": async_graph,
+            },
+            "nodes": bench_nodes(iterations),
+            "graph": bench_graph(iterations),
+            "gateway": asyncio.run(bench_gateway(jobs, list(levels), async_graph)),
+        }
+        results["meta"]["lm_calls"] = lm.calls
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake LM delay (s)")
+    parser.add_argument("--jobs", type=int, default=50, help="gateway jobs per level")
+    parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--sync", action="store_true", help="use the threaded graph")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    results = main(
+        args.iterations, args.latency, args.jobs, tuple(args.concurrency), not args.sync
+    )
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,30 @@
+"""Compile the SIMBA spec predictor and store it under ``ARTIFACT_DIR``.
+
+Usage::
+
+    python scripts/compile_spec.py [--force]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from nodes import spec_agent
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--force", action="store_true", help="recompile even if the artifact exists"
+    )
+    args = parser.parse_args(argv)
+    spec_agent.compile_spec_predictor(force=args.force)
+    print(spec_agent.artifact_path())
+
+
+if __name__ == "__main__":
+    main()
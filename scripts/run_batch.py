@@ -0,0 +1,60 @@
+"""Run a JSONL file of feature requests through the workflow graph.
+
+Each input line is a ``requests.jsonl`` record (``request_id``, ``title``,
+``body`` or ``user_story``). Results are written as JSONL in completion
+order; the throughput/latency/token summary is printed to stderr.
+
+Usage::
+
+    python scripts/run_batch.py requests.jsonl [-o results.jsonl] [-c 8]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import TextIO
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from batch import run_batch
+from config import BATCH_CONCURRENCY
+
+
+async def _read_lines(path: Path) -> AsyncIterator[str]:
+    with path.open() as fh:
+        for line in fh:
+            yield line
+
+
+async def _main(args: argparse.Namespace, out: TextIO) -> dict:
+    summary: dict = {}
+    async for record in run_batch(_read_lines(args.input), args.concurrency):
+        if "summary" in record:
+            summary = record["summary"]
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+    return summary
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", type=Path, help="JSONL file of feature requests")
+    parser.add_argument("-o", "--output", type=Path, help="write results here")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY)
+    args = parser.parse_args(argv)
+    out = args.output.open("w") if args.output else sys.stdout
+    try:
+        summary = asyncio.run(_main(args, out))
+    finally:
+        if args.output:
+            out.close()
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
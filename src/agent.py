@@ -6,34 +6,36 @@ checks that required output fields are not empty and re-prompts the model
 """
 
 from __future__ import annotations
+
+import functools
+from contextlib import asynccontextmanager
 from config import (
     OPENROUTER_API_KEY,
     OPENROUTER_MODEL,
     OPENROUTER_MAX_TOKENS,
+    OPENROUTER_SEED,
 )
-from typing import TypedDict, Dict, Any
+from typing import TYPE_CHECKING, TypedDict, Dict, Any
 
 from fastapi import FastAPI
 from pydantic import BaseModel
-import dspy
-from langgraph.graph import StateGraph, START, END
+from output_repair import chat_adapter
+from routing import get_router
+from utils import get_lm, get_response_cache, use_shared_llm_client
+
+if TYPE_CHECKING:
+    import dspy
+    from langgraph.graph.state import CompiledStateGraph
 
 # ─── LM via OpenRouter ───────────────────────────────────────────────────────
+# dspy, langgraph and the LM client are loaded on first use (see
+# ``predictors`` and ``get_graph``); the key is checked when the app starts.
 OR_API_KEY = OPENROUTER_API_KEY
-if not OR_API_KEY:
-    raise RuntimeError("Set OPENROUTER_API_KEY before launching the server.")
 OR_MODEL = OPENROUTER_MODEL
 OR_MAX_TOKENS = OPENROUTER_MAX_TOKENS
-
-lm = dspy.LM(
-    f"openai/{OR_MODEL}",
-    api_key=OR_API_KEY,
-    api_base="https://openrouter.ai/api/v1",
-    model_type="chat",
-    temperature=0.3,
-    max_tokens=OR_MAX_TOKENS,
-)
-dspy.configure(lm=lm)
+# responses are cached, so calls must be reproducible: greedy, fixed seed
+OR_TEMPERATURE = 0.0
+OR_SEED = OPENROUTER_SEED
 
 
 # ─── MCP Stub ────────────────────────────────────────────────────────────────
@@ -52,52 +54,148 @@ JSON_NOTE = (
 )
 
 
-class SpecExtractor(dspy.Signature):
-    """Extract structured spec from a user story.
-    {JSON_NOTE}
-    """
+def _lm(model: str) -> dspy.LM:
+    return get_lm(
+        model=model,
+        temperature=OR_TEMPERATURE,
+        max_tokens=OR_MAX_TOKENS,
+        timeout=get_router().timeout,
+        seed=OR_SEED,
+    )
 
-    user_story: str = dspy.InputField(desc="End‑user story")
-    spec: str = dspy.OutputField(desc="Markdown bullet list")
 
+@functools.cache
+def predictors() -> dict[str, dspy.Predict]:
+    """Build the agent's predictors, keyed by their model route.
 
-class CodeGenerator(dspy.Signature):
-    """Generate Python code that fulfils the spec.
-    {JSON_NOTE}
+    No LM is bound here: each call passes the pooled LM for the model the
+    router picked.
     """
+    import dspy
 
-    spec: str = dspy.InputField(desc="Requirements")
-    code: str = dspy.OutputField(desc="Python source code")
+    class SpecExtractor(dspy.Signature):
+        """Extract structured spec from a user story.
+        {JSON_NOTE}
+        """
 
+        user_story: str = dspy.InputField(desc="End‑user story")
+        spec: str = dspy.OutputField(desc="Markdown bullet list")
 
-class Evaluator(dspy.Signature):
-    """Critique the generated code and suggest improvements.
-    {JSON_NOTE}
-    """
+    class CodeGenerator(dspy.Signature):
+        """Generate Python code that fulfils the spec.
+        {JSON_NOTE}
+        """
+
+        spec: str = dspy.InputField(desc="Requirements")
+        code: str = dspy.OutputField(desc="Python source code")
+
+    class Evaluator(dspy.Signature):
+        """Critique the generated code and suggest improvements.
+        {JSON_NOTE}
+        """
 
-    code: str = dspy.InputField(desc="Generated code")
-    evaluation: str = dspy.OutputField(desc="Feedback on code")
+        code: str = dspy.InputField(desc="Generated code")
+        evaluation: str = dspy.OutputField(desc="Feedback on code")
+
+    return {
+        "spec": dspy.Predict(SpecExtractor),
+        "code": dspy.Predict(CodeGenerator),
+        "evaluate": dspy.Predict(Evaluator),
+    }
 
 
 # ─── Utility: simple retry wrapper ───────────────────────────────────────────
-def call_with_retries(module: dspy.Predict, attempts: int = 3, **kwargs):
-    """Call a dspy.Predict object, retrying until all OutputFields are non‑empty."""
+def _cache_key(module: dspy.Predict, route: str, kwargs: dict[str, Any]) -> str:
+    signature = f"{module.signature.signature}\n{module.signature.instructions}"
+    models = "|".join(get_router().chain(route))
+    return get_response_cache().make_key(models, signature, kwargs, OR_SEED)
+
+
+def _predict(module: dspy.Predict, model: str, kwargs: dict[str, Any]):
+    import dspy
+
+    # usage tracking lets the rate limiter charge real token counts; the
+    # adapter repairs malformed answers locally before any re-prompt
+    with dspy.context(track_usage=True, adapter=chat_adapter()):
+        return module(lm=_lm(model), **kwargs)
+
+
+async def _apredict(module: dspy.Predict, model: str, kwargs: dict[str, Any]):
+    import dspy
+
+    with dspy.context(track_usage=True, adapter=chat_adapter()):
+        return await module.acall(lm=_lm(model), **kwargs)
+
+
+def _missing(module: dspy.Predict, prediction: dspy.Prediction) -> list[str]:
+    # judged on the signature, not the call's kwargs: a retry adds the
+    # missing names to kwargs, and they must still count until filled
+    return [k for k in module.signature.output_fields if not prediction.get(k)]
+
+
+def call_with_retries(
+    module: dspy.Predict,
+    attempts: int = 3,
+    bypass_cache: bool = False,
+    route: str = "default",
+    **kwargs,
+):
+    """Call a dspy.Predict object, retrying until all OutputFields are non‑empty.
+
+    Each call runs on the model chain configured for ``route`` (see
+    :class:`routing.Router`). Complete predictions are cached by model
+    chain, signature, inputs and seed; ``bypass_cache`` forces a fresh call
+    (and refreshes the cached entry).
+    """
+    import dspy
+
+    cache = get_response_cache()
+    key = _cache_key(module, route, kwargs)
+    cached = cache.get(key, bypass=bypass_cache)
+    if cached is not None:
+        return dspy.Prediction(**cached)
     last = None
     for i in range(attempts):
-        last = module(**kwargs)
+        last = get_router().call(
+            route, functools.partial(_predict, module, kwargs=kwargs)
+        )
         # Check any None / empty values
-        missing = [k for k, v in last.items() if not v and k not in kwargs]
+        missing = _missing(module, last)
         if not missing:
+            cache.set(key, dict(last.items()))
             return last
         # Strengthen prompt if missing
         kwargs = {**kwargs, **{k: "" for k in missing}}
     return last  # may still be incomplete
 
 
-# Instantiate predictors
-spec_predict = dspy.Predict(SpecExtractor)
-code_predict = dspy.Predict(CodeGenerator)
-eval_predict = dspy.Predict(Evaluator)
+async def acall_with_retries(
+    module: dspy.Predict,
+    attempts: int = 3,
+    bypass_cache: bool = False,
+    route: str = "default",
+    **kwargs,
+):
+    """Async :func:`call_with_retries` over the shared pooled HTTP client."""
+    import dspy
+
+    cache = get_response_cache()
+    key = _cache_key(module, route, kwargs)
+    cached = cache.get(key, bypass=bypass_cache)
+    if cached is not None:
+        return dspy.Prediction(**cached)
+    use_shared_llm_client()
+    last: Any = None
+    for i in range(attempts):
+        last = await get_router().acall(
+            route, functools.partial(_apredict, module, kwargs=kwargs)
+        )
+        missing = _missing(module, last)
+        if not missing:
+            cache.set(key, dict(last.items()))
+            return last
+        kwargs = {**kwargs, **{k: "" for k in missing}}
+    return last  # may still be incomplete
 
 
 # ─── Shared State ────────────────────────────────────────────────────────────
@@ -106,50 +204,79 @@ class AgentState(TypedDict, total=False):
     spec: str
     code: str
     evaluation: str
+    no_cache: bool
 
 
 # ─── Node handlers ───────────────────────────────────────────────────────────
-def extract_spec(state: AgentState) -> Dict[str, Any]:
-    res = call_with_retries(spec_predict, user_story=state["user_story"])
+async def extract_spec(state: AgentState) -> dict[str, Any]:
+    res = await acall_with_retries(
+        predictors()["spec"],
+        route="spec",
+        bypass_cache=state.get("no_cache", False),
+        user_story=state["user_story"],
+    )
     return {"spec": res.spec}
 
 
-def generate_code(state: AgentState) -> Dict[str, Any]:
-    res = call_with_retries(code_predict, spec=state["spec"])
+async def generate_code(state: AgentState) -> dict[str, Any]:
+    res = await acall_with_retries(
+        predictors()["code"],
+        route="code",
+        bypass_cache=state.get("no_cache", False),
+        spec=state["spec"],
+    )
     return {"code": res.code}
 
 
-def evaluate(state: AgentState) -> Dict[str, Any]:
-    res = call_with_retries(eval_predict, code=state["code"])
+async def evaluate(state: AgentState) -> dict[str, Any]:
+    res = await acall_with_retries(
+        predictors()["evaluate"],
+        route="evaluate",
+        bypass_cache=state.get("no_cache", False),
+        code=state["code"],
+    )
     return {"evaluation": res.evaluation}
 
 
 # ─── Build StateGraph ────────────────────────────────────────────────────────
-builder = StateGraph(AgentState)
-builder.add_node("extract_spec", extract_spec)
-builder.add_node("generate_code", generate_code)
-builder.add_node("evaluate", evaluate)
-builder.add_edge(START, "extract_spec")
-builder.add_edge("extract_spec", "generate_code")
-builder.add_edge("generate_code", "evaluate")
-builder.add_edge("evaluate", END)
+@functools.cache
+def get_graph() -> CompiledStateGraph:
+    from langgraph.graph import END, START, StateGraph
+
+    builder = StateGraph(AgentState)
+    builder.add_node("extract_spec", extract_spec)
+    builder.add_node("generate_code", generate_code)
+    builder.add_node("evaluate", evaluate)
+    builder.add_edge(START, "extract_spec")
+    builder.add_edge("extract_spec", "generate_code")
+    builder.add_edge("generate_code", "evaluate")
+    builder.add_edge("evaluate", END)
+    return builder.compile()
 
-graph = builder.compile()
 
 # ─── FastAPI App ─────────────────────────────────────────────────────────────
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not OR_API_KEY:
+        raise RuntimeError("Set OPENROUTER_API_KEY before launching the server.")
+    yield
+
+
 app = FastAPI(
     title="Autogen Agent (OpenRouter minimal)",
     version="0.7.0",
     description="LangGraph + DSPy agent without dspy.guardrails dependency.",
+    lifespan=lifespan,
 )
 
 
 class GenerateRequest(BaseModel):
     user_story: str
+    no_cache: bool = False
 
 
 @app.post("/generate")
-def generate(req: GenerateRequest):
-    result: AgentState = graph.invoke({"user_story": req.user_story})  # type: ignore[arg-type,assignment]
+async def generate(req: GenerateRequest):
+    result: AgentState = await get_graph().ainvoke({"user_story": req.user_story, "no_cache": req.no_cache})  # type: ignore[arg-type,assignment]
     MCPClient().publish(result)  # type: ignore[arg-type]
     return result
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import math
+import time
+from collections.abc import AsyncIterable, AsyncIterator
+from dataclasses import asdict
+from typing import Any
+from uuid import uuid4
+
+from contracts import FeatureRequest
+from graph import workflow
+from scheduler import JobScheduler, QueueFull
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def parse_line(line: str, lineno: int) -> tuple[str, FeatureRequest]:
+    """Parse one ``requests.jsonl`` record into ``(request_id, FeatureRequest)``.
+
+    ``user_story`` is used when present, otherwise the title and body are
+    joined into the story.
+    """
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError(f"record is a JSON {type(record).__name__}, not an object")
+    request_id = str(record.get("request_id", lineno))
+    story = record.get("user_story") or "\n\n".join(
+        str(part) for part in (record.get("title"), record.get("body")) if part
+    )
+    if not story:
+        raise ValueError("record has no user_story, title or body")
+    return request_id, FeatureRequest(user_story=story)
+
+
+def run_story(request_id: str, feature: FeatureRequest, no_cache: bool = False) -> dict:
+    """Run one story through ``workflow.graph`` and return a result record."""
+    start = time.perf_counter()
+    state: dict[str, Any] = {}
+    tokens = 0
+    thread_id = f"batch-{request_id}-{uuid4()}"
+    try:
+        for event in workflow.graph.stream(
+            {"feature_request": feature, "no_cache": no_cache},
+            workflow.thread_config(thread_id),
+        ):
+            for update in event.values():
+                tokens += update.get("token_count", 0)
+                state.update(update)
+    except Exception as exc:
+        logger.exception("batch request %s failed", request_id)
+        return {
+            "request_id": request_id,
+            "status": "error",
+            "error": str(exc),
+            "latency": time.perf_counter() - start,
+            "tokens": tokens,
+        }
+    finally:
+        # batch runs are never resumed
+        if workflow.checkpointer is not None:
+            workflow.checkpointer.delete_thread(thread_id)
+    return {
+        "request_id": request_id,
+        "status": "ok",
+        "latency": time.perf_counter() - start,
+        "tokens": tokens,
+        "attempts": state.get("attempts", 0),
+        **{
+            key: asdict(state[key])
+            for key in ("spec", "patch", "critique")
+            if key in state
+        },
+    }
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _summary_fields(result: dict) -> dict:
+    return {key: result[key] for key in ("status", "latency", "tokens")}
+
+
+def summarise(results: list[dict], elapsed: float) -> dict:
+    latencies = [r["latency"] for r in results]
+    return {
+        "total": len(results),
+        "ok": sum(r["status"] == "ok" for r in results),
+        "failed": sum(r["status"] != "ok" for r in results),
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(results) / elapsed, 3) if elapsed else 0.0,
+        "latency_p50": round(_percentile(latencies, 50), 3),
+        "latency_p95": round(_percentile(latencies, 95), 3),
+        "tokens": sum(r.get("tokens", 0) for r in results),
+    }
+
+
+def _error(request_id: str, error: str) -> dict:
+    return {
+        "request_id": request_id,
+        "status": "error",
+        "error": error,
+        "latency": 0.0,
+        "tokens": 0,
+    }
+
+
+async def run_batch(
+    lines: AsyncIterable[str],
+    concurrency: int,
+    no_cache: bool = False,
+    scheduler: JobScheduler | None = None,
+) -> AsyncIterator[dict]:
+    """Run JSONL records with at most ``concurrency`` stories in flight.
+
+    Stories are submitted to ``scheduler`` (the gateway's, so batches share
+    its workers and admission with interactive jobs), or to a scheduler of
+    ``concurrency`` workers owned by this batch. When the shared queue is
+    full the batch waits for one of its own stories to finish, or for the
+    scheduler's ``retry_after``, before submitting more.
+
+    Input is read only when a slot is free, so no more than ``concurrency``
+    records are parsed or held at a time; only latency, status and token
+    counts are kept per record for the summary. Results are yielded in
+    completion order, followed by a final ``{"summary": {...}}`` record.
+    """
+    owned = scheduler is None
+    if scheduler is None:
+        scheduler = JobScheduler(workers=concurrency, max_pending=concurrency)
+    batch_id = uuid4().hex[:12]
+    start = time.perf_counter()
+    done: list[dict] = []
+    pending: dict[asyncio.Task, str] = {}
+    source = aiter(lines)
+    lineno = 0
+    held: tuple[str, FeatureRequest] | None = None
+    exhausted = False
+    try:
+        while pending or held or not exhausted:
+            while len(pending) < concurrency:
+                if held is None:
+                    if exhausted:
+                        break
+                    try:
+                        line = await anext(source)
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    lineno += 1
+                    if not line.strip():
+                        continue
+                    try:
+                        held = parse_line(line, lineno)
+                    except ValueError as exc:
+                        result = _error(str(lineno), f"invalid record: {exc}")
+                        done.append(_summary_fields(result))
+                        yield result
+                        continue
+                request_id, feature = held
+                job_id = f"batch-{batch_id}-{lineno}"
+                try:
+                    scheduler.submit(
+                        job_id,
+                        functools.partial(run_story, request_id, feature, no_cache),
+                    )
+                except QueueFull as exc:
+                    if not pending:
+                        await asyncio.sleep(min(exc.retry_after, 1))
+                    break
+                held = None
+                task = scheduler.task(job_id)
+                assert task is not None
+                pending[task] = request_id
+            if not pending:
+                continue
+            finished, _ = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in finished:
+                request_id = pending.pop(task)
+                result = task.result() or _error(request_id, "cancelled")
+                done.append(_summary_fields(result))
+                yield result
+    finally:
+        for task in pending:
+            task.cancel()
+        if owned:
+            scheduler.shutdown()
+    yield {"summary": summarise(done, time.perf_counter() - start)}
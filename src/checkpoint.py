@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from config import CHECKPOINT_PATH
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+BLOB_KEY = "__asga_blob__"
+CONTRACT_TYPES = [
+    ("contracts", name)
+    for name in ("FeatureRequest", "Spec", "Tests", "Patch", "Critique", "RepairPlan")
+]
+
+
+class BlobSerializer:
+    """Checkpoint serializer that stores large state values once.
+
+    Contract dataclasses (``Tests``, ``Patch``, ...) whose encoding exceeds
+    ``threshold`` bytes are written to a content-addressed ``blobs`` table
+    and replaced by ``{"__asga_blob__": <sha256>}`` in the checkpoint, so
+    successive snapshots of an unchanged artifact share one copy.
+    :meth:`collect` deletes blobs no checkpoint refers to any more.
+    """
+
+    def __init__(self, path: str, threshold: int = 256, cache_size: int = 256):
+        self.inner = JsonPlusSerializer(allowed_msgpack_modules=CONTRACT_TYPES)
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs "
+            "(hash TEXT PRIMARY KEY, type TEXT, data BLOB)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, Any] = OrderedDict()
+
+    def _remember(self, digest: str, value: Any) -> None:
+        # callers hold ``_lock``
+        self._cache[digest] = value
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _ref(self, value: Any) -> Any:
+        if not dataclasses.is_dataclass(value) or isinstance(value, type):
+            return value
+        type_, data = self.inner.dumps_typed(value)
+        if len(data) < self.threshold:
+            return value
+        digest = hashlib.sha256(type_.encode() + b"\0" + data).hexdigest()
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+            else:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)",
+                    (digest, type_, data),
+                )
+                self._conn.commit()
+                self._remember(digest, value)
+        return {BLOB_KEY: digest}
+
+    def _deref(self, value: Any) -> Any:
+        if not (isinstance(value, dict) and len(value) == 1 and BLOB_KEY in value):
+            return value
+        digest = value[BLOB_KEY]
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return self._cache[digest]
+            row = self._conn.execute(
+                "SELECT type, data FROM blobs WHERE hash = ?", (digest,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"missing checkpoint blob {digest}")
+        loaded = self.inner.loads_typed((row[0], row[1]))
+        with self._lock:
+            self._remember(digest, loaded)
+        return loaded
+
+    def refs(self, data: tuple[str, bytes]) -> set[str]:
+        """Blob digests referenced by a value :meth:`dumps_typed` produced."""
+        obj = self.inner.loads_typed(data)
+        if isinstance(obj, dict) and isinstance(obj.get("channel_values"), dict):
+            values = list(obj["channel_values"].values())
+        else:
+            values = [obj]
+        return {
+            v[BLOB_KEY]
+            for v in values
+            if isinstance(v, dict) and len(v) == 1 and BLOB_KEY in v
+        }
+
+    def collect(self, referenced: set[str]) -> int:
+        """Delete blobs outside ``referenced``; returns how many went.
+
+        Blobs still in the cache are kept: :meth:`_ref` hands out a digest
+        before the checkpoint naming it is written, so a recently used blob
+        may be about to be referenced.
+        """
+        with self._lock:
+            stored = {h for (h,) in self._conn.execute("SELECT hash FROM blobs")}
+            unused = stored - referenced - self._cache.keys()
+            self._conn.executemany(
+                "DELETE FROM blobs WHERE hash = ?", [(h,) for h in unused]
+            )
+            self._conn.commit()
+        return len(unused)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        if isinstance(obj, dict) and isinstance(obj.get("channel_values"), dict):
+            values = {k: self._ref(v) for k, v in obj["channel_values"].items()}
+            obj = {**obj, "channel_values": values}
+        else:
+            obj = self._ref(obj)
+        return self.inner.dumps_typed(obj)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        obj = self.inner.loads_typed(data)
+        if isinstance(obj, dict) and isinstance(obj.get("channel_values"), dict):
+            values = {k: self._deref(v) for k, v in obj["channel_values"].items()}
+            return {**obj, "channel_values": values}
+        return self._deref(obj)
+
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """``SqliteSaver`` whose async API runs the sync calls in a thread.
+
+    Lets the same local SQLite file back both ``graph`` and ``agraph``
+    without an extra async driver. It also records when each thread was
+    last written, so :meth:`expire` can drop threads nobody finished or
+    resumed within a TTL.
+    """
+
+    serde: BlobSerializer
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_times "
+            "(thread_id TEXT PRIMARY KEY, updated REAL)"
+        )
+        self.conn.commit()
+
+    def put(self, config, checkpoint, metadata, new_versions):  # type: ignore[override]
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_times VALUES (?, ?)",
+                (str(config["configurable"]["thread_id"]), time.time()),
+            )
+        return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute(
+                "DELETE FROM thread_times WHERE thread_id = ?", (str(thread_id),)
+            )
+
+    def expire(self, ttl: float) -> tuple[int, int]:
+        """Delete threads idle for ``ttl`` seconds, then unreferenced blobs.
+
+        Returns the number of threads and blobs deleted.
+        """
+        with self.cursor(transaction=False) as cur:
+            cur.execute(
+                "SELECT thread_id FROM thread_times WHERE updated < ?",
+                (time.time() - ttl,),
+            )
+            expired = [thread_id for (thread_id,) in cur.fetchall()]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        referenced: set[str] = set()
+        with self.cursor(transaction=False) as cur:
+            cur.execute("SELECT type, checkpoint FROM checkpoints")
+            rows = cur.fetchall()
+            cur.execute("SELECT type, value FROM writes")
+            rows += cur.fetchall()
+        for type_, data in rows:
+            referenced |= self.serde.refs((type_, data))
+        blobs = self.serde.collect(referenced)
+        if expired or blobs:
+            logger.info(
+                "expired %d checkpoint threads, deleted %d blobs", len(expired), blobs
+            )
+        return len(expired), blobs
+
+    async def aget_tuple(self, config):  # type: ignore[override]
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(  # type: ignore[override]
+        self, config, *, filter=None, before=None, limit=None
+    ) -> AsyncIterator:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):  # type: ignore[override]
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):  # type: ignore[override]
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):  # type: ignore[override]
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def create_checkpointer(path: str = CHECKPOINT_PATH) -> ThreadedSqliteSaver | None:
+    """Return a SQLite checkpointer at ``path``, or ``None`` when disabled."""
+    if not path:
+        return None
+    if path != ":memory:":
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    return ThreadedSqliteSaver(conn, serde=BlobSerializer(path))
@@ -4,3 +4,122 @@ OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "openrouter/mistral-large-lates
 OPENROUTER_MAX_TOKENS = int(os.getenv("OPENROUTER_MAX_TOKENS", "4096"))
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
 OPENROUTER_SEED = int(os.getenv("OPENROUTER_SEED", "42"))
+OPENROUTER_API_BASE = os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
+ARTIFACT_DIR = os.getenv("ASGA_ARTIFACT_DIR", ".asga/artifacts")
+
+LLM_CACHE_ENABLED = os.getenv("ASGA_LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = os.getenv("ASGA_LLM_CACHE_PATH", ".asga/llm_cache.sqlite")
+LLM_CACHE_TTL = float(os.getenv("ASGA_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("ASGA_LLM_CACHE_MEMORY_ITEMS", "1024"))
+LLM_CACHE_DISK_ITEMS = int(os.getenv("ASGA_LLM_CACHE_DISK_ITEMS", "100000"))
+
+GATEWAY_WORKERS = int(
+    os.getenv(
+        "ASGA_GATEWAY_WORKERS",
+        "256" if os.getenv("ASGA_ASYNC_GRAPH", "1") != "0" else "4",
+    )
+)
+GATEWAY_MAX_PENDING = int(os.getenv("ASGA_GATEWAY_MAX_PENDING", "32"))
+JOB_UNCLAIMED_TTL = float(os.getenv("ASGA_JOB_UNCLAIMED_TTL", "900"))
+JOB_FINISHED_TTL = float(os.getenv("ASGA_JOB_FINISHED_TTL", "300"))
+JOB_TOMBSTONE_TTL = float(os.getenv("ASGA_JOB_TOMBSTONE_TTL", "3600"))
+JOB_MAX_EVENTS = int(os.getenv("ASGA_JOB_MAX_EVENTS", "256"))
+# default per-job deadline in seconds, 0 for none
+JOB_DEADLINE = float(os.getenv("ASGA_JOB_DEADLINE", "0"))
+# cancel a job this long after its last SSE subscriber disconnected early
+JOB_ABANDON_GRACE = float(os.getenv("ASGA_JOB_ABANDON_GRACE", "10"))
+
+BATCH_CONCURRENCY = int(os.getenv("ASGA_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("ASGA_BATCH_MAX_CONCURRENCY", "32"))
+
+ASYNC_GRAPH = os.getenv("ASGA_ASYNC_GRAPH", "1") != "0"
+HTTP_MAX_CONNECTIONS = int(os.getenv("ASGA_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("ASGA_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_TIMEOUT = float(os.getenv("ASGA_HTTP_TIMEOUT", "120"))
+
+CHECKPOINT_PATH = os.getenv("ASGA_CHECKPOINT_PATH", ".asga/checkpoints.sqlite")
+# checkpoints of jobs that never finished are dropped after this many idle
+# seconds (finished jobs drop theirs at once); 0 keeps them
+CHECKPOINT_TTL = float(os.getenv("ASGA_CHECKPOINT_TTL", "86400"))
+
+# empty path keeps artifacts in memory only
+ARTIFACT_STORE_PATH = (
+    os.getenv("ASGA_ARTIFACT_STORE_PATH", ".asga/artifacts.sqlite") or None
+)
+ARTIFACT_STORE_MEMORY_BYTES = int(
+    os.getenv("ASGA_ARTIFACT_STORE_MEMORY_BYTES", str(64 << 20))
+)
+ARTIFACT_STORE_DISK_BYTES = int(
+    os.getenv("ASGA_ARTIFACT_STORE_DISK_BYTES", str(1 << 30))
+)
+# event fields longer than this are replaced by artifact handles; 0 disables
+ARTIFACT_INLINE_BYTES = int(os.getenv("ASGA_ARTIFACT_INLINE_BYTES", "4096"))
+
+LOG_LEVEL = os.getenv("ASGA_LOG_LEVEL", "INFO").upper()
+# comma separated ``module=LEVEL`` overrides, e.g. ``gateway=DEBUG,jobs=WARNING``
+LOG_LEVELS = os.getenv("ASGA_LOG_LEVELS", "")
+LOG_PAYLOAD_CHARS = int(os.getenv("ASGA_LOG_PAYLOAD_CHARS", "512"))
+LOG_SAMPLE_RATE = float(os.getenv("ASGA_LOG_SAMPLE_RATE", "0.1"))
+
+# best-of-N patch generation: candidates per code round (1 disables fan-out),
+# how many run at once (0: all), and the critic score that ends a run
+CODE_CANDIDATES = int(os.getenv("ASGA_CODE_CANDIDATES", "1"))
+CODE_CONCURRENCY = int(os.getenv("ASGA_CODE_CONCURRENCY", "0"))
+CODE_ACCEPT_SCORE = float(os.getenv("ASGA_CODE_ACCEPT_SCORE", "0.8"))
+
+# critic test sandbox: concurrent runs, per-run wall/CPU/memory limits, total
+# test time per job, and how many (tests, patch) results to remember
+SANDBOX_WORKERS = int(os.getenv("ASGA_SANDBOX_WORKERS", str(os.cpu_count() or 1)))
+SANDBOX_TIMEOUT = float(os.getenv("ASGA_SANDBOX_TIMEOUT", "30"))
+SANDBOX_CPU_SECONDS = int(os.getenv("ASGA_SANDBOX_CPU_SECONDS", "20"))
+SANDBOX_MEMORY_BYTES = int(os.getenv("ASGA_SANDBOX_MEMORY_BYTES", str(1 << 30)))
+SANDBOX_JOB_BUDGET = float(os.getenv("ASGA_SANDBOX_JOB_BUDGET", "120"))
+SANDBOX_CACHE_ITEMS = int(os.getenv("ASGA_SANDBOX_CACHE_ITEMS", "1024"))
+
+# repository index: where it is stored (relative to the indexed repo), how
+# stale it may get before a node refreshes it, the largest file parsed, and
+# how much context a node may pull from it
+REPO_INDEX_PATH = os.getenv("ASGA_REPO_INDEX_PATH", ".asga/repo_index.sqlite")
+REPO_INDEX_MAX_AGE = float(os.getenv("ASGA_REPO_INDEX_MAX_AGE", "5"))
+REPO_INDEX_MAX_FILE_BYTES = int(
+    os.getenv("ASGA_REPO_INDEX_MAX_FILE_BYTES", str(1 << 20))
+)
+REPO_CONTEXT_CHARS = int(os.getenv("ASGA_REPO_CONTEXT_CHARS", "4000"))
+
+# prompt files served by /prompt/{name}; empty means the repository's docs/
+PROMPT_DIR = os.getenv("ASGA_PROMPT_DIR", "")
+# how often a cached prompt's mtime is re-checked, in seconds
+PROMPT_CHECK_INTERVAL = float(os.getenv("ASGA_PROMPT_CHECK_INTERVAL", "1"))
+
+# per-node model chains, comma separated ``node=model|fallback`` entries, e.g.
+# ``spec=openrouter/mistral-small-latest|openrouter/mistral-large-latest``;
+# nodes without a route use OPENROUTER_MODEL alone
+MODEL_ROUTES = os.getenv("ASGA_MODEL_ROUTES", "")
+# seconds before an attempt is abandoned and the next model in its chain tried
+MODEL_TIMEOUT = float(os.getenv("ASGA_MODEL_TIMEOUT", "60"))
+# hedging: also start the next model once an attempt outlives this latency
+# quantile of its model (needs that many recent samples first)
+MODEL_HEDGE = os.getenv("ASGA_MODEL_HEDGE", "0") != "0"
+MODEL_HEDGE_QUANTILE = float(os.getenv("ASGA_MODEL_HEDGE_QUANTILE", "0.95"))
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("ASGA_MODEL_HEDGE_MIN_SAMPLES", "20"))
+# threads running routed attempts for synchronous callers
+MODEL_ROUTE_WORKERS = int(os.getenv("ASGA_MODEL_ROUTE_WORKERS", "16"))
+
+# client-side LLM rate limits, per minute across every call (0 disables one);
+# bucket state lives in ASGA_RATE_LIMIT_PATH so gateway workers share a quota
+RATE_LIMIT_RPM = float(os.getenv("ASGA_RATE_LIMIT_RPM", "0"))
+RATE_LIMIT_TPM = float(os.getenv("ASGA_RATE_LIMIT_TPM", "0"))
+RATE_LIMIT_PATH = os.getenv("ASGA_RATE_LIMIT_PATH", ".asga/ratelimit.sqlite")
+# retries of a call answered with 429/5xx, and their jittered backoff bounds
+RATE_LIMIT_RETRIES = int(os.getenv("ASGA_RATE_LIMIT_RETRIES", "5"))
+RATE_LIMIT_BACKOFF = float(os.getenv("ASGA_RATE_LIMIT_BACKOFF", "1"))
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv("ASGA_RATE_LIMIT_BACKOFF_MAX", "60"))
+
+# near-duplicate story index: past user stories and their specs, looked up by
+# MinHash similarity (an estimate of shingle Jaccard, 0-1) before the spec LLM
+# call. At STORY_REUSE_THRESHOLD the stored spec is reused as is; at
+# STORY_HINT_THRESHOLD it is shown to the model as an example instead.
+STORY_INDEX_ENABLED = os.getenv("ASGA_STORY_INDEX", "1") != "0"
+STORY_INDEX_PATH = os.getenv("ASGA_STORY_INDEX_PATH", ".asga/story_index.sqlite")
+STORY_REUSE_THRESHOLD = float(os.getenv("ASGA_STORY_REUSE_THRESHOLD", "0.8"))
+STORY_HINT_THRESHOLD = float(os.getenv("ASGA_STORY_HINT_THRESHOLD", "0.5"))
@@ -0,0 +1,500 @@
+from __future__ import annotations
+
+import hashlib
+import itertools
+import os
+import re
+import tempfile
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Iterable, Iterator, Sequence
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import NamedTuple
+
+DEV_NULL = "/dev/null"
+NO_NEWLINE = "\\ No newline at end of file\n"
+
+# Regions without unique lines whose most selective line still occurs more
+# often than this are diffed with ``SequenceMatcher`` when small enough and
+# emitted as one replace block otherwise, so repetitive input stays linear.
+MAX_CHAIN = 64
+SMALL_REGION = 250_000
+
+_HUNK = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    """Raised when a diff is malformed or does not apply."""
+
+
+class Block(NamedTuple):
+    """``size`` equal lines starting at ``a`` in the old and ``b`` in the new
+    text."""
+
+    a: int
+    b: int
+    size: int
+
+
+class Hunk(NamedTuple):
+    """One unified-diff hunk; ``lines`` keep their ``" "/"-"/"+"`` prefixes
+    and any ``\\ No newline`` markers."""
+
+    a_start: int
+    a_len: int
+    b_start: int
+    b_len: int
+    lines: list[str]
+
+    @property
+    def header(self) -> str:
+        return (
+            f"@@ -{_range(self.a_start, self.a_len)}"
+            f" +{_range(self.b_start, self.b_len)} @@\n"
+        )
+
+
+class FilePatch(NamedTuple):
+    source: str
+    target: str
+    hunks: list[Hunk]
+
+
+def _range(start: int, length: int) -> str:
+    # same 1-based ``start,length`` convention as ``difflib.unified_diff``
+    if length == 1:
+        return str(start + 1)
+    return f"{start if not length else start + 1},{length}"
+
+
+# --- matching ----------------------------------------------------------------
+
+
+def intern(a: Sequence[str], b: Sequence[str]) -> tuple[list[int], list[int]]:
+    """Map the lines of ``a`` and ``b`` to small ints so the matcher compares
+    and hashes ints instead of strings."""
+    ids: dict[str, int] = {}
+    return (
+        [ids.setdefault(line, len(ids)) for line in a],
+        [ids.setdefault(line, len(ids)) for line in b],
+    )
+
+
+def _patience(
+    a: list[int], b: list[int], alo: int, ahi: int, blo: int, bhi: int
+) -> list[tuple[int, int]]:
+    """Longest increasing run of lines unique to both ranges."""
+    counts_a = Counter(a[alo:ahi])
+    counts_b = Counter(b[blo:bhi])
+    where_b = {
+        line: j
+        for j, line in enumerate(b[blo:bhi], blo)
+        if counts_b[line] == 1 and counts_a[line] == 1
+    }
+    pairs = [
+        (i, where_b[line]) for i, line in enumerate(a[alo:ahi], alo) if line in where_b
+    ]
+    if not pairs:
+        return []
+    # patience sort: tails[k] is the smallest b index ending a run of k + 1
+    tails: list[int] = []
+    tops: list[int] = []
+    back = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pile = bisect_left(tails, j)
+        back[k] = tops[pile - 1] if pile else -1
+        if pile == len(tails):
+            tails.append(j)
+            tops.append(k)
+        else:
+            tails[pile] = j
+            tops[pile] = k
+    run = []
+    k = tops[-1]
+    while k >= 0:
+        run.append(pairs[k])
+        k = back[k]
+    run.reverse()
+    return run
+
+
+def _histogram(
+    a: list[int], b: list[int], alo: int, ahi: int, blo: int, bhi: int
+) -> list[tuple[int, int]]:
+    """Pair up the occurrences of the rarest common line, in order."""
+    counts_a = Counter(a[alo:ahi])
+    rarest, best = None, MAX_CHAIN + 1
+    for line in b[blo:bhi]:
+        count = counts_a.get(line, 0)
+        if 0 < count < best:
+            rarest, best = line, count
+    if rarest is None:
+        return []
+    in_a = [i for i in range(alo, ahi) if a[i] == rarest]
+    in_b = [j for j in range(blo, bhi) if b[j] == rarest]
+    return list(zip(in_a, in_b))
+
+
+def match(a: list[int], b: list[int]) -> list[Block]:
+    """Matching blocks of interned sequences, patience-diff style.
+
+    Common prefixes and suffixes are stripped, lines unique to both sides
+    anchor the rest (falling back to the rarest shared line, as histogram
+    diff does), and the gaps between anchors are matched the same way.
+    Work is roughly linear in the input for typical source files.
+    """
+    blocks: list[Block] = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        head = 0
+        while alo + head < ahi and blo + head < bhi and a[alo + head] == b[blo + head]:
+            head += 1
+        if head:
+            blocks.append(Block(alo, blo, head))
+            alo += head
+            blo += head
+        tail = 0
+        while (
+            ahi - tail > alo
+            and bhi - tail > blo
+            and a[ahi - tail - 1] == b[bhi - tail - 1]
+        ):
+            tail += 1
+        if tail:
+            blocks.append(Block(ahi - tail, bhi - tail, tail))
+            ahi -= tail
+            bhi -= tail
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = _patience(a, b, alo, ahi, blo, bhi) or _histogram(
+            a, b, alo, ahi, blo, bhi
+        )
+        if not anchors:
+            if (ahi - alo) * (bhi - blo) <= SMALL_REGION:
+                matcher = SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+                blocks.extend(
+                    Block(alo + i, blo + j, size)
+                    for i, j, size in matcher.get_matching_blocks()
+                    if size
+                )
+            continue
+        i0, j0 = alo, blo
+        for i, j in anchors:
+            stack.append((i0, i, j0, j))
+            blocks.append(Block(i, j, 1))
+            i0, j0 = i + 1, j + 1
+        stack.append((i0, ahi, j0, bhi))
+    blocks.sort()
+    merged: list[Block] = []
+    for block in blocks:
+        if (
+            merged
+            and merged[-1].a + merged[-1].size == block.a
+            and (merged[-1].b + merged[-1].size == block.b)
+        ):
+            last = merged.pop()
+            block = Block(last.a, last.b, last.size + block.size)
+        merged.append(block)
+    return merged
+
+
+# --- formatting --------------------------------------------------------------
+
+
+def _emit(prefix: str, line: str) -> Iterator[str]:
+    if line.endswith("\n"):
+        yield prefix + line
+    else:
+        yield prefix + line + "\n"
+        yield NO_NEWLINE
+
+
+def iter_hunks(a: Sequence[str], b: Sequence[str], context: int = 3) -> Iterator[Hunk]:
+    """Yield the hunks turning lines ``a`` into ``b``, one at a time.
+
+    Hunks are grouped like ``difflib.unified_diff``: changes closer than
+    ``2 * context`` lines share a hunk.
+    """
+    a_ids, b_ids = intern(a, b)
+    ops: list[tuple[bool, int, int, int, int]] = []
+    i = j = 0
+    for block in match(a_ids, b_ids) + [Block(len(a), len(b), 0)]:
+        if i < block.a or j < block.b:
+            ops.append((False, i, block.a, j, block.b))
+        if block.size:
+            ops.append(
+                (True, block.a, block.a + block.size, block.b, block.b + block.size)
+            )
+        i, j = block.a + block.size, block.b + block.size
+    if not any(not equal for equal, *_ in ops):
+        return
+    group: list[tuple[bool, int, int, int, int]] = []
+    for k, (equal, i1, i2, j1, j2) in enumerate(ops):
+        if equal and k == 0:
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        if equal and k == len(ops) - 1:
+            i2, j2 = min(i2, i1 + context), min(j2, j1 + context)
+        if equal and 0 < k < len(ops) - 1 and i2 - i1 > 2 * context:
+            group.append((True, i1, i1 + context, j1, j1 + context))
+            yield _hunk(a, b, group)
+            group = []
+            i1, j1 = i2 - context, j2 - context
+        group.append((equal, i1, i2, j1, j2))
+    yield _hunk(a, b, group)
+
+
+def _hunk(
+    a: Sequence[str], b: Sequence[str], group: list[tuple[bool, int, int, int, int]]
+) -> Hunk:
+    lines: list[str] = []
+    for equal, i1, i2, j1, j2 in group:
+        if equal:
+            for line in a[i1:i2]:
+                lines.extend(_emit(" ", line))
+            continue
+        for line in a[i1:i2]:
+            lines.extend(_emit("-", line))
+        for line in b[j1:j2]:
+            lines.extend(_emit("+", line))
+    first, last = group[0], group[-1]
+    return Hunk(first[1], last[2] - first[1], first[3], last[4] - first[3], lines)
+
+
+def unified_diff(
+    before: str, after: str, fromfile: str = "a", tofile: str = "b", context: int = 3
+) -> Iterator[str]:
+    """Stream the unified diff of two texts line by line.
+
+    A drop-in for ``difflib.unified_diff`` over ``splitlines(keepends=True)``
+    that stays fast on large and repetitive inputs and marks a missing final
+    newline. Yields nothing when the texts are equal.
+    """
+    hunks = iter_hunks(
+        before.splitlines(keepends=True), after.splitlines(keepends=True), context
+    )
+    first = next(hunks, None)
+    if first is None:
+        return
+    yield f"--- {fromfile}\n"
+    yield f"+++ {tofile}\n"
+    for hunk in itertools.chain((first,), hunks):
+        yield hunk.header
+        yield from hunk.lines
+
+
+def diff_files(
+    before: dict[str, str], after: dict[str, str], context: int = 3
+) -> Iterator[str]:
+    """Stream a multi-file patch from ``before`` to ``after`` (path ->
+    content), with ``/dev/null`` for added and deleted files."""
+    for path in sorted(before.keys() | after.keys()):
+        old, new = before.get(path), after.get(path)
+        if old == new:
+            continue
+        fromfile = DEV_NULL if old is None else f"a/{path}"
+        tofile = DEV_NULL if new is None else f"b/{path}"
+        if not (old or new):
+            # an empty file being added or deleted has no hunks, only headers
+            yield f"--- {fromfile}\n"
+            yield f"+++ {tofile}\n"
+            continue
+        yield from unified_diff(old or "", new or "", fromfile, tofile, context)
+
+
+# --- parsing and applying ----------------------------------------------------
+
+
+def _path(header: str) -> str:
+    path = header[4:].split("\t")[0].strip()
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+def parse_patch(diff: str | Iterable[str]) -> Iterator[FilePatch]:
+    """Parse a (possibly multi-file) unified diff, one file at a time.
+
+    Accepts the patch text or an iterable of its lines, such as the output
+    of :func:`diff_files`. A file header with no hunks (an empty file added
+    or deleted) parses to a :class:`FilePatch` without hunks.
+    """
+    lines = iter(diff.splitlines(keepends=True) if isinstance(diff, str) else diff)
+    line = next(lines, None)
+    while line is not None:
+        if not line.startswith("--- "):
+            line = next(lines, None)
+            continue
+        source, target = line, next(lines, None)
+        if target is None or not target.startswith("+++ "):
+            line = target
+            continue
+        hunks: list[Hunk] = []
+        line = next(lines, None)
+        while line is not None and line.startswith("@@"):
+            header = _HUNK.match(line)
+            if header is None:
+                raise PatchError(f"bad hunk header {line.strip()!r}")
+            a_len = int(header.group(2) or 1)
+            b_len = int(header.group(4) or 1)
+            a_left, b_left = a_len, b_len
+            body: list[str] = []
+            line = next(lines, None)
+            while line is not None and (a_left > 0 or b_left > 0 or line[:1] == "\\"):
+                tag = line[:1]
+                if tag in (" ", "\n"):
+                    a_left -= 1
+                    b_left -= 1
+                    line = " \n" if tag == "\n" else line
+                elif tag == "-":
+                    a_left -= 1
+                elif tag == "+":
+                    b_left -= 1
+                elif tag != "\\":
+                    raise PatchError(f"bad hunk line {line.rstrip()!r}")
+                body.append(line)
+                line = next(lines, None)
+            if a_left > 0 or b_left > 0:
+                raise PatchError(f"truncated hunk {header.group(0)}")
+            a_start = int(header.group(1)) - (1 if a_len else 0)
+            b_start = int(header.group(3)) - (1 if b_len else 0)
+            hunks.append(Hunk(a_start, a_len, b_start, b_len, body))
+        yield FilePatch(_path(source), _path(target), hunks)
+
+
+def _find(old: list[str], expected: list[str], start: int, floor: int) -> int:
+    """Index of ``expected`` in ``old`` nearest to ``start``, not before
+    ``floor``; -1 when absent."""
+    size = len(expected)
+    for offset in range(len(old) + 1):
+        for at in (start - offset, start + offset) if offset else (start,):
+            if floor <= at <= len(old) - size and old[at : at + size] == expected:
+                return at
+    return -1
+
+
+def _sides(hunk: Hunk) -> tuple[list[str], list[str]]:
+    expected: list[str] = []
+    replacement: list[str] = []
+    touched: list[list[str]] = []
+    for line in hunk.lines:
+        tag, text = line[:1], line[1:]
+        if tag == "\\":
+            for side in touched:
+                side[-1] = side[-1].rstrip("\n")
+            continue
+        touched = [expected, replacement] if tag == " " else []
+        if tag in " -":
+            expected.append(text)
+            touched = touched or [expected]
+        if tag in " +":
+            replacement.append(text)
+            touched = touched or [replacement]
+    return expected, replacement
+
+
+def apply_file(content: str, patch: FilePatch) -> str:
+    """Apply one file's hunks to ``content``.
+
+    Hunks may have moved relative to their header line numbers; context that
+    cannot be found raises :class:`PatchError`.
+    """
+    old = content.splitlines(keepends=True)
+    new: list[str] = []
+    pos = 0
+    for hunk in patch.hunks:
+        expected, replacement = _sides(hunk)
+        at = _find(old, expected, hunk.a_start, pos)
+        if at < 0:
+            raise PatchError(
+                f"hunk {hunk.header.strip()} does not apply to {patch.source}"
+            )
+        new.extend(old[pos:at])
+        new.extend(replacement)
+        pos = at + len(expected)
+    new.extend(old[pos:])
+    return "".join(new)
+
+
+def _apply(files: dict[str, str], patches: Iterable[FilePatch]) -> dict[str, str]:
+    result = dict(files)
+    for patch in patches:
+        if patch.source != DEV_NULL and patch.source not in result:
+            raise PatchError(f"{patch.source} does not exist")
+        if patch.source == DEV_NULL and patch.target in result:
+            raise PatchError(f"{patch.target} already exists")
+        content = apply_file(result.get(patch.source, ""), patch)
+        if patch.target == DEV_NULL and content:
+            raise PatchError(f"{patch.source} is not empty after deleting it")
+        if patch.source != DEV_NULL and patch.source != patch.target:
+            del result[patch.source]
+        if patch.target != DEV_NULL:
+            result[patch.target] = content
+    return result
+
+
+def apply_patch(files: dict[str, str], diff: str | Iterable[str]) -> dict[str, str]:
+    """Apply a multi-file ``diff`` to ``files`` (path -> content) and return
+    the patched copy; ``files`` itself is left untouched."""
+    return _apply(files, parse_patch(diff))
+
+
+def _inside(root: Path, name: str) -> Path:
+    path = (root / name).resolve()
+    if not path.is_relative_to(root):
+        raise PatchError(f"{name} is outside {root}")
+    return path
+
+
+def apply_to_tree(
+    root: str | Path, diff: str | Iterable[str], dry_run: bool = False
+) -> dict[str, str | None]:
+    """Apply ``diff`` to the working tree at ``root``, all or nothing.
+
+    Every hunk is applied in memory first, so a patch that does not apply
+    leaves the tree untouched. Files are then replaced atomically and read
+    back to verify their content. Returns the new content of each touched
+    path (``None`` for deletions); with ``dry_run`` nothing is written.
+    """
+    root = Path(root).resolve()
+    patches = list(parse_patch(diff))
+    names = {p.source for p in patches} | {p.target for p in patches}
+    names.discard(DEV_NULL)
+    paths = {name: _inside(root, name) for name in names}
+    before = {name: path.read_text() for name, path in paths.items() if path.is_file()}
+    after = _apply(before, patches)
+    changes: dict[str, str | None] = {
+        name: after.get(name) for name in names if before.get(name) != after.get(name)
+    }
+    if dry_run:
+        return changes
+    for name, content in changes.items():
+        path = paths[name]
+        if content is None:
+            path.unlink()
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        with os.fdopen(fd, "w") as fh:
+            fh.write(content)
+        os.replace(tmp, path)
+    verify_tree(root, changes)
+    return changes
+
+
+def verify_tree(root: str | Path, expected: dict[str, str | None]) -> None:
+    """Check that each path under ``root`` holds the expected content (or is
+    absent for ``None``); raises :class:`PatchError` on the first mismatch."""
+    root = Path(root).resolve()
+    for name, content in expected.items():
+        path = _inside(root, name)
+        if content is None:
+            if path.exists():
+                raise PatchError(f"{name} should have been deleted")
+            continue
+        actual = path.read_bytes() if path.is_file() else None
+        if actual is None or _digest(actual) != _digest(content.encode()):
+            raise PatchError(f"{name} does not match the patched content")
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
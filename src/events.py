@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+from collections.abc import Callable
+from operator import attrgetter
+from typing import Any, NamedTuple
+
+import contracts
+from config import ARTIFACT_INLINE_BYTES
+from utils import ArtifactStore
+
+HASH_KEY = "$hash"
+BASE_KEY = "$base"
+ARTIFACT_KEY = "$artifact"
+
+
+def _compile(cls: type) -> Callable[[Any], dict]:
+    """Build a flat field encoder for dataclass ``cls``.
+
+    Reads all fields with one ``attrgetter`` instead of ``asdict``, which
+    deep-copies every value. Nested values are left to the JSON encoder.
+    """
+    names = tuple(f.name for f in dataclasses.fields(cls))
+    if len(names) == 1:
+        name = names[0]
+        return lambda obj: {name: getattr(obj, name)}
+    getter = attrgetter(*names)
+    return lambda obj: dict(zip(names, getter(obj)))
+
+
+ENCODERS: dict[type, Callable[[Any], dict]] = {
+    cls: _compile(cls)
+    for cls in vars(contracts).values()
+    if isinstance(cls, type)
+    and dataclasses.is_dataclass(cls)
+    and cls.__module__ == contracts.__name__
+}
+
+
+def to_jsonable(obj: Any) -> Any:
+    """``json`` fallback: contracts via :data:`ENCODERS`, other dataclasses
+    via ``asdict``."""
+    encoder = ENCODERS.get(type(obj))
+    if encoder is not None:
+        return encoder(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"{type(obj).__name__} is not JSON serialisable")
+
+
+_dumps = json.JSONEncoder(default=to_jsonable).encode
+
+
+def encode(obj: Any) -> str:
+    """Encode a graph event (or any JSON value with contracts) in one pass."""
+    return _dumps(obj)
+
+
+def fingerprint(fields: dict) -> str:
+    """Content hash of encoded contract fields, without JSON-encoding them."""
+    h = hashlib.blake2b(digest_size=8)
+    for value in fields.values():
+        h.update(value.encode() if isinstance(value, str) else repr(value).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class EncodedEvent(NamedTuple):
+    """One event encoded once for all subscribers, in both stream modes."""
+
+    full: str
+    delta: str
+
+
+class _Sent(NamedTuple):
+    hash: str
+    fields: dict
+    wire: dict
+    json: str
+
+
+class EventEncoder:
+    """Per-job encoder that also produces delta-mode payloads.
+
+    In delta mode contract values in node updates are sent as
+    ``{"$hash": h}`` when unchanged since the last event that carried the
+    same state key, as ``{"$hash": h, "$base": previous, <changed fields>}``
+    when some fields changed, and in full (plus ``"$hash"``) the first
+    time. Plain values pass through unchanged.
+
+    With a ``store``, string fields longer than ``inline_bytes`` are put in
+    the :class:`utils.ArtifactStore` and sent in both modes as handles,
+    ``{"$artifact": <sha256>, "size": <bytes>}``, fetchable from
+    ``/artifacts/{sha256}``; buffered events then stay small however many
+    patch versions a repair loop produces.
+
+    Each artifact is hashed and JSON-encoded only when it changes: the
+    encoding is spliced into both payloads and reused while the fields
+    compare equal. Output is
+    identical to ``json.dumps`` with default separators.
+    """
+
+    def __init__(
+        self,
+        store: ArtifactStore | None = None,
+        inline_bytes: int = ARTIFACT_INLINE_BYTES,
+    ) -> None:
+        self.store = store if inline_bytes > 0 else None
+        self.inline_bytes = inline_bytes
+        self._sent: dict[str, _Sent] = {}
+
+    def _handle(self, value: Any) -> Any:
+        if self.store is None or not isinstance(value, str):
+            return value
+        if len(value) <= self.inline_bytes:
+            return value
+        raw = value.encode()
+        return {ARTIFACT_KEY: self.store.put(raw), "size": len(raw)}
+
+    def _artifact(self, key: str, fields: dict) -> tuple[str, str]:
+        previous = self._sent.get(key)
+        if previous is not None and previous.fields == fields:
+            return previous.json, f'{{"{HASH_KEY}": "{previous.hash}"}}'
+        wire = {k: self._handle(v) for k, v in fields.items()}
+        h = fingerprint(wire)
+        full = _dumps(wire)
+        self._sent[key] = _Sent(h, fields, wire, full)
+        if previous is None:
+            head = f'{{"{HASH_KEY}": "{h}"'
+            return full, head + (", " + full[1:] if wire else "}")
+        changed = {k: v for k, v in wire.items() if previous.wire.get(k) != v}
+        return full, _dumps({HASH_KEY: h, BASE_KEY: previous.hash, **changed})
+
+    def encode(self, event: dict) -> EncodedEvent:
+        full_nodes, delta_nodes = [], []
+        for node, update in event.items():
+            name = _dumps(node)
+            if not isinstance(update, dict):
+                value = _dumps(update)
+                full_nodes.append(f"{name}: {value}")
+                delta_nodes.append(f"{name}: {value}")
+                continue
+            full_items, delta_items = [], []
+            for key, value in update.items():
+                field = _dumps(key)
+                encoder = ENCODERS.get(type(value))
+                if encoder is None:
+                    full = delta = _dumps(value)
+                else:
+                    full, delta = self._artifact(key, encoder(value))
+                full_items.append(f"{field}: {full}")
+                delta_items.append(f"{field}: {delta}")
+            full_nodes.append(f"{name}: {{{', '.join(full_items)}}}")
+            delta_nodes.append(f"{name}: {{{', '.join(delta_items)}}}")
+        return EncodedEvent(
+            full="{" + ", ".join(full_nodes) + "}",
+            delta="{" + ", ".join(delta_nodes) + "}",
+        )
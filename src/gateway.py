@@ -2,96 +2,396 @@ from __future__ import annotations
 
 import asyncio
 import json
-from pathlib import Path
+import tempfile
+from contextlib import ExitStack, asynccontextmanager
 from uuid import uuid4
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse, PlainTextResponse
-from dataclasses import asdict
-from langfuse import Langfuse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 import os
 from pydantic import BaseModel
-from utils import get_logger
+from utils import (
+    REGISTRY,
+    SAMPLED,
+    Counter,
+    Gauge,
+    aclose_async_client,
+    get_artifact_store,
+    get_logger,
+    payload,
+)
 
-from contracts import FeatureRequest, Spec, Tests, Patch, Critique, RepairPlan
+from batch import run_batch
+from config import (
+    ASYNC_GRAPH,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY,
+    CHECKPOINT_TTL,
+    GATEWAY_MAX_PENDING,
+    GATEWAY_WORKERS,
+    JOB_ABANDON_GRACE,
+    JOB_DEADLINE,
+    JOB_FINISHED_TTL,
+    JOB_MAX_EVENTS,
+    JOB_TOMBSTONE_TTL,
+    JOB_UNCLAIMED_TTL,
+)
+from contracts import FeatureRequest
+from events import EventEncoder
 from graph import workflow
+from jobs import Job, JobRegistry
+import output_repair
+from prompts import get_prompts
+from ratelimit import get_limiter
+from routing import get_router
+from sandbox import get_sandbox
+from scheduler import JobScheduler, QueueFull
+from story_index import get_story_index
+
+JOBS_ACTIVE = Gauge("asga_jobs_active", "Jobs currently running")
+JOBS_QUEUED = Gauge("asga_jobs_queued", "Jobs waiting for a worker")
+JOBS_FINISHED = Gauge("asga_jobs_finished", "Jobs finished since start")
+SSE_SUBSCRIBERS = Gauge("asga_sse_subscribers", "Open job event streams")
+JOBS_CANCELLED = Counter(
+    "asga_jobs_cancelled_total",
+    "Cancelled jobs by reason and stage",
+    ["reason", "stage"],
+)
 
 
 class FeatureRequestModel(BaseModel):
     user_story: str
+    no_cache: bool = False
+    # seconds from submission until the job is cancelled
+    deadline: float | None = None
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """Whether ``If-None-Match`` already names ``etag`` (or ``*``)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in tags or "*" in tags
+
+
+def _expire_checkpoints(ttl: float) -> None:
+    saver = workflow.checkpointer
+    if saver is not None:
+        saver.expire(ttl)
+
 
+async def _checkpoint_janitor(ttl: float) -> None:
+    """Drop checkpoints idle for ``ttl`` seconds, checking every ``ttl / 4``."""
+    logger = get_logger(__name__)
+    while True:
+        await asyncio.sleep(ttl / 4)
+        try:
+            await asyncio.to_thread(_expire_checkpoints, ttl)
+        except Exception:
+            logger.exception("checkpoint expiry failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    janitor = (
+        asyncio.create_task(_checkpoint_janitor(CHECKPOINT_TTL))
+        if CHECKPOINT_TTL > 0
+        else None
+    )
+    yield
+    if janitor is not None:
+        janitor.cancel()
+    app.state.scheduler.shutdown()
+    await aclose_async_client()
 
-def create_app() -> FastAPI:
-    app = FastAPI(title="ASGA Gateway", version="0.1.0")
+
+def create_app(
+    workers: int = GATEWAY_WORKERS,
+    max_pending: int = GATEWAY_MAX_PENDING,
+    async_graph: bool = ASYNC_GRAPH,
+) -> FastAPI:
+    app = FastAPI(title="ASGA Gateway", version="0.1.0", lifespan=lifespan)
     logger = get_logger(__name__)
     if os.getenv("LANGFUSE_PUBLIC_KEY") and os.getenv("LANGFUSE_SECRET_KEY"):
+        from langfuse import Langfuse
+
         Langfuse()
     else:
         logger.warning(
             "Langfuse disabled: missing LANGFUSE_PUBLIC_KEY or LANGFUSE_SECRET_KEY"
         )
 
-    jobs: dict[str, asyncio.Queue] = {}
-    finished_jobs: set[str] = set()
+    jobs = JobRegistry(
+        unclaimed_ttl=JOB_UNCLAIMED_TTL,
+        finished_ttl=JOB_FINISHED_TTL,
+        tombstone_ttl=JOB_TOMBSTONE_TTL,
+        max_events=JOB_MAX_EVENTS,
+    )
     app.state.jobs = jobs
-    app.state.finished_jobs = finished_jobs
+    scheduler = JobScheduler(workers=workers, max_pending=max_pending)
+    app.state.scheduler = scheduler
+    artifacts = get_artifact_store()
+    app.state.artifacts = artifacts
+    prompts = get_prompts()
+    app.state.prompts = prompts
+
+    def cancel(job_id: str, reason: str) -> str | None:
+        """Stop ``job_id`` and end its stream; returns the stage it was in.
+
+        Coroutine jobs are cancelled at once, aborting an in-flight LLM
+        request; threaded jobs stop before their next graph node.
+        """
+        job = jobs.get(job_id)
+        if job is None or job.finished_at is not None:
+            return None
+        job.cancelled = reason
+        job.stop.set()
+        stage = scheduler.cancel(job_id) or "running"
+        JOBS_CANCELLED.labels(reason, stage).inc()
+        logger.info("job %s cancelled (%s, %s)", job_id, reason, stage)
+        jobs.push(job_id, EventEncoder().encode({"cancelled": {"reason": reason}}))
+        jobs.push(job_id, None)
+        return stage
+
+    def schedule(
+        job_id: str, graph_input: dict | None, deadline: float | None = None
+    ) -> dict:
+        """Run ``graph_input`` (``None`` resumes the checkpoint) as ``job_id``."""
+        loop = asyncio.get_running_loop()
+        config = workflow.thread_config(job_id)
+        encoder = EventEncoder(artifacts)
+
+        def publish(event: dict):
+            job.tokens += sum(
+                update.get("token_count", 0)
+                for update in event.values()
+                if isinstance(update, dict)
+            )
+            encoded = encoder.encode(event)
+            logger.debug("event: %s", payload(encoded.full), extra=SAMPLED)
+            return encoded
+
+        def run():  # pragma: no cover - executed in thread
+            try:
+                for event in workflow.graph.stream(graph_input, config):
+                    loop.call_soon_threadsafe(jobs.push, job_id, publish(event))
+                    if job.stop.is_set():
+                        break
+                else:
+                    # finished runs cannot be resumed; only keep what can
+                    if workflow.checkpointer is not None:
+                        workflow.checkpointer.delete_thread(job_id)
+            finally:
+                loop.call_soon_threadsafe(jobs.push, job_id, None)
+                if timer is not None:
+                    loop.call_soon_threadsafe(timer.cancel)
+
+        async def arun():
+            try:
+                async for event in workflow.agraph.astream(graph_input, config):
+                    jobs.push(job_id, publish(event))
+                    if job.stop.is_set():
+                        break
+                else:
+                    if workflow.checkpointer is not None:
+                        await workflow.checkpointer.adelete_thread(job_id)
+            finally:
+                jobs.push(job_id, None)
+                if timer is not None:
+                    timer.cancel()
+
+        try:
+            scheduler.submit(job_id, arun if async_graph else run)
+        except QueueFull as exc:
+            raise HTTPException(
+                429, str(exc), headers={"Retry-After": str(exc.retry_after)}
+            )
+        job = jobs.create(job_id)
+        deadline = deadline or JOB_DEADLINE
+        timer = (
+            loop.call_later(deadline, cancel, job_id, "deadline") if deadline else None
+        )
+        return {"job_id": job_id, **scheduler.status(job_id)}
 
     @app.post("/jobs")
     async def start_job(req: FeatureRequestModel):
         job_id = str(uuid4())
         logger.debug("start_job %s", job_id)
-        queue: asyncio.Queue = asyncio.Queue()
-        jobs[job_id] = queue
-        finished_jobs.discard(job_id)
-        loop = asyncio.get_running_loop()
+        initial = {
+            "feature_request": FeatureRequest(user_story=req.user_story),
+            "no_cache": req.no_cache,
+        }
+        return schedule(job_id, initial, req.deadline)
 
-        def _serialise(val):
-            if hasattr(val, "__dataclass_fields__"):
-                return asdict(val)
-            if isinstance(val, dict):
-                return {k: _serialise(v) for k, v in val.items()}
-            return val  # pragma: no cover - simple passthrough
+    def abandon(job: Job) -> None:
+        """Cancel ``job`` if nobody reconnected within the grace period."""
+        if jobs.get(job.job_id) is job and job.subscribers == 0:
+            cancel(job.job_id, "abandoned")
 
-        def run():  # pragma: no cover - executed in thread
-            for event in workflow.graph.stream(
-                {"feature_request": FeatureRequest(user_story=req.user_story)}
-            ):
-                serialised = {k: _serialise(v) for k, v in event.items()}
-                logger.debug("event: %s", serialised)
-                asyncio.run_coroutine_threadsafe(queue.put(serialised), loop)
-            asyncio.run_coroutine_threadsafe(queue.put(None), loop)
+    @app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: str):
+        job = jobs.get(job_id)
+        if job is None:
+            if jobs.is_retired(job_id):
+                raise HTTPException(410, "job finished")
+            raise HTTPException(404, "job not found")
+        stage = cancel(job_id, "client")
+        if stage is None:
+            raise HTTPException(409, "job already finished")
+        return {"job_id": job_id, "cancelled": stage}
+
+    @app.post("/jobs/{job_id}/resume")
+    async def resume_job(job_id: str):
+        """Continue a checkpointed job from its last completed node."""
+        if workflow.checkpointer is None:
+            raise HTTPException(404, "checkpointing disabled")
+        job = jobs.get(job_id)
+        if job is not None and job.finished_at is None:
+            raise HTTPException(409, "job is running")
+        graph = workflow.agraph if async_graph else workflow.graph
+        snapshot = await graph.aget_state(workflow.thread_config(job_id))
+        if snapshot.created_at is None:
+            if job is not None or jobs.is_retired(job_id):
+                # its checkpoints were dropped when it finished
+                raise HTTPException(409, "job already complete")
+            raise HTTPException(404, "no checkpoint for job")
+        if not snapshot.next:
+            raise HTTPException(409, "job already complete")
+        logger.debug("resume_job %s at %s", job_id, snapshot.next)
+        return {**schedule(job_id, None), "resume_from": list(snapshot.next)}
+
+    @app.post("/jobs/batch")
+    async def start_batch(
+        request: Request, concurrency: int = BATCH_CONCURRENCY, no_cache: bool = False
+    ):
+        """Run a JSONL body of feature requests and stream JSONL results."""
+        concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+
+        # The body is spooled before responding: StreamingResponse consumes
+        # ``receive`` to watch for disconnects, so it cannot be read later.
+        # It is closed once the response is done, streamed or not.
+        with ExitStack() as stack:
+            spool = stack.enter_context(tempfile.SpooledTemporaryFile(max_size=1 << 20))
+            async for chunk in request.stream():
+                spool.write(chunk)
+            spool.seek(0)
+            close = BackgroundTask(stack.pop_all().close)
 
-        loop.run_in_executor(None, run)  # pragma: no cover - scheduling thread
-        return {"job_id": job_id}
+        async def lines():
+            for line in spool:
+                yield line.decode()
+
+        async def results():
+            async for record in run_batch(lines(), concurrency, no_cache, scheduler):
+                yield json.dumps(record) + "\n"
+
+        return StreamingResponse(
+            results(), media_type="application/x-ndjson", background=close
+        )
 
     @app.get("/jobs/{job_id}")
-    async def job_events(job_id: str):
-        if job_id not in jobs:
-            if job_id in finished_jobs:
+    async def job_events(job_id: str, request: Request, delta: bool = False):
+        """Stream job events as SSE.
+
+        With ``?delta=true`` unchanged artifacts are sent as content hashes
+        and changed ones as their changed fields (see ``events.EventEncoder``).
+        """
+        job = jobs.subscribe(job_id)
+        if job is None:
+            if jobs.is_retired(job_id):
                 raise HTTPException(410, "job finished")
             raise HTTPException(404, "job not found")
-        queue = jobs[job_id]
+        try:
+            after = int(request.headers.get("last-event-id", 0))
+        except ValueError:
+            after = 0
 
         async def event_generator():
+            completed = False
             try:
-                while True:
-                    event = await queue.get()
-                    if event is None:
-                        break
-                    logger.debug("sse event: %s", event)
-                    yield f"data: {json.dumps(event)}\n\n"
+                if not after:
+                    status = {"queue": scheduler.status(job_id)}
+                    yield f"data: {json.dumps(status)}\n\n"
+                chained = delta
+                last = after
+                async for seq, event in job.follow(after):
+                    # deltas only make sense without gaps in what was received
+                    chained = chained and seq == last + 1
+                    last = seq
+                    data = event.delta if chained else event.full
+                    logger.debug("sse event %d: %s", seq, payload(data), extra=SAMPLED)
+                    yield f"id: {seq}\ndata: {data}\n\n"
+                completed = True
             finally:
-                jobs.pop(job_id, None)
-                finished_jobs.add(job_id)
+                jobs.unsubscribe(job_id, completed)
+                if not completed and job.subscribers == 0:
+                    asyncio.get_running_loop().call_later(
+                        JOB_ABANDON_GRACE, abandon, job
+                    )
 
         return StreamingResponse(event_generator(), media_type="text/event-stream")
 
+    @app.get("/artifacts/{digest}")
+    async def get_artifact(digest: str, request: Request):
+        """Serve an artifact referenced by a ``$artifact`` handle.
+
+        Content is addressed by hash, so it never changes: the hash is the
+        ETag and responses may be cached indefinitely.
+        """
+        etag = f'"{digest}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "public, max-age=31536000, immutable",
+        }
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        data = await asyncio.to_thread(artifacts.get, digest)
+        if data is None:
+            raise HTTPException(404, "artifact not found")
+        return Response(data, media_type="text/plain; charset=utf-8", headers=headers)
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "jobs": jobs.stats(),
+            "scheduler": scheduler.stats(),
+            "artifacts": artifacts.stats(),
+            "sandbox": get_sandbox().stats(),
+            "prompts": prompts.stats(),
+            "models": get_router().stats(),
+            "rate_limit": get_limiter().stats(),
+            "output_repair": output_repair.stats(),
+            "stories": get_story_index().stats(),
+        }
+
+    @app.get("/metrics")
+    async def metrics():
+        """Prometheus text exposition of the in-process metrics."""
+        sched = scheduler.stats()
+        JOBS_ACTIVE.set(sched["active"])
+        JOBS_QUEUED.set(sched["queued"])
+        JOBS_FINISHED.set(sched["finished"])
+        SSE_SUBSCRIBERS.set(jobs.stats()["subscribers"])
+        return Response(REGISTRY.render(), media_type=REGISTRY.content_type)
+
     @app.get("/prompt/{name}")
-    async def get_prompt(name: str):
-        path = Path("docs") / f"{name}.md"
-        if not path.exists():
+    async def get_prompt(name: str, request: Request):
+        """Serve ``docs/<name>.md`` from the in-memory prompt cache.
+
+        The ETag is a content hash; clients polling with ``If-None-Match``
+        get an empty 304 until the file changes.
+        """
+        prompt = prompts.get(name)
+        if prompt is None:
             raise HTTPException(404, "Prompt not found")
-        return PlainTextResponse(path.read_text())
+        headers = {"ETag": prompt.etag, "Cache-Control": "no-cache"}
+        if _not_modified(request, prompt.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            prompt.data, media_type="text/plain; charset=utf-8", headers=headers
+        )
 
     return app
 
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
-from typing import TypedDict
+import asyncio
+import functools
+import inspect
+import operator
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Annotated, Any, TypedDict
 
-from langgraph.graph import END, START, StateGraph
-from langgraph.graph.state import CompiledStateGraph
-from langfuse import observe
-from utils import get_logger
+from langgraph.constants import END, START
+from config import CODE_ACCEPT_SCORE, CODE_CANDIDATES, CODE_CONCURRENCY
+from utils import Counter, Histogram, get_logger, observe, payload
 from contracts import (
     FeatureRequest,
     Spec,
@@ -14,13 +21,30 @@ from contracts import (
     Critique,
     RepairPlan,
 )
-from nodes.spec_agent import spec_node
-from nodes.tests_agent import test_node
-from nodes.code_agent import code_node
-from nodes.critic_agent import critic_node
+from nodes.spec_agent import spec_node, aspec_node
+from nodes.tests_agent import test_node, atest_node
+from nodes.code_agent import code_node, acode_node
+from nodes.critic_agent import critic_node, acritic_node
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+    from langgraph.checkpoint.base import BaseCheckpointSaver
+    from langgraph.graph.state import CompiledStateGraph
 
 logger = get_logger(__name__)
 
+NODE_SECONDS = Histogram(
+    "asga_node_duration_seconds", "Workflow node run time", ["node"]
+)
+REPAIR_ITERATIONS = Counter(
+    "asga_repair_iterations_total", "Repair loop iterations across all runs"
+)
+REPAIR_ATTEMPTS = Histogram(
+    "asga_repair_attempts",
+    "Repair attempts per finished run",
+    buckets=(0, 1, 2, 3, 5),
+)
+
 
 class WorkflowState(TypedDict, total=False):
     feature_request: FeatureRequest
@@ -30,6 +54,14 @@ class WorkflowState(TypedDict, total=False):
     critique: Critique
     repair_plan: RepairPlan
     attempts: int
+    token_count: int
+    no_cache: bool
+    # root of the target repository; nodes query its index for context
+    repo_path: str
+    # index of the patch candidate being generated in best-of-N mode
+    candidate: int
+    # sandbox test time spent so far; nodes return increments
+    test_seconds: Annotated[float, operator.add]
 
 
 # --- Node implementations -------------------------------------------------
@@ -39,25 +71,106 @@ class WorkflowState(TypedDict, total=False):
 def repair_node(state: WorkflowState) -> dict:
     attempt = state.get("attempts", 0) + 1
     logger.debug("repair_node attempt %d", attempt)
+    REPAIR_ITERATIONS.inc()
     result = {
         "repair_plan": RepairPlan(steps=[f"fix {attempt}"]),
         "attempts": attempt,
     }
-    logger.debug("repair_node output: %s", result)
+    logger.debug("repair_node output: %s", payload(result))
     return result
 
 
+async def arepair_node(state: WorkflowState) -> dict:
+    return repair_node(state)
+
+
+Node = Callable[..., Any]
+
+
+def _best(results: list[tuple[Patch, dict]]) -> dict:
+    patch, review = max(results, key=lambda r: r[1]["critique"].score)
+    critique = review["critique"]
+    logger.debug("best of %d candidates scored %.2f", len(results), critique.score)
+    spent = sum(r[1].get("test_seconds", 0.0) for r in results)
+    return {"patch": patch, "critique": critique, "test_seconds": spent}
+
+
+def best_of_n(
+    code: Node, critic: Node, n: int, concurrency: int, accept: float
+) -> Node:
+    """Build a node that generates ``n`` patches on a thread pool, scores
+    each with ``critic`` as it completes and keeps the best.
+
+    The round stops early once a candidate scores ``accept`` or more;
+    candidates that have not started yet are dropped. Threads cannot be
+    interrupted, so candidates already running finish in the background
+    and their results are discarded; use :func:`abest_of_n` to cancel them.
+    """
+
+    def candidate(state: WorkflowState, index: int) -> tuple[Patch, dict]:
+        patch = code({**state, "candidate": index})["patch"]
+        return patch, critic({**state, "patch": patch})
+
+    def node(state: WorkflowState) -> dict:
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, min(concurrency, n)), thread_name_prefix="asga-code"
+        )
+        pending = {pool.submit(candidate, state, i) for i in range(n)}
+        results: list[tuple[Patch, dict]] = []
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+                if max(r[1]["critique"].score for r in results) >= accept:
+                    break
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return _best(results)
+
+    return node
+
+
+def abest_of_n(
+    code: Node, critic: Node, n: int, concurrency: int, accept: float
+) -> Node:
+    """Async :func:`best_of_n`; unfinished candidates are cancelled."""
+
+    async def node(state: WorkflowState) -> dict:
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def candidate(index: int) -> tuple[Patch, dict]:
+            async with slots:
+                patch = (await code({**state, "candidate": index}))["patch"]
+                return patch, await critic({**state, "patch": patch})
+
+        tasks = [asyncio.ensure_future(candidate(i)) for i in range(n)]
+        results: list[tuple[Patch, dict]] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                results.append(await next_done)
+                if results[-1][1]["critique"].score >= accept:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+        return _best(results)
+
+    return node
+
+
 # --- Routers ---------------------------------------------------------------
 
 
-def route_after_critic(state: WorkflowState):
-    if state["critique"].score >= 0.8:
+def route_after_critic(state: WorkflowState, accept: float = CODE_ACCEPT_SCORE):
+    if state["critique"].score >= accept:
+        REPAIR_ATTEMPTS.observe(state.get("attempts", 0))
         return END
     return "repair"
 
 
 def route_after_repair(state: WorkflowState):
     if state.get("attempts", 0) >= 3:
+        REPAIR_ATTEMPTS.observe(state["attempts"])
         return END
     return "code"
 
@@ -65,27 +178,123 @@ def route_after_repair(state: WorkflowState):
 # --- Graph builder ---------------------------------------------------------
 
 
-def create_graph() -> CompiledStateGraph:
-    logger.debug("create_graph")
+SYNC_NODES: dict[str, Node] = {
+    "spec": spec_node,
+    "tests": test_node,
+    "code": code_node,
+    "critic": critic_node,
+    "repair": repair_node,
+}
+
+ASYNC_NODES: dict[str, Node] = {
+    "spec": aspec_node,
+    "tests": atest_node,
+    "code": acode_node,
+    "critic": acritic_node,
+    "repair": arepair_node,
+}
+
+
+def _timed(name: str, node: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap ``node`` so its run time lands in ``asga_node_duration_seconds``."""
+    series = NODE_SECONDS.labels(name)
+
+    if inspect.iscoroutinefunction(node):
+
+        async def atimed(state):
+            start = time.perf_counter()
+            try:
+                return await node(state)
+            finally:
+                series.observe(time.perf_counter() - start)
+
+        return atimed
+
+    def timed(state):
+        start = time.perf_counter()
+        try:
+            return node(state)
+        finally:
+            series.observe(time.perf_counter() - start)
+
+    return timed
+
+
+def create_graph(
+    async_mode: bool = False,
+    checkpointer: BaseCheckpointSaver | None = None,
+    candidates: int = CODE_CANDIDATES,
+    concurrency: int = CODE_CONCURRENCY,
+    accept_score: float = CODE_ACCEPT_SCORE,
+) -> CompiledStateGraph:
+    """Build the workflow graph.
+
+    With ``async_mode`` the nodes are coroutines and the graph must be run
+    with ``astream``/``ainvoke``. With a ``checkpointer`` the state is saved
+    after every node and callers must pass a ``thread_id`` in the config.
+    With ``candidates > 1`` the code node generates and critiques that many
+    patches, ``concurrency`` (default all) at a time (see :func:`best_of_n`),
+    and the separate critic node is skipped. This only pays off with a code
+    node that samples a different patch per ``state["candidate"]``; the
+    built-in one is deterministic. A critique scoring ``accept_score`` or
+    more ends the run; anything lower goes to repair.
+    """
+    from langgraph.graph import StateGraph
+
+    logger.debug("create_graph async=%s candidates=%d", async_mode, candidates)
     builder = StateGraph(WorkflowState)
-    builder.add_node("spec", spec_node)  # type: ignore[arg-type,call-overload]
-    builder.add_node("tests", test_node)  # type: ignore[arg-type,call-overload]
-    builder.add_node("code", code_node)  # type: ignore[arg-type,call-overload]
-    builder.add_node("critic", critic_node)  # type: ignore[arg-type,call-overload]
-    builder.add_node("repair", repair_node)  # type: ignore[arg-type,call-overload]
+    nodes = dict(ASYNC_NODES if async_mode else SYNC_NODES)
+    if candidates > 1:
+        fan_out = abest_of_n if async_mode else best_of_n
+        nodes["code"] = fan_out(
+            nodes["code"],
+            nodes.pop("critic"),
+            candidates,
+            concurrency or candidates,
+            accept_score,
+        )
+    for name, node in nodes.items():
+        builder.add_node(name, _timed(name, node))  # type: ignore[arg-type,call-overload]
 
     builder.add_edge(START, "spec")
     builder.add_edge("spec", "tests")
     builder.add_edge("tests", "code")
-    builder.add_edge("code", "critic")
-
-    builder.add_conditional_edges("critic", route_after_critic)
+    route = functools.partial(route_after_critic, accept=accept_score)
+    if candidates > 1:
+        builder.add_conditional_edges("code", route)
+    else:
+        builder.add_edge("code", "critic")
+        builder.add_conditional_edges("critic", route)
     builder.add_conditional_edges("repair", route_after_repair)
 
-    compiled = builder.compile()
+    compiled = builder.compile(checkpointer=checkpointer)
     logger.debug("graph compiled")
     return compiled
 
 
-# default compiled graph
-graph = create_graph()
+def thread_config(thread_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+# default compiled graphs, sharing the persistent checkpointer if enabled;
+# built on first access so importing this module does not load langgraph
+_DEFAULTS = ("checkpointer", "graph", "agraph")
+_defaults_lock = threading.Lock()
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _DEFAULTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _defaults_lock:
+        module = globals()
+        if "checkpointer" not in module:
+            from checkpoint import create_checkpointer
+
+            module["checkpointer"] = create_checkpointer()
+        if name == "graph" and name not in module:
+            module["graph"] = create_graph(checkpointer=module["checkpointer"])
+        if name == "agraph" and name not in module:
+            module["agraph"] = create_graph(
+                async_mode=True, checkpointer=module["checkpointer"]
+            )
+        return module[name]
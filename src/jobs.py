@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import Any
+
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class Job:
+    """Ring buffer of sequenced events for one workflow run.
+
+    Events are numbered from 1. Any number of subscribers can follow the
+    stream through :meth:`follow`, each starting after a given sequence
+    number, without consuming events for the others.
+
+    ``stop`` is set when the job is cancelled; runners check it between
+    graph nodes. ``cancelled`` holds the reason.
+    """
+
+    job_id: str
+    max_events: int
+    buffer: deque = field(init=False)
+    seq: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+    idle_since: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+    dropped: int = 0
+    subscribers: int = 0
+    tokens: int = 0
+    cancelled: str | None = None
+    stop: threading.Event = field(default_factory=threading.Event, repr=False)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def __post_init__(self) -> None:
+        self.buffer = deque(maxlen=self.max_events)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, event: Any) -> None:
+        """Append ``event``; once full the oldest buffered event is dropped.
+
+        ``None`` marks the end of the stream; later events are ignored.
+        """
+        if self.finished_at is not None:
+            return
+        if event is None:
+            self.finished_at = time.monotonic()
+        else:
+            if len(self.buffer) == self.max_events:
+                self.dropped += 1
+            self.seq += 1
+            self.buffer.append((self.seq, event))
+        self._notify()
+
+    async def follow(self, after: int = 0) -> AsyncIterator[tuple[int, Any]]:
+        """Yield ``(seq, event)`` pairs newer than ``after`` until the end."""
+        while True:
+            changed = self._changed
+            for seq, event in list(self.buffer):
+                if seq > after:
+                    after = seq
+                    yield seq, event
+            if self.finished_at is not None and after >= self.seq:
+                return
+            await changed.wait()
+
+
+class Tombstones:
+    """Compact, expiring set of retired job ids.
+
+    Ids are stored as 8-byte digests in generational sets; a whole
+    generation is dropped at once, so entries live between ``ttl`` and
+    ``ttl * (1 + 1 / generations)`` seconds without per-entry timestamps.
+    """
+
+    def __init__(self, ttl: float, generations: int = 4):
+        self.interval = ttl / generations
+        self._generations: deque[set[bytes]] = deque(
+            [set() for _ in range(generations + 1)], maxlen=generations + 1
+        )
+        self._rotated_at = time.monotonic()
+
+    @staticmethod
+    def _digest(job_id: str) -> bytes:
+        return hashlib.blake2b(job_id.encode(), digest_size=8).digest()
+
+    def _rotate(self) -> None:
+        steps = int((time.monotonic() - self._rotated_at) // self.interval)
+        if steps:
+            for _ in range(min(steps, len(self._generations))):
+                self._generations.append(set())
+            self._rotated_at += steps * self.interval
+
+    def add(self, job_id: str) -> None:
+        self._rotate()
+        self._generations[-1].add(self._digest(job_id))
+
+    def discard(self, job_id: str) -> None:
+        digest = self._digest(job_id)
+        for generation in self._generations:
+            generation.discard(digest)
+
+    def __contains__(self, job_id: str) -> bool:
+        self._rotate()
+        digest = self._digest(job_id)
+        return any(digest in generation for generation in self._generations)
+
+    def __len__(self) -> int:
+        return sum(len(generation) for generation in self._generations)
+
+
+class JobRegistry:
+    """Live jobs plus tombstones of retired ones.
+
+    Jobs nobody subscribes to are evicted after ``unclaimed_ttl`` idle
+    seconds, or ``finished_ttl`` seconds after their stream ended. Evicted and
+    consumed jobs leave a tombstone so lookups can answer ``410``.
+    """
+
+    def __init__(
+        self,
+        unclaimed_ttl: float,
+        finished_ttl: float,
+        tombstone_ttl: float,
+        max_events: int,
+    ):
+        self.unclaimed_ttl = unclaimed_ttl
+        self.finished_ttl = finished_ttl
+        self.max_events = max_events
+        self.tombstones = Tombstones(tombstone_ttl)
+        self._jobs: dict[str, Job] = {}
+        self._swept_at = time.monotonic()
+        self.evicted = 0
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._jobs
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def create(self, job_id: str) -> Job:
+        self.sweep()
+        job = Job(job_id=job_id, max_events=self.max_events)
+        self._jobs[job_id] = job
+        self.tombstones.discard(job_id)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        self.sweep()
+        return self._jobs.get(job_id)
+
+    def push(self, job_id: str, event: Any) -> None:
+        """Buffer ``event`` for ``job_id``; ignored once the job was retired."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.push(event)
+
+    def subscribe(self, job_id: str) -> Job | None:
+        """Register a subscriber so ``job_id`` is not evicted while streamed."""
+        job = self.get(job_id)
+        if job is not None:
+            job.subscribers += 1
+        return job
+
+    def unsubscribe(self, job_id: str, completed: bool) -> None:
+        """Drop a subscriber.
+
+        A job whose stream was read to the end by its last subscriber is
+        retired; otherwise it stays around for reconnects until it expires.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        job.subscribers -= 1
+        job.idle_since = time.monotonic()
+        if completed and job.subscribers == 0:
+            self.retire(job_id)
+
+    def retire(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+        self.tombstones.add(job_id)
+
+    def is_retired(self, job_id: str) -> bool:
+        return job_id in self.tombstones
+
+    def sweep(self, force: bool = False) -> None:
+        """Evict expired jobs; runs at most once per second unless forced."""
+        now = time.monotonic()
+        if not force and now - self._swept_at < 1.0:
+            return
+        self._swept_at = now
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.subscribers == 0
+            and (
+                now - job.idle_since >= self.unclaimed_ttl
+                or (
+                    job.finished_at is not None
+                    and now - job.finished_at >= self.finished_ttl
+                )
+            )
+        ]
+        for job_id in expired:
+            logger.debug("evicting unclaimed job %s", job_id)
+            self.retire(job_id)
+        self.evicted += len(expired)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "jobs": len(self._jobs),
+            "subscribers": sum(j.subscribers for j in self._jobs.values()),
+            "tombstones": len(self.tombstones),
+            "buffered_events": sum(len(j.buffer) for j in self._jobs.values()),
+            "dropped_events": sum(j.dropped for j in self._jobs.values()),
+            "evicted": self.evicted,
+        }
@@ -1,6 +1,15 @@
-from .spec_agent import spec_node
-from .critic_agent import critic_node
-from .tests_agent import test_node
-from .code_agent import code_node
+from .spec_agent import spec_node, aspec_node
+from .critic_agent import critic_node, acritic_node
+from .tests_agent import test_node, atest_node
+from .code_agent import code_node, acode_node
 
-__all__ = ["spec_node", "test_node", "code_node", "critic_node"]
+__all__ = [
+    "acode_node",
+    "acritic_node",
+    "aspec_node",
+    "atest_node",
+    "code_node",
+    "critic_node",
+    "spec_node",
+    "test_node",
+]
@@ -1,10 +1,9 @@
 from __future__ import annotations
 
-import difflib
 from typing import Dict, Any
 
-from langfuse import observe
-from utils import get_logger
+from utils import get_logger, observe
+from diffs import unified_diff
 from contracts import Tests, Patch
 
 logger = get_logger(__name__)
@@ -12,16 +11,8 @@ logger = get_logger(__name__)
 
 def _create_patch(tests: Tests) -> str:
     """Return unified diff turning failing tests into passing ones."""
-    before = tests.code.splitlines(keepends=True)
-    after_code = tests.code.replace("assert False", "assert True")
-    after = after_code.splitlines(keepends=True)
-    diff = difflib.unified_diff(
-        before,
-        after,
-        fromfile="a/tests.py",
-        tofile="b/tests.py",
-    )
-    return "".join(diff)
+    after = tests.code.replace("assert False", "assert True")
+    return "".join(unified_diff(tests.code, after, "a/tests.py", "b/tests.py"))
 
 
 @observe()
@@ -32,3 +23,8 @@ def code_node(state: Dict[str, Any]) -> Dict[str, Any]:
     result = {"patch": Patch(diff=patch_text)}
     logger.debug("code_node output diff len: %d", len(patch_text))
     return result
+
+
+async def acode_node(state: dict[str, Any]) -> dict[str, Any]:
+    """Async variant for ``astream``; the work is CPU-only so it runs inline."""
+    return code_node(state)
@@ -2,16 +2,43 @@ from __future__ import annotations
 
 from typing import Dict, Any
 
-from langfuse import observe
-from utils import get_logger, validate_envelope
-from contracts import Patch, Critique
+from utils import get_logger, observe, validate_envelope
+from config import SANDBOX_JOB_BUDGET, SANDBOX_TIMEOUT
+from contracts import Patch, Critique, Tests
+from sandbox import SandboxResult, get_sandbox
 
 logger = get_logger(__name__)
 
 
-def _score_patch(diff: str) -> float:
-    """Simple heuristic scoring for a patch diff."""
-    return 0.9 if "assert True" in diff else 0.5
+def _timeout(state: dict[str, Any]) -> float:
+    """Per-run timeout: what is left of the job's test time budget."""
+    return min(SANDBOX_TIMEOUT, SANDBOX_JOB_BUDGET - state.get("test_seconds", 0.0))
+
+
+def _feedback(result: SandboxResult) -> str:
+    if result.timed_out:
+        return "tests timed out"
+    if not result.total:
+        return "no tests ran"
+    summary = f"{result.passed}/{result.total} tests passed"
+    if result.score >= 0.8:
+        return f"looks good: {summary}"
+    tail = result.output.strip().splitlines()[-20:]
+    return "needs work: " + "\n".join([summary, *tail])
+
+
+def _critique(result: SandboxResult) -> dict[str, Any]:
+    critique = Critique(score=result.score, feedback=_feedback(result))
+    _validate_critique(critique)
+    logger.debug("critic_node score: %.2f", critique.score)
+    # cached results cost the job no test time
+    spent = 0.0 if result.cached else result.duration
+    return {"critique": critique, "test_seconds": spent}
+
+
+def _exhausted() -> dict[str, Any]:
+    logger.warning("critic_node test time budget exhausted")
+    return {"critique": Critique(score=0.0, feedback="test time budget exhausted")}
 
 
 def _validate_critique(critique: Critique) -> None:
@@ -25,12 +52,24 @@ def _validate_critique(critique: Critique) -> None:
 
 @observe()
 def critic_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Score the patch by running the generated tests against it in the
+    sandbox; the score is the share of tests that pass."""
     patch: Patch = state["patch"]
+    tests: Tests = state["tests"]
     logger.debug("critic_node diff len: %d", len(patch.diff))
-    score = _score_patch(patch.diff)
-    feedback = "looks good" if score >= 0.8 else "needs work"
-    critique = Critique(score=score, feedback=feedback)
-    _validate_critique(critique)
-    result = {"critique": critique}
-    logger.debug("critic_node score: %.2f", score)
-    return result
+    timeout = _timeout(state)
+    if timeout <= 0:
+        return _exhausted()
+    return _critique(get_sandbox().run(tests.code, patch.diff, timeout))
+
+
+@observe()
+async def acritic_node(state: dict[str, Any]) -> dict[str, Any]:
+    """Async variant for ``astream``; awaits the sandbox run off-loop."""
+    patch: Patch = state["patch"]
+    tests: Tests = state["tests"]
+    logger.debug("critic_node diff len: %d", len(patch.diff))
+    timeout = _timeout(state)
+    if timeout <= 0:
+        return _exhausted()
+    return _critique(await get_sandbox().arun(tests.code, patch.diff, timeout))
@@ -1,98 +1,324 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
 import json
-from typing import Dict, Any
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
 from config import (
+    ARTIFACT_DIR,
     OPENROUTER_MODEL,
     OPENROUTER_MAX_TOKENS,
     OPENROUTER_API_KEY,
     OPENROUTER_SEED,
 )
 
-import dspy
-from dspy.teleprompt import SIMBA
-from dspy.primitives.example import Example
-from langfuse import observe
 from contracts import FeatureRequest, Spec
-from utils import get_logger, validate_envelope
+from output_repair import chat_adapter, repair_contract
+from prompts import get_prompts
+from ratelimit import tokens_used
+from routing import get_router
+from state import repo_context
+from story_index import Match, get_story_index
+from utils import (
+    Counter,
+    Histogram,
+    get_lm,
+    get_logger,
+    get_response_cache,
+    observe,
+    payload,
+    use_shared_llm_client,
+    validate_envelope,
+)
+
+if TYPE_CHECKING:
+    import dspy
 
+logger = get_logger(__name__)
 
 # --- OpenRouter client configuration --------------------------------------
 MODEL = OPENROUTER_MODEL
 MAX_TOKENS = OPENROUTER_MAX_TOKENS
 API_KEY = OPENROUTER_API_KEY
 SEED = OPENROUTER_SEED
+TEMPERATURE = 0.0
+# prompt repository entry (``docs/spec_extractor.md``) instructing the model
+SPEC_PROMPT = "spec_extractor"
+
+
+def _lm(model: str | None = None) -> dspy.LM:
+    """The pooled LM for ``model`` (default ``MODEL``).
+
+    Applied per call with ``dspy.context`` rather than stored on the
+    predictor, so saved artifacts carry no client settings and a predictor
+    with its own LM (``set_lm``) still takes precedence. Requests are
+    seeded (responses are cached) and time out with the router's attempt
+    timeout.
+    """
+    return get_lm(
+        model=model or MODEL,
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS,
+        timeout=get_router().timeout,
+        seed=SEED,
+    )
+
+
+# dspy is only imported once a prediction (or the artifact key) is needed,
+# so importing this module for the graph or the gateway stays cheap.
+@functools.cache
+def spec_signature() -> type[dspy.Signature]:
+    """The extractor signature, instructed by the ``spec_extractor`` prompt.
+
+    The prompt comes from the shared prompt repository, with a built-in
+    fallback when it is missing. It is read once per process; the artifact
+    key covers it, so an edited prompt gets its own compiled predictor.
+    """
+    import dspy
+
+    prompt = get_prompts().get(SPEC_PROMPT)
+    instructions = prompt.text.strip() if prompt is not None else ""
+
+    class SpecExtractor(dspy.Signature):
+        __doc__ = instructions or "Extract API spec from a feature request."
+
+        user_story: str = dspy.InputField(desc="End‑user story")
+        endpoint: str = dspy.OutputField(desc="Endpoint path")
+        method: str = dspy.OutputField(desc="HTTP verb")
+        request_schema: str = dspy.OutputField(desc="Request schema JSON")
+        response_schema: str = dspy.OutputField(desc="Response schema JSON")
+
+    return SpecExtractor
+
+
+@functools.cache
+def _trainset() -> list[dspy.Example]:
+    """Small training set for SIMBA."""
+    from dspy.primitives.example import Example
+
+    return [
+        Example(
+            user_story="upload a file",
+            endpoint="/files",
+            method="POST",
+            request_schema="{}",
+            response_schema="{}",
+        ).with_inputs("user_story"),
+        Example(
+            user_story="list files",
+            endpoint="/files",
+            method="GET",
+            request_schema="{}",
+            response_schema="{}",
+        ).with_inputs("user_story"),
+    ]
+
+
+# Bump when the artifact layout or compile settings change.
+ARTIFACT_VERSION = 1
+
+spec_predictor: dspy.Module | None = None
+_predictor_lock = threading.Lock()
+
 
-lm = dspy.LM(
-    f"openai/{MODEL}",
-    api_key=API_KEY,
-    api_base="https://openrouter.ai/api/v1",
-    model_type="chat",
-    temperature=0,
-    max_tokens=MAX_TOKENS,
+def _compile_model() -> str:
+    """The model the predictor is compiled with: the spec route's first."""
+    return get_router().chain("spec")[0]
+
+
+def artifact_key() -> str:
+    """Hash of everything the compiled predictor depends on."""
+    extractor = spec_signature()
+    signature = {
+        "signature": extractor.signature,
+        "instructions": extractor.instructions,
+        "fields": {
+            name: (field.json_schema_extra or {}).get("desc")
+            for name, field in extractor.fields.items()
+        },
+    }
+    trainset = [
+        {"data": ex.toDict(), "inputs": sorted(ex.inputs().keys())}
+        for ex in _trainset()
+    ]
+    material = json.dumps(
+        {
+            "version": ARTIFACT_VERSION,
+            "model": _compile_model(),
+            "seed": SEED,
+            "signature": signature,
+            "trainset": trainset,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def artifact_path(key: str | None = None) -> Path:
+    key = key or artifact_key()
+    return Path(ARTIFACT_DIR) / f"spec_predictor-{key[:16]}.json"
+
+
+def _new_predictor() -> dspy.Module:
+    import dspy
+
+    return dspy.Predict(spec_signature(), output_format="json")
+
+
+def compile_spec_predictor(force: bool = False) -> dspy.Module:
+    """Run SIMBA over ``_trainset`` and persist the result.
+
+    Skips the optimisation pass when an artifact for the current key exists,
+    unless ``force`` is set.
+    """
+    path = artifact_path()
+    if path.exists() and not force:
+        predictor = _new_predictor()
+        predictor.load(path)
+        return predictor
+    logger.debug("compiling spec predictor -> %s", path)
+    import dspy
+    from dspy.teleprompt import SIMBA
+
+    simba = SIMBA(metric=lambda ex, pred: 1.0, bsize=1, max_steps=1)
+    with dspy.context(lm=_lm(_compile_model())):
+        predictor = simba.compile(_new_predictor(), trainset=_trainset(), seed=SEED)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    predictor.save(path)
+    return predictor
+
+
+def get_spec_predictor() -> dspy.Module:
+    """Return the compiled predictor, loading or compiling it on first use."""
+    global spec_predictor
+    if spec_predictor is None:
+        with _predictor_lock:
+            if spec_predictor is None:
+                spec_predictor = compile_spec_predictor()
+    return spec_predictor
+
+
+LLM_SECONDS = Histogram(
+    "asga_llm_call_duration_seconds", "Spec extraction LLM call latency"
 )
-dspy.configure(lm=lm)
-
-
-class SpecExtractor(dspy.Signature):
-    """Extract API spec from a feature request."""
-
-    user_story: str = dspy.InputField(desc="End‑user story")
-    endpoint: str = dspy.OutputField(desc="Endpoint path")
-    method: str = dspy.OutputField(desc="HTTP verb")
-    request_schema: str = dspy.OutputField(desc="Request schema JSON")
-    response_schema: str = dspy.OutputField(desc="Response schema JSON")
-
-
-# Small training set for SIMBA
-_trainset = [
-    Example(
-        user_story="upload a file",
-        endpoint="/files",
-        method="POST",
-        request_schema="{}",
-        response_schema="{}",
-    ).with_inputs("user_story"),
-    Example(
-        user_story="list files",
-        endpoint="/files",
-        method="GET",
-        request_schema="{}",
-        response_schema="{}",
-    ).with_inputs("user_story"),
-]
-
-_simba = SIMBA(metric=lambda ex, pred: 1.0, bsize=1, max_steps=1)
-spec_predictor = _simba.compile(
-    dspy.Predict(SpecExtractor, output_format="json"),
-    trainset=_trainset,
-    seed=SEED,
+LLM_CALLS = Counter(
+    "asga_llm_calls_total", "Spec extraction calls by result", ["result"]
 )
+LLM_TOKENS = Counter("asga_llm_tokens_total", "Tokens used by spec extraction")
+
+_FALLBACK_SPEC = {
+    "endpoint": "/demo",
+    "method": "GET",
+    "request_schema": {},
+    "response_schema": {},
+}
+
 
+def _cache_key(user_story: str) -> str:
+    models = "|".join(get_router().chain("spec"))
+    return get_response_cache().make_key(
+        models, artifact_key(), {"user_story": user_story}, SEED
+    )
+
+
+_SCHEMA_FIELDS = ("request_schema", "response_schema")
+
+
+def _parse_prediction(res: Any) -> tuple[dict, int]:
+    tokens = tokens_used(res)
+    raw = {
+        name: getattr(res, name, None)
+        for name in ("endpoint", "method", *_SCHEMA_FIELDS)
+    }
+    for name in _SCHEMA_FIELDS:
+        raw[name] = raw[name] or "{}"
+    # near-miss JSON in the schema fields is fixed here instead of falling
+    # back to the demo spec (or asking the model again)
+    data = repair_contract(raw, Spec, schema="spec", json_fields=_SCHEMA_FIELDS)
+    for name in _SCHEMA_FIELDS:
+        data[name] = json.loads(data[name])
+    return data, tokens
 
-def _call_llm(user_story: str) -> tuple[dict, int]:
+
+def _cached(key: str, bypass_cache: bool) -> dict | None:
+    cached = get_response_cache().get(key, bypass=bypass_cache)
+    if cached is not None:
+        LLM_CALLS.labels("cached").inc()
+    return cached
+
+
+def _finish(
+    key: str, user_story: str, prediction: Any, start: float
+) -> tuple[dict, int]:
+    """Parse ``prediction`` (the exception, if the call failed), record the
+    outcome and cache the spec; failures fall back to the demo spec."""
     try:
-        res = spec_predictor(user_story=user_story)
-        usage = getattr(res._raw_output, "usage", None)
-        tokens = getattr(usage, "total_tokens", 0) if usage else 0
-        return {
-            "endpoint": res.endpoint,
-            "method": res.method,
-            "request_schema": json.loads(res.request_schema or "{}"),
-            "response_schema": json.loads(res.response_schema or "{}"),
-        }, tokens
+        if isinstance(prediction, Exception):
+            raise prediction
+        data, tokens = _parse_prediction(prediction)
     except Exception:
-        logger.exception("LLM spec extraction failed for user story: %s", user_story)
-        return {
-            "endpoint": "/demo",
-            "method": "GET",
-            "request_schema": {},
-            "response_schema": {},
-        }, 0
+        LLM_CALLS.labels("error").inc()
+        logger.exception(
+            "LLM spec extraction failed for user story: %s", payload(user_story)
+        )
+        return dict(_FALLBACK_SPEC), 0
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - start)
+    LLM_CALLS.labels("ok").inc()
+    LLM_TOKENS.inc(tokens)
+    get_response_cache().set(key, data)
+    return data, tokens
 
 
-logger = get_logger(__name__)
+def _call_llm(user_story: str, bypass_cache: bool = False) -> tuple[dict, int]:
+    key = _cache_key(user_story)
+    cached = _cached(key, bypass_cache)
+    if cached is not None:
+        return cached, 0
+    import dspy
+
+    def predict(model: str) -> Any:
+        with dspy.context(lm=_lm(model), track_usage=True, adapter=chat_adapter()):
+            return get_spec_predictor()(user_story=user_story)
+
+    start = time.perf_counter()
+    try:
+        prediction: Any = get_router().call("spec", predict)
+    except Exception as exc:
+        prediction = exc
+    return _finish(key, user_story, prediction, start)
+
+
+async def _acall_llm(user_story: str, bypass_cache: bool = False) -> tuple[dict, int]:
+    """Async :func:`_call_llm` over the shared pooled HTTP client."""
+    key = _cache_key(user_story)
+    cached = _cached(key, bypass_cache)
+    if cached is not None:
+        return cached, 0
+    import dspy
+
+    start = time.perf_counter()
+    try:
+        predictor = (
+            spec_predictor
+            if spec_predictor is not None
+            else await asyncio.to_thread(get_spec_predictor)
+        )
+        use_shared_llm_client()
+
+        async def predict(model: str) -> Any:
+            with dspy.context(lm=_lm(model), track_usage=True, adapter=chat_adapter()):
+                return await predictor.acall(user_story=user_story)
+
+        prediction: Any = await get_router().acall("spec", predict)
+    except Exception as exc:
+        prediction = exc
+    return _finish(key, user_story, prediction, start)
 
 
 def _validate_spec(spec: Spec) -> None:
@@ -109,14 +335,53 @@ def _validate_spec(spec: Spec) -> None:
     validate_envelope(envelope, "spec")
 
 
-@observe()
-def spec_node(state: Dict[str, Any]) -> Dict[str, Any]:
+def _read_story(state: dict[str, Any]) -> str:
     feature: FeatureRequest = state["feature_request"]
     text = feature.user_story
-    logger.debug("spec_node input: %s", text)
+    logger.debug("spec_node input: %s", payload(text))
     if any(x in text.lower() for x in ["ignore previous", "system:"]):
         raise ValueError("possible prompt injection")
-    data, tokens = _call_llm(text)
+    context = repo_context(state, text)
+    if context:
+        logger.debug("spec_node repo context: %s", payload(context))
+        text = f"{text}\n\nRelevant repository code:\n{context}"
+    return text
+
+
+def _story_scope(state: dict[str, Any]) -> str:
+    """Stories about different repositories never share specs."""
+    repo_path = state.get("repo_path")
+    return str(Path(repo_path).resolve()) if repo_path else ""
+
+
+def _similar(state: dict[str, Any]) -> Match | None:
+    """A stored spec for a near-duplicate story; ``no_cache`` skips it."""
+    if state.get("no_cache", False):
+        return None
+    return get_story_index().lookup(
+        state["feature_request"].user_story, _story_scope(state)
+    )
+
+
+def _with_hint(text: str, match: Match | None) -> str:
+    if match is None:
+        return text
+    logger.debug("spec_node hint (%.2f): %s", match.similarity, payload(match.story))
+    return (
+        f"{text}\n\nA similar earlier story and the spec it got:\n"
+        f"{match.story}\n{json.dumps(match.spec)}"
+    )
+
+
+def _remember(state: dict[str, Any], data: dict) -> None:
+    # a failed extraction falls back to the demo spec, which is not worth keeping
+    if data != _FALLBACK_SPEC:
+        get_story_index().add(
+            state["feature_request"].user_story, data, _story_scope(state)
+        )
+
+
+def _spec_result(data: dict, tokens: int) -> dict[str, Any]:
     spec = Spec(
         endpoint=data.get("endpoint", ""),
         method=data.get("method", ""),
@@ -124,9 +389,42 @@ def spec_node(state: Dict[str, Any]) -> Dict[str, Any]:
         response_schema=json.dumps(data.get("response_schema", {})),
     )
     _validate_spec(spec)
-    logger.debug("spec_node generated spec: %s", spec)
+    logger.debug("spec_node generated spec: %s", payload(spec))
     if tokens >= MAX_TOKENS:
         raise ValueError("token budget exceeded")
     result = {"spec": spec, "token_count": tokens}
-    logger.debug("spec_node output: %s", result)
+    logger.debug("spec_node output: %s", payload(result))
+    return result
+
+
+@observe()
+def spec_node(state: dict[str, Any]) -> dict[str, Any]:
+    text = _read_story(state)
+    match = _similar(state)
+    if match is not None and match.reuse:
+        LLM_CALLS.labels("reused").inc()
+        return _spec_result(dict(match.spec), 0)
+    data, tokens = _call_llm(
+        _with_hint(text, match), bypass_cache=state.get("no_cache", False)
+    )
+    result = _spec_result(data, tokens)
+    _remember(state, data)
+    return result
+
+
+@observe()
+async def aspec_node(state: dict[str, Any]) -> dict[str, Any]:
+    text = _read_story(state)
+    # the story index is SQLite, so keep its lookups off the event loop
+    indexed = get_story_index().enabled
+    match = await asyncio.to_thread(_similar, state) if indexed else None
+    if match is not None and match.reuse:
+        LLM_CALLS.labels("reused").inc()
+        return _spec_result(dict(match.spec), 0)
+    data, tokens = await _acall_llm(
+        _with_hint(text, match), bypass_cache=state.get("no_cache", False)
+    )
+    result = _spec_result(data, tokens)
+    if indexed:
+        await asyncio.to_thread(_remember, state, data)
     return result
@@ -5,8 +5,7 @@ import random
 import textwrap
 from typing import Dict, Any
 
-from langfuse import observe
-from utils import get_logger
+from utils import get_logger, observe
 from contracts import Spec, Tests
 
 logger = get_logger(__name__)
@@ -41,3 +40,8 @@ def test_node(state: Dict[str, Any]) -> Dict[str, Any]:
     result = {"tests": Tests(code=code)}
     logger.debug("test_node output length: %d", len(code))
     return result
+
+
+async def atest_node(state: dict[str, Any]) -> dict[str, Any]:
+    """Async variant for ``astream``; the work is CPU-only so it runs inline."""
+    return test_node(state)
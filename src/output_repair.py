@@ -0,0 +1,483 @@
+"""Local repair of malformed structured LLM output.
+
+Models often answer with the right content in the wrong shape: JSON inside
+a Markdown fence or after a sentence of prose, trailing commas, single
+quotes, Python literals, a number where a string was asked for. Re-asking
+the model costs another round trip (and tokens) for what a parser can
+usually fix, so the helpers here repair the text locally first and only
+leave a retry to the caller when that fails.
+"""
+
+from __future__ import annotations
+
+import ast
+import dataclasses
+import functools
+import json
+import re
+import threading
+import typing
+from collections.abc import Iterable, Mapping
+from typing import TYPE_CHECKING, Any
+
+from jsonschema import ValidationError
+
+from utils import Counter, get_logger, validate_envelope
+
+if TYPE_CHECKING:
+    import dspy
+
+logger = get_logger(__name__)
+
+OUTPUT_REPAIRS = Counter(
+    "asga_output_repairs_total",
+    "Structured LLM outputs by contract and repair outcome",
+    ["contract", "result"],
+)
+
+_FENCE = re.compile(
+    r"```[ \t]*(?:json|JSON|js|javascript)?[ \t]*\n?(.*?)```", re.DOTALL
+)
+_SECTION = re.compile(r"^\s*\[\[ ## (\w+) ## \]\]\s*$", re.MULTILINE)
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_BARE_KEY = re.compile(r"([{,]\s*)([A-Za-z_][\w\-]*)(\s*:)")
+_LITERAL = re.compile(r"\b(?:true|false|null)\b")
+_LITERALS = {"true": "True", "false": "False", "null": "None"}
+_SMART_QUOTES = {"“": '"', "”": '"', "‘": "'", "’": "'"}
+_CLOSES = re.compile(r"\s*(?:[:,}\]]|$)")
+_BULLET = re.compile(r"^\s*(?:[-*•+]|\d+[.)])\s+")
+
+
+class RepairError(ValueError):
+    """The output could not be turned into the expected fields."""
+
+
+# --- JSON ---------------------------------------------------------------
+
+
+def _balanced(text: str, start: int) -> str | None:
+    """The bracketed value opening at ``text[start]``, strings respected."""
+    closing = {"{": "}", "[": "]"}
+    stack = [closing[text[start]]]
+    quote = None
+    escaped = False
+    for i in range(start + 1, len(text)):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch in closing:
+            stack.append(closing[ch])
+        elif ch in "}]":
+            if ch != stack.pop():
+                return None
+            if not stack:
+                return text[start : i + 1]
+    return None
+
+
+def extract_json(text: str) -> list[str]:
+    """Candidate JSON documents in ``text``, most likely first.
+
+    Fenced blocks come first, then each balanced ``{...}``/``[...]`` found
+    in the prose, outermost first.
+    """
+    candidates = [m.group(1).strip() for m in _FENCE.finditer(text)]
+    i = 0
+    while (i := _next_open(text, i)) >= 0:
+        value = _balanced(text, i)
+        if value is None:
+            i += 1
+            continue
+        candidates.append(value)
+        i += len(value)
+    return [c for c in dict.fromkeys(candidates) if c]
+
+
+def _next_open(text: str, start: int) -> int:
+    found = [i for i in (text.find("{", start), text.find("[", start)) if i >= 0]
+    return min(found, default=-1)
+
+
+def _strings(text: str) -> Iterable[tuple[bool, str]]:
+    """``(quoted, chunk)`` pieces of ``text``; quoted chunks keep their quotes."""
+    start = 0
+    quote = None
+    escaped = False
+    for i, ch in enumerate(text):
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                yield True, text[start : i + 1]
+                start, quote = i + 1, None
+        elif ch in "\"'":
+            if i > start:
+                yield False, text[start:i]
+            start, quote = i, ch
+    if start < len(text):
+        yield quote is not None, text[start:]
+
+
+def _outside_strings(text: str, pattern: re.Pattern, repl: Any) -> str:
+    """``pattern.sub(repl, ...)`` applied only outside string literals."""
+    return "".join(
+        chunk if quoted else pattern.sub(repl, chunk)
+        for quoted, chunk in _strings(text)
+    )
+
+
+def _smart_quotes(text: str) -> str:
+    """Straighten curly quotes that open or close a string.
+
+    A curly quote opens a string where a value or key starts (after ``{``,
+    ``[``, ``,``, ``:``) and closes it where one ends (before ``:``, ``,``,
+    ``}``, ``]``); anywhere else, including inside straight-quoted strings,
+    it is content and left alone.
+    """
+    out = []
+    last = ""  # last non-blank character outside strings
+    quote: str | None = None  # delimiter of the open string, straightened
+    curly = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if quote is None:
+            if ch in _SMART_QUOTES and (not last or last in "{[,:"):
+                quote, curly = _SMART_QUOTES[ch], True
+                ch = quote
+            elif ch in "\"'":
+                quote, curly = ch, False
+            elif not ch.isspace():
+                last = ch
+        elif curly:
+            if _SMART_QUOTES.get(ch) == quote and _CLOSES.match(text, i + 1):
+                ch = last = quote
+                quote = None
+        elif escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == quote:
+            quote, last = None, ch
+        out.append(ch)
+    return "".join(out)
+
+
+def _fixes(text: str) -> Iterable[tuple[str, str]]:
+    """``(step, text)`` rewrites of near-JSON, each building on the last."""
+    text = _smart_quotes(text)
+    yield "quotes", text
+    text = _outside_strings(text, _TRAILING_COMMA, r"\1")
+    yield "trailing_commas", text
+    text = _outside_strings(text, _BARE_KEY, r'\1"\2"\3')
+    yield "bare_keys", text
+
+
+def _literal(text: str) -> Any:
+    """Python-literal parse for single quotes and ``True``/``None``."""
+    text = _outside_strings(text, _LITERAL, lambda m: _LITERALS[m.group()])
+    return ast.literal_eval(text)
+
+
+def loads(text: str) -> tuple[Any, list[str]]:
+    """Parse ``text`` as JSON, repairing it if needed.
+
+    Returns the value and the repair steps taken (empty for clean JSON).
+    Raises :class:`RepairError` when no candidate parses.
+    """
+    text = text.strip()
+    try:
+        return json.loads(text), []
+    except ValueError:
+        pass
+    candidates: list[tuple[str, list[str]]] = [(text, [])]
+    candidates += [(c, ["extracted"]) for c in extract_json(text)]
+    for candidate, steps in candidates:
+        if steps:
+            # an extracted document is often clean JSON already
+            try:
+                return json.loads(candidate), list(steps)
+            except ValueError:
+                pass
+        taken = list(steps)
+        for step, fixed in _fixes(candidate):
+            if fixed == candidate:
+                continue
+            taken.append(step)
+            candidate = fixed
+            try:
+                return json.loads(fixed), taken
+            except ValueError:
+                pass
+        try:
+            value = _literal(candidate)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            continue
+        if steps == [] and not isinstance(value, (dict, list)):
+            # bare prose that happens to be a literal is not an answer
+            continue
+        return value, taken + ["python_literal"]
+    raise RepairError("no JSON value found")
+
+
+def sections(text: str) -> dict[str, str]:
+    """``[[ ## name ## ]]`` sections of a chat-formatted completion."""
+    parts = _SECTION.split(text)
+    return {
+        name: value.strip()
+        for name, value in zip(parts[1::2], parts[2::2])
+        if name != "completed"
+    }
+
+
+# --- fields ---------------------------------------------------------------
+
+
+def _key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def contract_fields(contract: type) -> dict[str, Any]:
+    """``{field: type}`` for a dataclass from :mod:`contracts`."""
+    hints = typing.get_type_hints(contract)
+    return {f.name: hints[f.name] for f in dataclasses.fields(contract)}
+
+
+def match_fields(data: Any, names: Iterable[str]) -> tuple[dict[str, Any], list[str]]:
+    """Pick ``names`` out of ``data``, tolerating case, ``-``/``_`` and one
+    wrapping object such as ``{"payload": {...}}``."""
+    names = list(names)
+    if not isinstance(data, Mapping):
+        return {}, []
+    found = {n: data[n] for n in names if n in data}
+    steps = []
+    if len(found) < len(names):
+        loose = {_key(k): v for k, v in data.items()}
+        for name in names:
+            if name not in found and _key(name) in loose:
+                found[name] = loose[_key(name)]
+                steps.append("renamed")
+    if len(found) < len(names):
+        nested = [v for v in data.values() if isinstance(v, Mapping)]
+        for inner in nested:
+            more, _ = match_fields(inner, [n for n in names if n not in found])
+            if more:
+                found.update(more)
+                steps.append("unwrapped")
+    return found, sorted(set(steps))
+
+
+def _as_text_list(value: str) -> list[str]:
+    items = [_BULLET.sub("", line).strip() for line in value.splitlines()]
+    return [item for item in items if item]
+
+
+def coerce(value: Any, annotation: Any, json_field: bool = False) -> Any:
+    """Convert ``value`` to ``annotation`` where the intent is clear.
+
+    ``json_field`` marks a ``str`` field that must hold JSON text (a schema,
+    say): objects are serialised and near-JSON strings are repaired.
+    """
+    if value is None:
+        raise RepairError("missing value")
+    origin = typing.get_origin(annotation)
+    if annotation is str:
+        if json_field:
+            if isinstance(value, str):
+                try:
+                    json.loads(value)
+                    return value
+                except ValueError:
+                    value = loads(value)[0]
+            return json.dumps(value)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return value if isinstance(value, str) else str(value)
+    if annotation in (int, float):
+        if isinstance(value, bool):
+            raise RepairError(f"{value!r} is not a number")
+        try:
+            number = float(str(value).strip().rstrip("%"))
+        except ValueError:
+            raise RepairError(f"{value!r} is not a number") from None
+        return int(number) if annotation is int and number.is_integer() else number
+    if annotation is bool:
+        if isinstance(value, str):
+            if value.strip().lower() in ("true", "yes", "1"):
+                return True
+            if value.strip().lower() in ("false", "no", "0"):
+                return False
+            raise RepairError(f"{value!r} is not a boolean")
+        return bool(value)
+    if origin is list:
+        (item_type,) = typing.get_args(annotation) or (Any,)
+        if isinstance(value, str):
+            try:
+                parsed = loads(value)[0]
+            except RepairError:
+                parsed = _as_text_list(value)
+            value = parsed if isinstance(parsed, list) else [parsed]
+        if not isinstance(value, list):
+            value = [value]
+        return [coerce(item, item_type) for item in value]
+    if annotation in (dict, Any) or origin is dict:
+        if isinstance(value, str):
+            value = loads(value)[0]
+        return value
+    return value
+
+
+def repair_fields(
+    raw: str | Mapping[str, Any],
+    fields: Mapping[str, Any],
+    json_fields: Iterable[str] = (),
+    partial: Mapping[str, Any] | None = None,
+) -> tuple[dict[str, Any], list[str]]:
+    """Recover ``fields`` (``{name: type}``) from ``raw`` model output.
+
+    ``raw`` is completion text or an already split mapping; ``partial``
+    holds values a stricter parser got before giving up. Returns the
+    coerced values and the repair steps taken; raises :class:`RepairError`
+    when a field is missing or cannot be converted.
+    """
+    json_fields = set(json_fields)
+    steps: list[str] = []
+    data: dict[str, Any] = dict(partial or {})
+    if isinstance(raw, Mapping):
+        found, taken = match_fields(raw, fields)
+        data.update(found)
+        steps += taken
+    else:
+        try:
+            value, taken = loads(raw)
+            found, more = match_fields(value, fields)
+        except RepairError:
+            found, taken, more = {}, [], []
+        if found:
+            data.update(found)
+            steps += taken + more
+        else:
+            found, more = match_fields(sections(raw), fields)
+            data.update({k: v for k, v in found.items() if k not in data})
+            steps += ["sections"] + more if found else []
+        if not data and len(fields) == 1 and raw.strip():
+            # a single-field answer given without any structure
+            (name,) = fields
+            data[name] = raw.strip()
+            steps.append("bare_text")
+    missing = [name for name in fields if name not in data]
+    if missing:
+        raise RepairError(f"missing fields: {', '.join(missing)}")
+    out = {}
+    for name, annotation in fields.items():
+        value = data[name]
+        try:
+            out[name] = coerce(value, annotation, json_field=name in json_fields)
+        except RepairError as exc:
+            raise RepairError(f"{name}: {exc}") from None
+        if out[name] != value:
+            steps.append("coerced")
+    return out, sorted(set(steps))
+
+
+# --- accounting -----------------------------------------------------------
+
+_counts: dict[str, dict[str, int]] = {}
+_counts_lock = threading.Lock()
+
+
+def record(contract: str, result: str) -> None:
+    """Count one ``clean``/``repaired``/``failed`` outcome for ``contract``."""
+    OUTPUT_REPAIRS.labels(contract, result).inc()
+    with _counts_lock:
+        counts = _counts.setdefault(contract, {})
+        counts[result] = counts.get(result, 0) + 1
+
+
+def stats() -> dict:
+    """Outcomes per contract and the share of broken outputs repaired."""
+    with _counts_lock:
+        counts = {name: dict(c) for name, c in _counts.items()}
+    out = {}
+    for name, c in counts.items():
+        repaired, failed = c.get("repaired", 0), c.get("failed", 0)
+        out[name] = {
+            "clean": c.get("clean", 0),
+            "repaired": repaired,
+            "failed": failed,
+            "repair_rate": (
+                round(repaired / (repaired + failed), 3) if repaired + failed else None
+            ),
+        }
+    return out
+
+
+def repair_contract(
+    raw: str | Mapping[str, Any],
+    contract: type,
+    schema: str | None = None,
+    json_fields: Iterable[str] = (),
+) -> dict[str, Any]:
+    """Fields of ``contract`` from ``raw``, repaired and validated.
+
+    With ``schema`` the result must pass the MCP envelope schema of that
+    name. The outcome is counted under the contract's name.
+    """
+    name = contract.__name__
+    try:
+        payload, steps = repair_fields(raw, contract_fields(contract), json_fields)
+        if schema:
+            envelope = {"context": {}, "payload": payload, "tool_calls": []}
+            validate_envelope(envelope, schema)
+    except (RepairError, ValidationError) as exc:
+        record(name, "failed")
+        raise RepairError(f"{name}: {getattr(exc, 'message', exc)}") from None
+    record(name, "repaired" if steps else "clean")
+    if steps:
+        logger.debug("repaired %s output: %s", name, ", ".join(steps))
+    return payload
+
+
+# --- dspy -----------------------------------------------------------------
+
+
+@functools.cache
+def chat_adapter() -> dspy.ChatAdapter:
+    """A ``dspy.ChatAdapter`` that repairs what it cannot parse.
+
+    The stock adapter answers a parse failure by calling the model again in
+    JSON mode; this one first tries :func:`repair_fields` on the completion
+    and only falls back to that extra call when the repair fails.
+    """
+    import dspy
+    from dspy.utils.exceptions import AdapterParseError
+
+    class RepairingChatAdapter(dspy.ChatAdapter):
+        def parse(self, signature: Any, completion: str) -> dict[str, Any]:
+            name = signature.__name__
+            try:
+                parsed = super().parse(signature, completion)
+            except AdapterParseError as exc:
+                fields = {k: f.annotation for k, f in signature.output_fields.items()}
+                partial = exc.parsed_result if exc.parsed_result else None
+                try:
+                    repaired, steps = repair_fields(completion, fields, partial=partial)
+                except RepairError as err:
+                    record(name, "failed")
+                    logger.debug("could not repair %s output: %s", name, err)
+                    raise exc from None
+                record(name, "repaired")
+                logger.debug("repaired %s output: %s", name, ", ".join(steps))
+                return repaired
+            record(name, "clean")
+            return parsed
+
+    return RepairingChatAdapter()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from config import PROMPT_CHECK_INTERVAL, PROMPT_DIR
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_DIR = Path(__file__).resolve().parents[1] / "docs"
+_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class Prompt(NamedTuple):
+    name: str
+    text: str
+    data: bytes
+    etag: str
+    mtime_ns: int
+
+
+class _Entry(NamedTuple):
+    prompt: Prompt | None
+    checked: float
+
+
+class PromptRepository:
+    """Prompt files (``<name>.md`` under ``root``) cached in memory.
+
+    Each file is read once and kept with its encoded bytes and a content
+    ETag. Its mtime is re-checked at most every ``check_interval`` seconds
+    and the file is re-read only when the mtime changed, so hot reads do
+    no disk I/O at all. Names are checked against a listing of ``root``
+    refreshed on the same interval, so a missing name costs no disk I/O
+    either and only prompts that exist are ever cached.
+    """
+
+    def __init__(
+        self,
+        root: str | Path | None = PROMPT_DIR or None,
+        check_interval: float = PROMPT_CHECK_INTERVAL,
+    ):
+        self.root = Path(root).resolve() if root else DEFAULT_DIR
+        self.check_interval = check_interval
+        self._entries: dict[str, _Entry] = {}
+        self._names: frozenset[str] = frozenset()
+        self._listed = -math.inf
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def _load(self, name: str, previous: Prompt | None) -> Prompt | None:
+        path = self.root / f"{name}.md"
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if previous is not None and previous.mtime_ns == mtime_ns:
+            return previous
+        data = path.read_bytes()
+        self.loads += 1
+        logger.debug("loaded prompt %s (%d bytes)", name, len(data))
+        etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+        return Prompt(name, data.decode(), data, etag, mtime_ns)
+
+    def _listing(self, now: float) -> frozenset[str]:
+        """Prompt names under ``root``, listed at most every ``check_interval``."""
+        if now - self._listed < self.check_interval:
+            return self._names
+        with self._lock:
+            if now - self._listed >= self.check_interval:
+                try:
+                    names = frozenset(
+                        path.stem for path in self.root.glob("*.md") if path.is_file()
+                    )
+                except OSError:
+                    names = frozenset()
+                for name in self._entries.keys() - names:
+                    del self._entries[name]
+                self._names, self._listed = names, now
+            return self._names
+
+    def get(self, name: str) -> Prompt | None:
+        """Return prompt ``name`` or ``None`` if there is no such file."""
+        now = time.monotonic()
+        if not _NAME.fullmatch(name) or name not in self._listing(now):
+            return None
+        entry = self._entries.get(name)
+        if entry is not None and now - entry.checked < self.check_interval:
+            self.hits += 1
+            return entry.prompt
+        with self._lock:
+            entry = self._entries.get(name)
+            prompt = self._load(name, entry.prompt if entry else None)
+            self._entries[name] = _Entry(prompt, now)
+        return prompt
+
+    def text(self, name: str) -> str:
+        """Prompt text for in-process callers; raises ``KeyError`` if missing."""
+        prompt = self.get(name)
+        if prompt is None:
+            raise KeyError(f"prompt {name!r} not found in {self.root}")
+        return prompt.text
+
+    def stats(self) -> dict[str, int]:
+        return {"cached": len(self._entries), "hits": self.hits, "loads": self.loads}
+
+
+_prompts: PromptRepository | None = None
+
+
+def get_prompts() -> PromptRepository:
+    """Return the process-wide prompt repository, creating it on first use."""
+    global _prompts
+    if _prompts is None:
+        _prompts = PromptRepository()
+    return _prompts
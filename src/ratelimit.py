@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, NamedTuple, TypeVar
+
+from config import (
+    RATE_LIMIT_BACKOFF,
+    RATE_LIMIT_BACKOFF_MAX,
+    RATE_LIMIT_PATH,
+    RATE_LIMIT_RETRIES,
+    RATE_LIMIT_RPM,
+    RATE_LIMIT_TPM,
+)
+from utils import Counter, Histogram, get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+RATE_LIMIT_WAIT = Histogram(
+    "asga_rate_limit_wait_seconds", "Time LLM calls waited for rate limit capacity"
+)
+LLM_RETRIES = Counter(
+    "asga_llm_retries_total", "LLM calls retried after a 429/5xx", ["status"]
+)
+
+RETRYABLE = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class Bucket(NamedTuple):
+    key: str
+    capacity: float
+    # refill per second
+    rate: float
+
+
+def status_of(error: BaseException) -> int | None:
+    """HTTP status carried by a litellm/httpx/openai error, if any."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Seconds from a ``Retry-After`` header on ``error``'s response."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", "")))
+    except (TypeError, ValueError):
+        return None
+
+
+def tokens_used(result: Any) -> int:
+    """Total tokens reported on a dspy prediction (``track_usage``)."""
+    usage = getattr(result, "get_lm_usage", lambda: None)() or {}
+    return sum(int((u or {}).get("total_tokens") or 0) for u in usage.values())
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute, plus backoff.
+
+    Each bucket holds ``burst`` seconds of quota (one minute by default)
+    and refills continuously, so a burst may spend that much allowance
+    before calls start waiting.
+    A call reserves one request and the running mean of tokens per call,
+    then settles the difference once its real usage is known; the token
+    bucket may go into debt, which later calls wait out. With a ``path``
+    the buckets live in SQLite and every process using the file shares
+    them; ``None`` keeps them in memory, as does a limiter with neither
+    limit set, so unlimited calls never touch the file.
+
+    :meth:`call` retries 429/5xx answers with full-jitter exponential
+    backoff (or ``Retry-After``), at most ``backoff_max`` seconds. A 429
+    also pauses every caller of the shared buckets for that delay, so
+    workers back off together instead of each probing the provider.
+    """
+
+    def __init__(
+        self,
+        name: str = "llm",
+        rpm: float = RATE_LIMIT_RPM,
+        tpm: float = RATE_LIMIT_TPM,
+        path: str | Path | None = RATE_LIMIT_PATH or None,
+        retries: int = RATE_LIMIT_RETRIES,
+        backoff: float = RATE_LIMIT_BACKOFF,
+        backoff_max: float = RATE_LIMIT_BACKOFF_MAX,
+        burst: float = 60.0,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.requests = self.tokens = None
+        if rpm > 0:
+            self.requests = Bucket(f"{name}:requests", rpm * burst / 60, rpm / 60)
+        if tpm > 0:
+            self.tokens = Bucket(f"{name}:tokens", tpm * burst / 60, tpm / 60)
+        self.hold_key = f"{name}:hold"
+        self.path = path
+        # only shared buckets need the file (and its cross-process lock)
+        self._shared = path is not None and (rpm > 0 or tpm > 0)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.sleep = sleep
+        self._memory: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._mean_tokens = 0.0
+        self.waited = 0.0
+        self.retried = 0
+
+    # --- bucket state -----------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection | None:
+        if self.path is None or not self._shared:
+            return None
+        if self._db is None:
+            if str(self.path) != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                str(self.path),
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, level REAL, updated REAL)"
+            )
+        return self._db
+
+    @contextmanager
+    def _state(self) -> Iterator[dict[str, tuple[float, float]]]:
+        """``{key: (level, updated)}`` for this limiter, saved on exit.
+
+        The SQLite variant holds a write lock for the block, so a read,
+        refill and debit is atomic across processes.
+        """
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                yield self._memory
+                return
+            keys = [self.hold_key] + [b.key for b in (self.requests, self.tokens) if b]
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT key, level, updated FROM buckets WHERE key IN "
+                    f"({','.join('?' * len(keys))})",
+                    keys,
+                ).fetchall()
+                state = {key: (level, updated) for key, level, updated in rows}
+                yield state
+                db.executemany(
+                    "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                    [(key, *state[key]) for key in keys if key in state],
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _level(state: dict, bucket: Bucket, now: float) -> float:
+        level, updated = state.get(bucket.key, (bucket.capacity, now))
+        return min(bucket.capacity, level + max(0.0, now - updated) * bucket.rate)
+
+    def _reserve(self, tokens: float) -> float:
+        """Take one request and ``tokens``, or return seconds until possible."""
+        now = self.clock()
+        costs = [(self.requests, 1.0), (self.tokens, tokens)]
+        with self._state() as state:
+            hold = state.get(self.hold_key, (0.0, 0.0))[0]
+            if hold > now:
+                return hold - now
+            wait = 0.0
+            levels = []
+            for bucket, cost in costs:
+                if bucket is None:
+                    continue
+                level = self._level(state, bucket, now)
+                # a call larger than the whole bucket goes once it is full
+                cost = min(cost, bucket.capacity)
+                wait = max(wait, (cost - level) / bucket.rate)
+                levels.append((bucket, level - cost))
+            if wait > 0:
+                return wait
+            for bucket, level in levels:
+                state[bucket.key] = (level, now)
+        return 0.0
+
+    def _settle(self, reserved: float, used: float) -> None:
+        """Charge (or refund) the token bucket for ``used - reserved``."""
+        if self.tokens is None or used == reserved:
+            return
+        now = self.clock()
+        with self._state() as state:
+            level = self._level(state, self.tokens, now) - (used - reserved)
+            state[self.tokens.key] = (level, now)
+
+    def hold(self, seconds: float) -> None:
+        """Pause every caller sharing these buckets for ``seconds``."""
+        now = self.clock()
+        with self._state() as state:
+            until = max(state.get(self.hold_key, (0.0, 0.0))[0], now + seconds)
+            state[self.hold_key] = (until, now)
+
+    # --- waiting ----------------------------------------------------------
+
+    def _estimate(self) -> float:
+        return self._mean_tokens if self.tokens else 0.0
+
+    def _observe(self, reserved: float, used: int) -> None:
+        self._settle(reserved, used)
+        if used:
+            self._mean_tokens += 0.2 * (used - self._mean_tokens)
+
+    def acquire(self, tokens: float = 0.0) -> float:
+        """Block until a request for ``tokens`` fits; returns seconds waited."""
+        waited = 0.0
+        while (wait := self._reserve(tokens)) > 0:
+            self.sleep(wait)
+            waited += wait
+        self._waited(waited)
+        return waited
+
+    async def aacquire(self, tokens: float = 0.0) -> float:
+        waited = 0.0
+        while True:
+            wait = await self._offload(self._reserve, tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        self._waited(waited)
+        return waited
+
+    async def _offload(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run a bucket update in a thread when it goes through SQLite,
+        which may wait on another process's write lock."""
+        if not self._shared:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    def _waited(self, seconds: float) -> None:
+        RATE_LIMIT_WAIT.observe(seconds)
+        if seconds:
+            with self._lock:
+                self.waited += seconds
+
+    def delay(self, attempt: int, error: BaseException) -> float:
+        """Backoff before retry ``attempt`` (0-based) after ``error``."""
+        hinted = retry_after(error)
+        if hinted is not None:
+            # the provider knows when its window resets; retrying earlier
+            # only earns another 429. It is still capped, since a bad header
+            # would otherwise park every worker sharing the buckets.
+            return min(hinted, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2**attempt))
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float | None:
+        """Delay before retrying ``error``, or ``None`` to give up."""
+        status = status_of(error)
+        if status not in RETRYABLE or attempt >= self.retries:
+            return None
+        delay = self.delay(attempt, error)
+        if status == 429:
+            self.hold(delay)
+        LLM_RETRIES.labels(str(status)).inc()
+        with self._lock:
+            self.retried += 1
+        logger.warning("LLM call got %s, retrying in %.2fs", status, delay)
+        return delay
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Run ``fn`` within the limits, retrying 429/5xx with backoff."""
+        for attempt in range(self.retries + 1):
+            reserved = self._estimate()
+            self.acquire(reserved)
+            try:
+                result = fn()
+            except Exception as exc:
+                self._settle(reserved, 0)
+                delay = self._retry_delay(attempt, exc)
+                if delay is None:
+                    raise
+                self.sleep(delay)
+                continue
+            self._observe(reserved, tokens_used(result))
+            return result
+        raise AssertionError("unreachable")
+
+    async def acall(self, fn: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(self.retries + 1):
+            reserved = self._estimate()
+            await self.aacquire(reserved)
+            try:
+                result = await fn()
+            except Exception as exc:
+                await self._offload(self._settle, reserved, 0)
+                # a 429 also holds the shared buckets
+                delay = await self._offload(self._retry_delay, attempt, exc)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            await self._offload(self._observe, reserved, tokens_used(result))
+            return result
+        raise AssertionError("unreachable")
+
+    def stats(self) -> dict:
+        return {
+            "rpm": self.requests.rate * 60 if self.requests else 0,
+            "tpm": self.tokens.rate * 60 if self.tokens else 0,
+            "waited": round(self.waited, 3),
+            "retried": self.retried,
+            "mean_tokens": round(self._mean_tokens, 1),
+        }
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide limiter configured from ``ASGA_RATE_LIMIT_*``."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
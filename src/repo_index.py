@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+import ast
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+from config import REPO_CONTEXT_CHARS, REPO_INDEX_MAX_FILE_BYTES, REPO_INDEX_PATH
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+SKIP_DIRS = {"__pycache__", "node_modules", "venv", "build", "dist"}
+
+_WORDS = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+_STOP = {"the", "and", "for", "with", "from", "that", "this", "are", "was", "not"}
+NAME_WEIGHT = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, module TEXT, mtime_ns INTEGER, size INTEGER,
+    hash TEXT, error TEXT);
+CREATE TABLE IF NOT EXISTS symbols (
+    id INTEGER PRIMARY KEY, path TEXT, qualname TEXT, name TEXT, kind TEXT,
+    lineno INTEGER, signature TEXT, doc TEXT);
+CREATE INDEX IF NOT EXISTS symbols_path ON symbols(path);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols(name);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT, symbol INTEGER, path TEXT, weight INTEGER);
+CREATE INDEX IF NOT EXISTS terms_term ON terms(term);
+CREATE INDEX IF NOT EXISTS terms_path ON terms(path);
+CREATE TABLE IF NOT EXISTS imports (path TEXT, module TEXT);
+CREATE INDEX IF NOT EXISTS imports_path ON imports(path);
+CREATE INDEX IF NOT EXISTS imports_module ON imports(module);
+"""
+
+
+class Symbol(NamedTuple):
+    path: str
+    qualname: str
+    kind: str
+    lineno: int
+    signature: str
+    doc: str
+
+
+def terms(text: str) -> set[str]:
+    """Lower-cased words of ``text``, splitting snake_case and CamelCase."""
+    return {
+        word.lower()
+        for word in _WORDS.findall(text)
+        if len(word) > 1 and word.lower() not in _STOP
+    }
+
+
+def module_name(path: str) -> str:
+    """Dotted module name of a repository-relative ``.py`` path."""
+    parts = path[: -len(".py")].split("/")
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+
+def _signature(node: ast.AST) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(base) for base in node.bases)
+        return f"class {node.name}({bases})" if bases else f"class {node.name}"
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+        return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+    return ""
+
+
+def _doc(node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef) -> str:
+    doc = ast.get_docstring(node, clean=True)
+    return doc.strip().splitlines()[0][:120] if doc else ""
+
+
+def parse_symbols(tree: ast.Module) -> Iterator[tuple[str, str, str, int, str, str]]:
+    """Yield ``(qualname, name, kind, lineno, signature, doc)`` for module
+    level definitions, classes and their methods."""
+    stack: list[tuple[list[ast.stmt], str]] = [(tree.body, "")]
+    while stack:
+        body, prefix = stack.pop()
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                kind = (
+                    "class"
+                    if isinstance(node, ast.ClassDef)
+                    else "method" if prefix else "function"
+                )
+                qualname = prefix + node.name
+                signature, doc = _signature(node), _doc(node)
+                yield qualname, node.name, kind, node.lineno, signature, doc
+                if isinstance(node, ast.ClassDef):
+                    stack.append((node.body, qualname + "."))
+            elif not prefix and isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = (
+                    node.targets if isinstance(node, ast.Assign) else [node.target]
+                )
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        yield target.id, target.id, "variable", node.lineno, "", ""
+
+
+def parse_imports(tree: ast.Module, module: str, is_package: bool) -> set[str]:
+    """Absolute module names imported anywhere in ``tree``.
+
+    ``from pkg import name`` records both ``pkg`` and ``pkg.name``, since
+    ``name`` may be a submodule; relative imports are resolved against
+    ``module``.
+    """
+    found: set[str] = set()
+    package = module.split(".") if is_package else module.split(".")[:-1]
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parent = package[: len(package) - node.level + 1]
+                base = ".".join(parent + ([base] if base else []))
+            if base:
+                found.add(base)
+            found.update(
+                f"{base}.{alias.name}" if base else alias.name
+                for alias in node.names
+                if alias.name != "*"
+            )
+    return found
+
+
+class RepoIndex:
+    """Persistent, incrementally updated index of a Python repository.
+
+    Records a content hash per ``.py`` file, a symbol table (classes,
+    functions, methods and module-level names with signatures and first
+    docstring lines) and the import graph, in a SQLite file. :meth:`refresh`
+    only stats files whose size and mtime are unchanged, and re-parses a
+    file only when its hash changed too, so refreshing an unchanged tree
+    costs one directory walk.
+    """
+
+    def __init__(self, root: str | Path, path: str | Path | None = None):
+        self.root = Path(root).resolve()
+        self.path = Path(path) if path else self.root / REPO_INDEX_PATH
+        if str(self.path) != ":memory:":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._modules: dict[str, str] | None = None
+        self.refreshed = 0.0
+
+    # --- indexing ----------------------------------------------------------
+
+    def _walk(self) -> Iterator[tuple[str, os.DirEntry]]:
+        root = str(self.root)
+        skip = len(root) + 1
+        stack = [root]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if not name.startswith(".") and name not in SKIP_DIRS:
+                            stack.append(entry.path)
+                    elif name.endswith(".py") and entry.is_file(follow_symlinks=False):
+                        yield entry.path[skip:].replace(os.sep, "/"), entry
+
+    def _forget(self, path: str) -> None:
+        for table in ("files", "symbols", "terms", "imports"):
+            self._db.execute(f"DELETE FROM {table} WHERE path = ?", (path,))
+
+    def _index_file(self, path: str, data: bytes, digest: str, stat) -> None:
+        self._forget(path)
+        module = module_name(path)
+        error = None
+        symbols: list[tuple[str, str, str, int, str, str]] = []
+        imports: set[str] = set()
+        if len(data) <= REPO_INDEX_MAX_FILE_BYTES:
+            try:
+                tree = ast.parse(data, filename=path)
+            except (SyntaxError, ValueError) as exc:
+                error = f"{type(exc).__name__}: {exc}"
+            else:
+                symbols = list(parse_symbols(tree))
+                imports = parse_imports(tree, module, path.endswith("__init__.py"))
+        else:
+            error = "too large to parse"
+        self._db.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            (path, module, stat.st_mtime_ns, stat.st_size, digest, error),
+        )
+        for qualname, name, kind, lineno, signature, doc in symbols:
+            cur = self._db.execute(
+                "INSERT INTO symbols (path, qualname, name, kind, lineno, signature,"
+                " doc) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, qualname, name, kind, lineno, signature, doc),
+            )
+            weights = dict.fromkeys(terms(doc), 1)
+            weights.update(dict.fromkeys(terms(name) | {name.lower()}, NAME_WEIGHT))
+            self._db.executemany(
+                "INSERT INTO terms VALUES (?, ?, ?, ?)",
+                [(term, cur.lastrowid, path, w) for term, w in weights.items()],
+            )
+        self._db.executemany(
+            "INSERT INTO imports VALUES (?, ?)", [(path, m) for m in sorted(imports)]
+        )
+
+    def refresh(self) -> dict[str, int]:
+        """Bring the index up to date with the working tree.
+
+        Returns counts of files seen, re-parsed, touched (mtime changed but
+        content identical) and removed.
+        """
+        with self._lock:
+            known = {
+                row[0]: row[1:]
+                for row in self._db.execute(
+                    "SELECT path, mtime_ns, size, hash FROM files"
+                )
+            }
+            seen = 0
+            changed = touched = 0
+            present: set[str] = set()
+            for path, entry in self._walk():
+                seen += 1
+                present.add(path)
+                stat = entry.stat(follow_symlinks=False)
+                old = known.get(path)
+                if old and old[0] == stat.st_mtime_ns and old[1] == stat.st_size:
+                    continue
+                data = Path(entry.path).read_bytes()
+                digest = hashlib.sha256(data).hexdigest()
+                if old and old[2] == digest:
+                    self._db.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?",
+                        (stat.st_mtime_ns, stat.st_size, path),
+                    )
+                    touched += 1
+                    continue
+                self._index_file(path, data, digest, stat)
+                changed += 1
+            removed = known.keys() - present
+            for path in removed:
+                self._forget(path)
+            self._db.commit()
+            if changed or removed:
+                self._modules = None
+            self.refreshed = time.monotonic()
+        stats = {
+            "files": seen,
+            "changed": changed,
+            "touched": touched,
+            "removed": len(removed),
+        }
+        if changed or removed:
+            logger.info("repo index %s updated: %s", self.root, stats)
+        return stats
+
+    def refresh_if_stale(self, max_age: float) -> None:
+        if time.monotonic() - self.refreshed >= max_age:
+            self.refresh()
+
+    # --- queries -----------------------------------------------------------
+
+    def _query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def file_hash(self, path: str) -> str | None:
+        rows = self._query("SELECT hash FROM files WHERE path = ?", (path,))
+        return rows[0][0] if rows else None
+
+    def symbols(self, path: str) -> list[Symbol]:
+        """Definitions in ``path`` in source order."""
+        return [
+            Symbol(*row)
+            for row in self._query(
+                "SELECT path, qualname, kind, lineno, signature, doc FROM symbols"
+                " WHERE path = ? ORDER BY lineno",
+                (path,),
+            )
+        ]
+
+    def find(self, name: str) -> list[Symbol]:
+        """Definitions whose name or qualified name is ``name``."""
+        return [
+            Symbol(*row)
+            for row in self._query(
+                "SELECT path, qualname, kind, lineno, signature, doc FROM symbols"
+                " WHERE name = ? OR qualname = ? ORDER BY path, lineno",
+                (name, name),
+            )
+        ]
+
+    def search(self, query: str, limit: int = 20) -> list[Symbol]:
+        """Definitions ranked by how many of the query's words their name
+        (weighted) and docstring contain."""
+        words = sorted(terms(query) | {w.lower() for w in query.split()})
+        if not words:
+            return []
+        marks = ", ".join("?" * len(words))
+        rows = self._query(
+            "SELECT s.path, s.qualname, s.kind, s.lineno, s.signature, s.doc"
+            f" FROM terms t JOIN symbols s ON s.id = t.symbol WHERE t.term IN ({marks})"
+            " GROUP BY t.symbol ORDER BY SUM(t.weight) DESC, s.path, s.lineno"
+            " LIMIT ?",
+            (*words, limit),
+        )
+        return [Symbol(*row) for row in rows]
+
+    def _module_map(self) -> dict[str, str]:
+        """Module name -> path, also keyed by every dotted suffix so that
+        src layouts resolve (``utils.x`` finds ``src/utils/x.py``); exact
+        names win over suffixes."""
+        modules = self._modules
+        if modules is None:
+            rows = self._query("SELECT module, path FROM files ORDER BY module")
+            modules = {}
+            for module, path in rows:
+                parts = module.split(".")
+                for i in range(1, len(parts)):
+                    modules.setdefault(".".join(parts[i:]), path)
+            modules.update(rows)
+            self._modules = modules
+        return modules
+
+    def dependencies(self, path: str) -> list[str]:
+        """Indexed files that ``path`` imports."""
+        modules = self._module_map()
+        rows = self._query("SELECT module FROM imports WHERE path = ?", (path,))
+        found = {modules[row[0]] for row in rows if row[0] in modules}
+        found.discard(path)
+        return sorted(found)
+
+    def dependents(self, path: str) -> list[str]:
+        """Indexed files that import ``path``."""
+        parts = module_name(path).split(".")
+        names = [".".join(parts[i:]) for i in range(len(parts))]
+        marks = ", ".join("?" * len(names))
+        rows = self._query(
+            f"SELECT DISTINCT path FROM imports WHERE module IN ({marks})",
+            tuple(names),
+        )
+        return sorted(row[0] for row in rows if row[0] != path)
+
+    def context(self, query: str, max_chars: int = REPO_CONTEXT_CHARS) -> str:
+        """Compact outline of the definitions most relevant to ``query``.
+
+        Groups matches by file, each headed by the file's local imports, and
+        lists signatures with first docstring lines instead of source, up to
+        ``max_chars``. Returns ``""`` when nothing matches.
+        """
+        by_file: dict[str, list[Symbol]] = {}
+        for symbol in self.search(query, limit=50):
+            by_file.setdefault(symbol.path, []).append(symbol)
+        lines: list[str] = []
+        size = 0
+        for path, symbols in by_file.items():
+            deps = self.dependencies(path)
+            block = [f"# {path}" + (f" (imports {', '.join(deps)})" if deps else "")]
+            for symbol in sorted(symbols, key=lambda s: s.lineno):
+                text = symbol.signature or f"{symbol.qualname} = ..."
+                doc = f"  # {symbol.doc}" if symbol.doc else ""
+                block.append(f"{symbol.lineno}: {text}{doc}")
+            chunk = "\n".join(block)
+            if size + len(chunk) > max_chars:
+                break
+            lines.append(chunk)
+            size += len(chunk) + 1
+        return "\n".join(lines)
+
+    def stats(self) -> dict[str, int]:
+        files, errors = self._query("SELECT COUNT(*), COUNT(error) FROM files")[0]
+        symbols = self._query("SELECT COUNT(*) FROM symbols")[0][0]
+        return {"files": files, "unparsed": errors, "symbols": symbols}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_indexes: dict[Path, RepoIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_repo_index(root: str | Path) -> RepoIndex:
+    """Return the shared index for the repository at ``root``."""
+    key = Path(root).resolve()
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = RepoIndex(key)
+        return index
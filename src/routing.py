@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, TypeVar
+
+from config import (
+    MODEL_HEDGE,
+    MODEL_HEDGE_MIN_SAMPLES,
+    MODEL_HEDGE_QUANTILE,
+    MODEL_ROUTE_WORKERS,
+    MODEL_ROUTES,
+    MODEL_TIMEOUT,
+    OPENROUTER_MODEL,
+)
+from ratelimit import RateLimiter, get_limiter
+from utils import Counter, Histogram, get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+MODEL_ATTEMPTS = Counter(
+    "asga_model_attempts_total",
+    "Routed LLM attempts by node, model and outcome",
+    ["node", "model", "result"],
+)
+MODEL_SECONDS = Histogram(
+    "asga_model_call_seconds", "Routed LLM call time until an answer", ["node"]
+)
+
+
+class RoutingError(RuntimeError):
+    """Every model in a node's chain failed or timed out."""
+
+    def __init__(self, node: str, errors: list[BaseException]):
+        self.node = node
+        self.errors = errors
+        reasons = "; ".join(f"{type(e).__name__}: {e}" for e in errors)
+        super().__init__(f"no model answered for {node!r} ({reasons})")
+
+
+def parse_routes(spec: str) -> dict[str, tuple[str, ...]]:
+    """Parse ``"spec=small|large,code=large"`` into ``{node: chain}``."""
+    routes = {}
+    for item in spec.split(","):
+        node, sep, chain = item.partition("=")
+        models = tuple(model.strip() for model in chain.split("|") if model.strip())
+        if sep and node.strip() and models:
+            routes[node.strip()] = models
+    return routes
+
+
+class Latencies:
+    """Recent successful call durations, per model."""
+
+    def __init__(self, window: int = 256):
+        self.window = window
+        self._samples: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, model: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def quantile(self, model: str, q: float, min_samples: int = 1) -> float | None:
+        """The ``q`` quantile for ``model``; ``None`` below ``min_samples``."""
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class _Attempt:
+    """One model attempt; ``started`` is set once it has a worker and quota."""
+
+    __slots__ = ("model", "started")
+
+    def __init__(self, model: str):
+        self.model = model
+        self.started: float | None = None
+
+
+class _Race:
+    """Attempt bookkeeping shared by :meth:`Router.call` and ``acall``.
+
+    ``running`` maps a future or task to its :class:`_Attempt`. Timeouts
+    and hedge deadlines count from when an attempt starts, not from when
+    it was submitted, so time spent queued behind other attempts for a
+    worker or waiting for rate-limit quota is not charged to the model.
+    """
+
+    # how often attempts that have not started yet are checked on
+    poll = 0.05
+
+    def __init__(self, router: Router, node: str, chain: tuple[str, ...]):
+        self.router = router
+        self.node = node
+        self.remaining = list(chain)
+        self.running: dict[Any, _Attempt] = {}
+        self.errors: list[BaseException] = []
+        self.launch_at = time.monotonic()
+        # the newest attempt, whose start sets the next launch
+        self.newest: _Attempt | None = None
+
+    def expire(self, now: float) -> list[Any]:
+        """Drop and return attempts running longer than the router's timeout."""
+        timeout = self.router.timeout
+        expired = [
+            handle
+            for handle, attempt in self.running.items()
+            if attempt.started is not None and now - attempt.started >= timeout
+        ]
+        for handle in expired:
+            model = self.running.pop(handle).model
+            self.errors.append(TimeoutError(f"{model} gave no answer in {timeout}s"))
+            self.router._record(self.node, model, "timeout")
+            logger.warning("%s: %s timed out after %ss", self.node, model, timeout)
+        return expired
+
+    def next_model(self, now: float) -> _Attempt | None:
+        """The attempt to start now, if any; raises once nothing is left."""
+        newest = self.newest
+        if newest is not None and newest.started is not None:
+            # the next model is due ``launch_delay`` after the newest starts
+            self.launch_at = newest.started + self.router.launch_delay(newest.model)
+            self.newest = None
+        due = self.newest is None and now >= self.launch_at
+        if self.remaining and (due or not self.running):
+            model = self.remaining.pop(0)
+            if self.running:
+                self.router._record(self.node, model, "hedged")
+                logger.debug("%s: hedging with %s", self.node, model)
+            self.newest = _Attempt(model)
+            return self.newest
+        if not self.running:
+            raise RoutingError(self.node, self.errors)
+        return None
+
+    def wait_time(self, now: float) -> float:
+        timeout = self.router.timeout
+        wake = min(
+            (
+                a.started + timeout
+                for a in self.running.values()
+                if a.started is not None
+            ),
+            default=now + self.poll,
+        )
+        if any(a.started is None for a in self.running.values()):
+            wake = min(wake, now + self.poll)
+        if self.remaining and self.newest is None:
+            wake = min(wake, self.launch_at)
+        return max(0.0, wake - now)
+
+    def finished(self, handle: Any, error: BaseException | None) -> bool:
+        """Record a finished attempt; ``True`` when it is the answer."""
+        attempt = self.running.pop(handle)
+        model = attempt.model
+        if attempt is self.newest:
+            self.newest = None
+        if error is None:
+            self.router._record(self.node, model, "ok")
+            return True
+        self.errors.append(error)
+        self.router._record(self.node, model, "error")
+        logger.warning("%s: %s failed: %r", self.node, model, error)
+        # fall back at once rather than waiting for a hedge deadline
+        self.launch_at = time.monotonic()
+        return False
+
+
+class Router:
+    """Run a node's LLM calls against its chain of models.
+
+    ``fn(model)`` makes one attempt with the named model. The first model
+    in the chain starts at once and the next one starts when the newest
+    attempt fails or reaches ``timeout``. With ``hedge`` the next model
+    also starts once the newest attempt outlives the ``hedge_quantile``
+    latency seen for its model, while that attempt keeps running; whichever
+    answers first is returned and the rest are cancelled (async) or left to
+    finish unobserved (threads). A chain of one model is called inline,
+    leaving timeouts to the HTTP client. Timeouts and hedge delays count
+    from when an attempt starts running, and callers should give their LM
+    an HTTP timeout of ``timeout`` so abandoned attempts give back their
+    worker.
+
+    Every attempt goes through ``limiter`` (default: the shared
+    :func:`ratelimit.get_limiter`), which waits for quota and retries
+    429/5xx answers with backoff before an attempt counts as failed.
+    """
+
+    def __init__(
+        self,
+        routes: dict[str, tuple[str, ...]] | None = None,
+        default: str = OPENROUTER_MODEL,
+        timeout: float = MODEL_TIMEOUT,
+        hedge: bool = MODEL_HEDGE,
+        hedge_quantile: float = MODEL_HEDGE_QUANTILE,
+        min_samples: int = MODEL_HEDGE_MIN_SAMPLES,
+        workers: int = MODEL_ROUTE_WORKERS,
+        limiter: RateLimiter | None = None,
+    ):
+        self.routes = parse_routes(MODEL_ROUTES) if routes is None else dict(routes)
+        self.default = default
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.workers = workers
+        self.limiter = limiter or get_limiter()
+        self.latencies = Latencies()
+        self._pool: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._counts: dict[str, int] = {}
+
+    def chain(self, node: str) -> tuple[str, ...]:
+        return self.routes.get(node) or (self.default,)
+
+    def launch_delay(self, model: str) -> float:
+        """Seconds after starting ``model`` before the next model starts."""
+        if self.hedge:
+            p = self.latencies.quantile(model, self.hedge_quantile, self.min_samples)
+            if p is not None:
+                return min(p, self.timeout)
+        return self.timeout
+
+    def _record(self, node: str, model: str, result: str) -> None:
+        MODEL_ATTEMPTS.labels(node, model, result).inc()
+        with self._lock:
+            self._counts[result] = self._counts.get(result, 0) + 1
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="asga-model"
+                )
+            return self._pool
+
+    def _timed(
+        self, model: str, fn: Callable[[str], T], started: _Attempt | None = None
+    ) -> T:
+        def attempt() -> T:
+            if started is not None and started.started is None:
+                started.started = time.monotonic()
+            start = time.perf_counter()
+            result = fn(model)
+            self.latencies.add(model, time.perf_counter() - start)
+            return result
+
+        return self.limiter.call(attempt)
+
+    async def _atimed(
+        self,
+        model: str,
+        fn: Callable[[str], Awaitable[T]],
+        started: _Attempt | None = None,
+    ) -> T:
+        async def attempt() -> T:
+            if started is not None and started.started is None:
+                started.started = time.monotonic()
+            start = time.perf_counter()
+            result = await fn(model)
+            self.latencies.add(model, time.perf_counter() - start)
+            return result
+
+        return await self.limiter.acall(attempt)
+
+    def call(self, node: str, fn: Callable[[str], T]) -> T:
+        chain = self.chain(node)
+        start = time.perf_counter()
+        try:
+            if len(chain) == 1:
+                return self._inline(node, chain[0], fn)
+            pool = self._executor()
+            race = _Race(self, node, chain)
+            try:
+                while True:
+                    now = time.monotonic()
+                    for future in race.expire(now):
+                        future.cancel()
+                    attempt = race.next_model(now)
+                    if attempt is not None:
+                        # each attempt sees the caller's context (dspy settings, traces)
+                        context = contextvars.copy_context()
+                        future = pool.submit(
+                            context.run, self._timed, attempt.model, fn, attempt
+                        )
+                        race.running[future] = attempt
+                    done, _ = wait(
+                        race.running,
+                        timeout=race.wait_time(now),
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        if race.finished(future, future.exception()):
+                            return future.result()
+            finally:
+                for future in race.running:
+                    future.cancel()
+        finally:
+            MODEL_SECONDS.labels(node).observe(time.perf_counter() - start)
+
+    async def acall(self, node: str, fn: Callable[[str], Awaitable[T]]) -> T:
+        chain = self.chain(node)
+        start = time.perf_counter()
+        try:
+            if len(chain) == 1:
+                return await self._ainline(node, chain[0], fn)
+            race = _Race(self, node, chain)
+            try:
+                while True:
+                    now = time.monotonic()
+                    for task in race.expire(now):
+                        task.cancel()
+                    attempt = race.next_model(now)
+                    if attempt is not None:
+                        task = asyncio.ensure_future(
+                            self._atimed(attempt.model, fn, attempt)
+                        )
+                        race.running[task] = attempt
+                    done, _ = await asyncio.wait(
+                        race.running,
+                        timeout=race.wait_time(now),
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    for task in done:
+                        if race.finished(task, task.exception()):
+                            return task.result()
+            finally:
+                for task in race.running:
+                    task.cancel()
+        finally:
+            MODEL_SECONDS.labels(node).observe(time.perf_counter() - start)
+
+    def _inline(self, node: str, model: str, fn: Callable[[str], T]) -> T:
+        try:
+            result = self._timed(model, fn)
+        except Exception:
+            self._record(node, model, "error")
+            raise
+        self._record(node, model, "ok")
+        return result
+
+    async def _ainline(
+        self, node: str, model: str, fn: Callable[[str], Awaitable[T]]
+    ) -> T:
+        try:
+            result = await self._atimed(model, fn)
+        except Exception:
+            self._record(node, model, "error")
+            raise
+        self._record(node, model, "ok")
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            "routes": {node: list(chain) for node, chain in self.routes.items()},
+            "hedge": self.hedge,
+            **{
+                name: counts.get(name, 0)
+                for name in ("ok", "error", "timeout", "hedged")
+            },
+        }
+
+
+_router: Router | None = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> Router:
+    """Return the process-wide router configured from ``ASGA_MODEL_*``."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = Router()
+    return _router
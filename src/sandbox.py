@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+from config import (
+    SANDBOX_CACHE_ITEMS,
+    SANDBOX_CPU_SECONDS,
+    SANDBOX_MEMORY_BYTES,
+    SANDBOX_TIMEOUT,
+    SANDBOX_WORKERS,
+)
+from diffs import PatchError, apply_patch
+from utils import Counter, Histogram, get_logger
+
+logger = get_logger(__name__)
+
+# name the generated tests are written under; ``code_agent`` diffs against it
+TESTS_FILE = "tests.py"
+
+SANDBOX_SECONDS = Histogram("asga_sandbox_run_seconds", "Sandboxed test run time")
+SANDBOX_RUNS = Counter(
+    "asga_sandbox_runs_total", "Sandboxed test runs by outcome", ["result"]
+)
+
+_SUMMARY = re.compile(r"(\d+) (passed|failed|errors?)\b")
+
+# Runs pytest with CPU and address-space limits applied inside the child, so
+# no ``preexec_fn`` runs in the forked copy of this multi-threaded process.
+_BOOTSTRAP = """\
+import resource, sys
+for limit, value in ((resource.RLIMIT_CPU, {cpu}), (resource.RLIMIT_AS, {memory})):
+    if value > 0:
+        resource.setrlimit(limit, (value, value))
+import pytest
+sys.exit(pytest.main(sys.argv[1:]))
+"""
+
+
+@dataclass(frozen=True)
+class SandboxResult:
+    passed: int
+    failed: int
+    errors: int
+    duration: float
+    timed_out: bool = False
+    cached: bool = False
+    output: str = ""
+
+    @property
+    def total(self) -> int:
+        return self.passed + self.failed + self.errors
+
+    @property
+    def score(self) -> float:
+        """Share of collected tests that passed; 0.0 when none ran."""
+        return self.passed / self.total if self.total else 0.0
+
+
+def _counts(output: str) -> tuple[int, int, int]:
+    passed = failed = errors = 0
+    lines = output.strip().splitlines()
+    for count, kind in _SUMMARY.findall(lines[-1] if lines else ""):
+        if kind == "passed":
+            passed = int(count)
+        elif kind == "failed":
+            failed = int(count)
+        else:
+            errors = int(count)
+    return passed, failed, errors
+
+
+class Sandbox:
+    """Runs generated tests against patches in isolated pytest subprocesses.
+
+    Each run gets a fresh temporary directory holding ``tests.py`` and the
+    patched files, an empty environment, and CPU-time and address-space
+    limits; runs that exceed their wall-clock timeout are killed with their
+    process group. At most ``workers`` subprocesses run at once.
+
+    Results are cached by the hash of ``(tests, patch)`` and concurrent
+    requests for the same pair share one run, so repair iterations and
+    best-of-N candidates never test the same pair twice. Timed-out runs are
+    not cached.
+    """
+
+    def __init__(
+        self,
+        workers: int = SANDBOX_WORKERS,
+        timeout: float = SANDBOX_TIMEOUT,
+        cpu_seconds: int = SANDBOX_CPU_SECONDS,
+        memory_bytes: int = SANDBOX_MEMORY_BYTES,
+        cache_items: int = SANDBOX_CACHE_ITEMS,
+    ):
+        self.timeout = timeout
+        self.cache_items = cache_items
+        self._bootstrap = _BOOTSTRAP.format(cpu=cpu_seconds, memory=memory_bytes)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="asga-sandbox"
+        )
+        self._cache: OrderedDict[str, SandboxResult] = OrderedDict()
+        self._running: dict[str, Future[SandboxResult]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(tests: str, patch: str) -> str:
+        return hashlib.sha256(f"{tests}\0{patch}".encode()).hexdigest()
+
+    def submit(
+        self, tests: str, patch: str, timeout: float | None = None
+    ) -> Future[SandboxResult]:
+        """Schedule a run of ``tests`` against ``patch``, or reuse a cached
+        or in-flight one."""
+        key = self.key(tests, patch)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                SANDBOX_RUNS.labels("cached").inc()
+                done: Future[SandboxResult] = Future()
+                done.set_result(replace(cached, cached=True))
+                return done
+            future = self._running.get(key)
+            if future is not None:
+                self.hits += 1
+                return future
+            self.misses += 1
+            future = self._pool.submit(
+                self._execute, tests, patch, timeout or self.timeout
+            )
+            self._running[key] = future
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return future
+
+    def run(
+        self, tests: str, patch: str, timeout: float | None = None
+    ) -> SandboxResult:
+        return self.submit(tests, patch, timeout).result()
+
+    async def arun(
+        self, tests: str, patch: str, timeout: float | None = None
+    ) -> SandboxResult:
+        """Async :meth:`run`; a cancelled caller leaves the run to finish
+        and fill the cache."""
+        return await asyncio.wrap_future(self.submit(tests, patch, timeout))
+
+    def _finish(self, key: str, future: Future[SandboxResult]) -> None:
+        with self._lock:
+            self._running.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            result = future.result()
+            if result.timed_out:
+                return
+            self._cache[key] = result
+            while len(self._cache) > self.cache_items:
+                self._cache.popitem(last=False)
+
+    def _execute(self, tests: str, patch: str, timeout: float) -> SandboxResult:
+        start = time.perf_counter()
+        try:
+            files = apply_patch({TESTS_FILE: tests}, patch)
+        except PatchError as exc:
+            SANDBOX_RUNS.labels("unapplied").inc()
+            return SandboxResult(0, 0, 1, 0.0, output=f"patch does not apply: {exc}")
+        with tempfile.TemporaryDirectory(prefix="asga-sandbox-") as tmp:
+            root = Path(tmp).resolve()
+            for name, content in files.items():
+                path = (root / name).resolve()
+                if not path.is_relative_to(root):
+                    SANDBOX_RUNS.labels("unapplied").inc()
+                    return SandboxResult(
+                        0, 0, 1, 0.0, output=f"patch writes outside sandbox: {name}"
+                    )
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(content)
+            target = TESTS_FILE if TESTS_FILE in files else "."
+            proc = subprocess.Popen(
+                [sys.executable, "-I", "-c", self._bootstrap]
+                + ["-q", "-p", "no:cacheprovider", target],
+                cwd=root,
+                env={
+                    "PATH": os.environ.get("PATH", ""),
+                    "HOME": str(root),
+                    "PYTHONDONTWRITEBYTECODE": "1",
+                    "PYTEST_DISABLE_PLUGIN_AUTOLOAD": "1",
+                },
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                start_new_session=True,
+            )
+            try:
+                output, _ = proc.communicate(timeout=timeout)
+                timed_out = False
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                output, _ = proc.communicate()
+                timed_out = True
+        duration = time.perf_counter() - start
+        SANDBOX_SECONDS.observe(duration)
+        passed, failed, errors = _counts(output)
+        if timed_out or (proc.returncode not in (0, 1, 5) and not failed):
+            # killed, out of CPU/memory, or pytest itself broke
+            errors = max(errors, 1)
+        SANDBOX_RUNS.labels("timeout" if timed_out else "ok").inc()
+        logger.debug(
+            "sandbox run %d passed %d failed %d errors in %.2fs",
+            passed,
+            failed,
+            errors,
+            duration,
+        )
+        return SandboxResult(passed, failed, errors, duration, timed_out, False, output)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached": len(self._cache),
+            "running": len(self._running),
+        }
+
+
+_sandbox: Sandbox | None = None
+
+
+def get_sandbox() -> Sandbox:
+    """Return the process-wide sandbox, creating it on first use."""
+    global _sandbox
+    if _sandbox is None:
+        _sandbox = Sandbox()
+    return _sandbox
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when the pending queue is saturated."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"job queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    """Admission record for a scheduled job."""
+
+    job_id: str
+    enqueued_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    @property
+    def waited(self) -> float:
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+
+class JobScheduler:
+    """Run jobs on a fixed number of workers with a bounded pending queue.
+
+    ``submit`` must be called from the event loop. Coroutine functions run
+    on the loop itself, plain callables on a pool of ``workers`` threads.
+    Jobs beyond ``workers`` wait in FIFO order; once ``max_pending`` jobs are
+    waiting further submissions are rejected with :class:`QueueFull`.
+    :meth:`cancel` drops a queued job or cancels a running coroutine job at
+    its next ``await``; threaded jobs must poll their own stop flag and keep
+    their worker until they return.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.active = 0
+        self.finished = 0
+        self.cancelled = 0
+        self._slots = asyncio.Semaphore(workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="asga-job"
+        )
+        self._pending: OrderedDict[str, Ticket] = OrderedDict()
+        self._tickets: dict[str, Ticket] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        # exponential moving average of job run time, seeded pessimistically
+        self._avg_runtime = 10.0
+
+    def submit(self, job_id: str, fn: Callable[[], Any]) -> Ticket:
+        if len(self._pending) >= self.max_pending:
+            raise QueueFull(self.retry_after())
+        ticket = Ticket(job_id=job_id, enqueued_at=time.monotonic())
+        self._pending[job_id] = ticket
+        self._tickets[job_id] = ticket
+        task = asyncio.get_running_loop().create_task(self._run(ticket, fn))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return ticket
+
+    async def _run(self, ticket: Ticket, fn: Callable[[], Any]) -> Any:
+        result = None
+        try:
+            async with self._slots:
+                self._pending.pop(ticket.job_id, None)
+                ticket.started_at = time.monotonic()
+                self.active += 1
+                logger.debug("job %s started after %.3fs", ticket.job_id, ticket.waited)
+                finished = False
+                try:
+                    if inspect.iscoroutinefunction(fn):
+                        result = await fn()
+                    else:
+                        loop = asyncio.get_running_loop()
+                        result = await self._thread(
+                            loop.run_in_executor(self._executor, fn)
+                        )
+                    finished = True
+                except Exception:
+                    finished = True
+                    logger.exception("job %s failed", ticket.job_id)
+                finally:
+                    self.active -= 1
+                    ticket.finished_at = time.monotonic()
+                    if finished:
+                        self.finished += 1
+                        runtime = ticket.finished_at - ticket.started_at
+                        self._avg_runtime = 0.8 * self._avg_runtime + 0.2 * runtime
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            logger.debug("job %s cancelled", ticket.job_id)
+        finally:
+            self._pending.pop(ticket.job_id, None)
+            self._tickets.pop(ticket.job_id, None)
+        return result
+
+    @staticmethod
+    async def _thread(future: asyncio.Future) -> Any:
+        """Await a threaded job, holding its slot until the thread returns.
+
+        A thread cannot be interrupted: when the task is cancelled the job
+        only stops at its next check of its stop flag, so the slot (and the
+        ``active`` count) is released once the thread has actually finished.
+        """
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            while not future.done():
+                try:
+                    await asyncio.wait({future})
+                except asyncio.CancelledError:
+                    pass
+            if not future.cancelled() and future.exception() is not None:
+                logger.warning("cancelled job raised: %r", future.exception())
+            raise
+
+    def task(self, job_id: str) -> asyncio.Task | None:
+        """The task running ``job_id`` until it completes.
+
+        It resolves to the job's return value, or ``None`` if the job failed
+        or was cancelled.
+        """
+        return self._tasks.get(job_id)
+
+    def cancel(self, job_id: str) -> str | None:
+        """Cancel ``job_id``; returns ``"queued"``/``"running"`` or ``None``."""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            return None
+        stage = "queued" if job_id in self._pending else "running"
+        task.cancel()
+        return stage
+
+    def position(self, job_id: str) -> int:
+        """Number of jobs that must start before ``job_id`` (0 once running)."""
+        if job_id not in self._pending:
+            return 0
+        index = list(self._pending).index(job_id)
+        return max(0, index + 1 - (self.workers - self.active))
+
+    def estimated_wait(self, position: int) -> float:
+        return math.ceil(position / self.workers) * self._avg_runtime
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.estimated_wait(len(self._pending))))
+
+    def status(self, job_id: str) -> dict:
+        """Queue position and wait time for the first SSE event."""
+        ticket = self._tickets.get(job_id)
+        position = self.position(job_id)
+        return {
+            "position": position,
+            "waited": round(ticket.waited, 3) if ticket else 0.0,
+            "estimated_wait": round(self.estimated_wait(position), 3),
+        }
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queued": len(self._pending),
+            "finished": self.finished,
+            "cancelled": self.cancelled,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
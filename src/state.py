@@ -1,4 +1,11 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
 from dataclasses import dataclass
+from typing import Any
+
+from config import REPO_INDEX_MAX_AGE
+from repo_index import RepoIndex, get_repo_index
 
 
 @dataclass
@@ -6,3 +13,21 @@ class RepoState:
     """Repository state for agent workflow."""
 
     path: str
+
+    def index(self, max_age: float = REPO_INDEX_MAX_AGE) -> RepoIndex:
+        """Shared index of the repository, refreshed when older than
+        ``max_age`` seconds."""
+        index = get_repo_index(self.path)
+        index.refresh_if_stale(max_age)
+        return index
+
+    def context(self, query: str) -> str:
+        """Compact outline of the code most relevant to ``query``."""
+        return self.index().context(query)
+
+
+def repo_context(state: Mapping[str, Any], query: str) -> str:
+    """Repository context for ``query`` when the workflow state carries a
+    ``repo_path``, else ``""``."""
+    path = state.get("repo_path")
+    return RepoState(path).context(query) if path else ""
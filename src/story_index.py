@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections.abc import Iterable
+from pathlib import Path
+from typing import NamedTuple
+
+from config import (
+    STORY_HINT_THRESHOLD,
+    STORY_INDEX_ENABLED,
+    STORY_INDEX_PATH,
+    STORY_REUSE_THRESHOLD,
+)
+from utils import Histogram, get_logger
+
+logger = get_logger(__name__)
+
+STORY_LOOKUP_SECONDS = Histogram(
+    "asga_story_lookup_seconds", "Near-duplicate user story lookup time"
+)
+
+_WORD = re.compile(r"[a-z0-9]+")
+# words every story shares ("as a user I want to be able to ...")
+_STOP = {
+    "a", "able", "allow", "an", "and", "as", "be", "can", "for", "i", "in",
+    "it", "let", "like", "me", "my", "need", "of", "on", "or", "our", "should",
+    "so", "that", "the", "to", "user", "users", "want", "we", "would",
+}  # fmt: skip
+SHINGLE = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    id INTEGER PRIMARY KEY, digest TEXT UNIQUE, story TEXT, spec TEXT,
+    sketch BLOB);
+CREATE TABLE IF NOT EXISTS bands (
+    key INTEGER, story INTEGER, PRIMARY KEY (key, story)) WITHOUT ROWID;
+"""
+
+
+class Match(NamedTuple):
+    story: str
+    spec: dict
+    # estimated Jaccard similarity of the two stories' shingles
+    similarity: float
+    # at or above the reuse threshold; otherwise only good enough as a hint
+    reuse: bool
+
+
+def normalise(text: str) -> str:
+    """Lower-cased content words of ``text``, plurals folded."""
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if word in _STOP:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+def shingles(text: str, k: int = SHINGLE) -> set[str]:
+    """Character ``k``-grams of the normalised story."""
+    text = normalise(text)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i : i + k] for i in range(len(text) - k + 1)}
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class StoryIndex:
+    """Past user stories and their specs, searchable by similarity.
+
+    Each story gets a ``num_perm``-slot MinHash signature over its
+    character shingles, built by one-permutation hashing: every shingle is
+    hashed once and the hash picks both a slot and the value competing for
+    its minimum, with empty slots filled from their right-hand neighbour.
+    That keeps a signature to one hash per shingle instead of
+    ``num_perm``. Signatures are split into ``bands`` LSH bands whose
+    hashes are stored in SQLite, so a lookup only compares stories sharing
+    at least one band (the ``candidates`` sharing the most, out of the
+    newest ``bucket_limit`` per band), whatever the index size. Each story
+    keeps only a one-byte-per-slot sketch for scoring those candidates.
+
+    A story identical after normalisation (case, stop words, plurals) to a
+    stored one replaces its spec rather than adding a row.
+
+    A ``scope`` (e.g. the repository a spec was written against) goes into
+    both the story digest and the band keys, so stories only ever match
+    others stored under the same scope.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = STORY_INDEX_PATH or None,
+        reuse_threshold: float = STORY_REUSE_THRESHOLD,
+        hint_threshold: float = STORY_HINT_THRESHOLD,
+        num_perm: int = 64,
+        bands: int = 16,
+        candidates: int = 32,
+        bucket_limit: int = 64,
+        enabled: bool = STORY_INDEX_ENABLED,
+    ):
+        if num_perm % bands or not 0 < num_perm <= 256:
+            raise ValueError("num_perm must be a multiple of bands, at most 256")
+        self.path = path
+        self.reuse_threshold = reuse_threshold
+        self.hint_threshold = hint_threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.candidates = candidates
+        self.bucket_limit = bucket_limit
+        # the newest ``bucket_limit`` stories per band keep a crowded bucket
+        # (common wording) from turning a lookup into a scan
+        per_band = (
+            "SELECT * FROM (SELECT story FROM bands WHERE key = ? "
+            "ORDER BY story DESC LIMIT ?)"
+        )
+        self._candidates_sql = (
+            "SELECT id, sketch FROM stories WHERE id IN (SELECT story FROM ("
+            + " UNION ALL ".join([per_band] * bands)
+            + ") GROUP BY story ORDER BY COUNT(*) DESC LIMIT ?)"
+        )
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self.lookups = 0
+        self.reused = 0
+        self.hinted = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            path = str(self.path or ":memory:")
+            if path != ":memory:":
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    # --- signatures -------------------------------------------------------
+
+    def signature(self, story: str) -> list[int] | None:
+        """MinHash signature of ``story``; ``None`` when it has no words."""
+        k = self.num_perm
+        empty = 1 << 64
+        slots = [empty] * k
+        for shingle in shingles(story):
+            h = _hash(shingle.encode())
+            slot = h % k
+            slots[slot] = min(slots[slot], h >> 8)
+        if all(v == empty for v in slots):
+            return None
+        # densify: an empty slot borrows the next filled slot's value, offset
+        # by the distance so borrowed and own values never collide
+        own = list(slots)
+        nearest, distance = 0, 0
+        for j in reversed(range(2 * k)):
+            if own[j % k] != empty:
+                nearest, distance = own[j % k], 0
+            else:
+                distance += 1
+                if j < k:
+                    slots[j] = nearest + (distance << 56)
+        return slots
+
+    def band_keys(self, signature: list[int], scope: str = "") -> list[int]:
+        """One key per band, shifted into SQLite's signed 64-bit range."""
+        r = self.rows
+        prefix = [_hash(scope.encode())] if scope else []
+        return [
+            _hash(
+                array(
+                    "Q", [band, *prefix, *signature[band * r : (band + 1) * r]]
+                ).tobytes()
+            )
+            - (1 << 63)
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def sketch(signature: list[int]) -> bytes:
+        """The low byte of every slot, which is all :meth:`similarity` needs."""
+        return bytes(value & 0xFF for value in signature)
+
+    def similarity(self, a: bytes, b: bytes) -> float:
+        """Estimated Jaccard similarity of two :meth:`sketch` values.
+
+        Equal bytes are counted in C by XOR-ing the sketches as integers;
+        one-byte slots also agree by chance one time in 256, which the
+        estimate corrects for.
+        """
+        diff = int.from_bytes(a, "little") ^ int.from_bytes(b, "little")
+        equal = diff.to_bytes(self.num_perm, "little").count(0) / self.num_perm
+        return max(0.0, (equal - 1 / 256) / (1 - 1 / 256))
+
+    # --- index ------------------------------------------------------------
+
+    def add(self, story: str, spec: dict, scope: str = "") -> None:
+        """Remember ``spec`` as the answer for ``story`` within ``scope``."""
+        self.add_many([(story, spec)], scope)
+
+    def add_many(self, items: Iterable[tuple[str, dict]], scope: str = "") -> None:
+        """:meth:`add` for many ``(story, spec)`` pairs in one transaction."""
+        if not self.enabled:
+            return
+        rows = []
+        for story, spec in items:
+            signature = self.signature(story)
+            if signature is not None:
+                key = f"{scope}\0{normalise(story)}" if scope else normalise(story)
+                digest = hashlib.sha256(key.encode()).hexdigest()
+                rows.append((digest, story, json.dumps(spec), signature))
+        with self._lock:
+            db = self._conn()
+            for digest, story, spec_json, signature in rows:
+                updated = db.execute(
+                    "UPDATE stories SET story = ?, spec = ? WHERE digest = ?",
+                    (story, spec_json, digest),
+                ).rowcount
+                if updated:
+                    continue
+                cursor = db.execute(
+                    "INSERT INTO stories (digest, story, spec, sketch) "
+                    "VALUES (?, ?, ?, ?)",
+                    (digest, story, spec_json, self.sketch(signature)),
+                )
+                db.executemany(
+                    "INSERT OR IGNORE INTO bands VALUES (?, ?)",
+                    [
+                        (key, cursor.lastrowid)
+                        for key in self.band_keys(signature, scope)
+                    ],
+                )
+            db.commit()
+
+    def lookup(self, story: str, scope: str = "") -> Match | None:
+        """The most similar story stored under ``scope``, if at or above
+        ``hint_threshold``."""
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        try:
+            match = self._lookup(story, scope)
+        finally:
+            STORY_LOOKUP_SECONDS.observe(time.perf_counter() - start)
+        with self._lock:
+            self.lookups += 1
+            if match is not None:
+                if match.reuse:
+                    self.reused += 1
+                else:
+                    self.hinted += 1
+        return match
+
+    def _lookup(self, story: str, scope: str) -> Match | None:
+        signature = self.signature(story)
+        if signature is None:
+            return None
+        keys = self.band_keys(signature, scope)
+        sketch = self.sketch(signature)
+        with self._lock:
+            db = self._conn()
+            rows = db.execute(
+                self._candidates_sql,
+                [v for key in keys for v in (key, self.bucket_limit)]
+                + [self.candidates],
+            ).fetchall()
+            best, best_id = 0.0, None
+            for story_id, other in rows:
+                score = self.similarity(sketch, other)
+                if score > best:
+                    best, best_id = score, story_id
+            if best_id is None or best < self.hint_threshold:
+                return None
+            text, spec = db.execute(
+                "SELECT story, spec FROM stories WHERE id = ?", (best_id,)
+            ).fetchone()
+        return Match(text, json.loads(spec), best, best >= self.reuse_threshold)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn().execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            db = self._conn()
+            db.execute("DELETE FROM stories")
+            db.execute("DELETE FROM bands")
+            db.commit()
+            self.lookups = self.reused = self.hinted = 0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "lookups": self.lookups,
+            "reused": self.reused,
+            "hinted": self.hinted,
+        }
+
+
+_story_index: StoryIndex | None = None
+_story_index_lock = threading.Lock()
+
+
+def get_story_index() -> StoryIndex:
+    """Return the process-wide story index configured from ``ASGA_STORY_*``."""
+    global _story_index
+    if _story_index is None:
+        with _story_index_lock:
+            if _story_index is None:
+                _story_index = StoryIndex()
+    return _story_index
@@ -1,4 +1,33 @@
-from .validators import validate_envelope
-from .logger import get_logger
+from .validators import SchemaRegistry, validate_envelope, validate_envelopes
+from .logger import SAMPLED, get_logger, payload
+from .cache import ResponseCache, get_response_cache
+from .artifacts import ArtifactStore, get_artifact_store
+from .http import aclose_async_client, get_async_client, use_shared_llm_client
+from .metrics import REGISTRY, Counter, Gauge, Histogram, MetricsRegistry
+from .lm import LMPool, LMSettings, get_lm
+from .tracing import observe
 
-__all__ = ["validate_envelope", "get_logger"]
+__all__ = [
+    "REGISTRY",
+    "SAMPLED",
+    "ArtifactStore",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "LMPool",
+    "LMSettings",
+    "MetricsRegistry",
+    "ResponseCache",
+    "SchemaRegistry",
+    "aclose_async_client",
+    "get_artifact_store",
+    "get_async_client",
+    "get_lm",
+    "get_logger",
+    "get_response_cache",
+    "observe",
+    "payload",
+    "use_shared_llm_client",
+    "validate_envelope",
+    "validate_envelopes",
+]
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from config import (
+    ARTIFACT_STORE_DISK_BYTES,
+    ARTIFACT_STORE_MEMORY_BYTES,
+    ARTIFACT_STORE_PATH,
+)
+
+
+class ArtifactStore:
+    """Content-addressed store for large artifact payloads.
+
+    Payloads are keyed by their SHA-256 and kept once, however many events
+    or jobs refer to them. An in-memory LRU holds up to ``memory_bytes`` and
+    a SQLite table up to ``disk_bytes``; both evict least recently used
+    entries first (disk recency is refreshed by disk reads only). With
+    ``path=None`` only the memory tier is used.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = ARTIFACT_STORE_PATH,
+        memory_bytes: int = ARTIFACT_STORE_MEMORY_BYTES,
+        disk_bytes: int = ARTIFACT_STORE_DISK_BYTES,
+    ):
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _conn(self) -> sqlite3.Connection | None:
+        if self.path is None:
+            return None
+        if self._db is None:
+            if str(self.path) != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                "hash TEXT PRIMARY KEY, data BLOB, size INTEGER, accessed REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS artifacts_accessed ON artifacts(accessed)"
+            )
+            row = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts")
+            self._disk_size = row.fetchone()[0]
+        return self._db
+
+    def _remember(self, digest: str, data: bytes) -> None:
+        if digest in self._memory:
+            self._memory.move_to_end(digest)
+            return
+        self._memory[digest] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _evict_disk(self, db: sqlite3.Connection) -> None:
+        if self._disk_size <= self.disk_bytes:
+            return
+        evicted = []
+        for digest, size in db.execute(
+            "SELECT hash, size FROM artifacts ORDER BY accessed"
+        ):
+            evicted.append((digest,))
+            self._disk_size -= size
+            if self._disk_size <= self.disk_bytes:
+                break
+        db.executemany("DELETE FROM artifacts WHERE hash = ?", evicted)
+
+    def put(self, data: str | bytes) -> str:
+        """Store ``data`` and return its hash; storing it again is a no-op."""
+        raw = data.encode() if isinstance(data, str) else data
+        digest = self.key(raw)
+        with self._lock:
+            known = digest in self._memory
+            self._remember(digest, raw)
+            db = self._conn()
+            if db is None or known:
+                return digest
+            cur = db.execute(
+                "INSERT OR IGNORE INTO artifacts VALUES (?, ?, ?, ?)",
+                (digest, raw, len(raw), time.time()),
+            )
+            if cur.rowcount:
+                self._disk_size += len(raw)
+                self._evict_disk(db)
+            db.commit()
+        return digest
+
+    def get(self, digest: str) -> bytes | None:
+        with self._lock:
+            data = self._memory.get(digest)
+            if data is not None:
+                self._memory.move_to_end(digest)
+                self.hits += 1
+                return data
+            db = self._conn()
+            row = None
+            if db is not None:
+                row = db.execute(
+                    "SELECT data FROM artifacts WHERE hash = ?", (digest,)
+                ).fetchone()
+            if db is None or row is None:
+                self.misses += 1
+                return None
+            db.execute(
+                "UPDATE artifacts SET accessed = ? WHERE hash = ?",
+                (time.time(), digest),
+            )
+            db.commit()
+            self._remember(digest, row[0])
+            self.hits += 1
+            return row[0]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "disk_bytes": self._disk_size,
+        }
+
+
+_artifact_store: ArtifactStore | None = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the process-wide artifact store, creating it on first use."""
+    global _artifact_store
+    if _artifact_store is None:
+        _artifact_store = ArtifactStore()
+    return _artifact_store
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from config import (
+    LLM_CACHE_DISK_ITEMS,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MEMORY_ITEMS,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+)
+
+
+class ResponseCache:
+    """Content-addressed cache for LLM responses.
+
+    Entries live in an in-memory LRU backed by a SQLite table. Both tiers
+    expire entries after ``ttl`` seconds and evict the least recently used
+    ones beyond ``max_items`` / ``max_disk_items``. The disk tier is
+    trimmed in batches, once it holds about 10% more than
+    ``max_disk_items``, rather than scanned on every write. Values must be JSON
+    serialisable. Passing ``bypass=True`` skips the lookup but still stores
+    the fresh response, so a bypassed request refreshes the cache.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = LLM_CACHE_PATH,
+        max_items: int = LLM_CACHE_MEMORY_ITEMS,
+        max_disk_items: int = LLM_CACHE_DISK_ITEMS,
+        ttl: float = LLM_CACHE_TTL,
+        enabled: bool = LLM_CACHE_ENABLED,
+    ):
+        self.path = path
+        self.max_items = max_items
+        self.max_disk_items = max_disk_items
+        self.ttl = ttl
+        self.enabled = enabled
+        self._memory: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        # upper bound on the rows in ``responses`` since the last trim
+        self._disk_items = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, signature: str, inputs: dict, seed: int) -> str:
+        material = json.dumps(
+            {"model": model, "signature": signature, "inputs": inputs, "seed": seed},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _conn(self) -> sqlite3.Connection | None:
+        if self.path is None:
+            return None
+        if self._db is None:
+            if str(self.path) != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)"
+            )
+            self._disk_items = self._db.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+        return self._db
+
+    def _remember(self, key: str, expires: float, value: Any) -> None:
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str, bypass: bool = False) -> Any | None:
+        """Return the cached value for ``key`` or ``None``."""
+        if not self.enabled or bypass:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._memory[key]
+            db = self._conn()
+            row = None
+            if db is not None:
+                row = db.execute(
+                    "SELECT value, expires FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] <= now:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    db.commit()
+                    row = None
+            if db is None or row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        expires = now + self.ttl
+        with self._lock:
+            self._remember(key, expires, value)
+            db = self._conn()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires, now),
+            )
+            # replacing a row over-counts, which only brings a trim forward
+            self._disk_items += 1
+            if self._disk_items > self.max_disk_items * 1.1:
+                self._trim(db, now)
+            db.commit()
+
+    def _trim(self, db: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows, then the least recently used beyond the limit."""
+        db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+            "ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_items,),
+        )
+        self._disk_items = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            db = self._conn()
+            if db is not None:
+                db.execute("DELETE FROM responses")
+                db.commit()
+            self._disk_items = 0
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+        }
+
+
+_response_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache, creating it on first use."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from config import HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_TIMEOUT
+
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async HTTP client shared by all LLM calls.
+
+    The pool is bound to the running event loop; a new client is created
+    when called from a different loop (e.g. a fresh loop per test).
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=HTTP_TIMEOUT,
+        )
+        _client_loop = loop
+    return _client
+
+
+def use_shared_llm_client() -> None:
+    """Route litellm's async requests through :func:`get_async_client`."""
+    import litellm
+
+    litellm.aclient_session = get_async_client()
+
+
+async def aclose_async_client() -> None:
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
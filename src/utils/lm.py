@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, NamedTuple
+
+from config import (
+    OPENROUTER_API_BASE,
+    OPENROUTER_API_KEY,
+    OPENROUTER_MAX_TOKENS,
+    OPENROUTER_MODEL,
+)
+
+if TYPE_CHECKING:
+    import dspy
+
+
+class LMSettings(NamedTuple):
+    """Everything that distinguishes one pooled LM from another."""
+
+    model: str = OPENROUTER_MODEL
+    temperature: float = 0.0
+    max_tokens: int = OPENROUTER_MAX_TOKENS
+    api_base: str = OPENROUTER_API_BASE
+    # per-request HTTP timeout in seconds; ``None`` keeps the client's own
+    # default
+    timeout: float | None = None
+    # sampling seed for providers that honour one
+    seed: int | None = None
+
+
+class LMPool:
+    """``dspy.LM`` instances shared per :class:`LMSettings`.
+
+    dspy is imported and each LM built on first request, so importing a
+    module that will eventually call a model costs nothing up front, and
+    every caller with the same settings shares one client. Callers pass
+    the LM per call (``predictor(lm=...)`` or ``dspy.context(lm=...)``)
+    rather than reconfiguring dspy's process-global default.
+    """
+
+    def __init__(self, api_key: str = OPENROUTER_API_KEY):
+        self.api_key = api_key
+        self._lms: dict[LMSettings, dspy.LM] = {}
+        self._lock = threading.Lock()
+
+    def get(self, settings: LMSettings | None = None) -> dspy.LM:
+        if settings is None:
+            settings = LMSettings()
+        lm = self._lms.get(settings)
+        if lm is None:
+            with self._lock:
+                lm = self._lms.get(settings)
+                if lm is None:
+                    import dspy
+
+                    extra = {
+                        name: value
+                        for name, value in (
+                            ("timeout", settings.timeout),
+                            ("seed", settings.seed),
+                        )
+                        if value is not None
+                    }
+                    lm = self._lms[settings] = dspy.LM(
+                        f"openai/{settings.model}",
+                        api_key=self.api_key,
+                        api_base=settings.api_base,
+                        model_type="chat",
+                        temperature=settings.temperature,
+                        max_tokens=settings.max_tokens,
+                        # retries and backoff are owned by ratelimit.RateLimiter
+                        num_retries=0,
+                        **extra,
+                    )
+        return lm
+
+    def __len__(self) -> int:
+        return len(self._lms)
+
+
+_pool = LMPool()
+
+
+def get_lm(**settings) -> dspy.LM:
+    """Return the shared LM for ``settings`` (see :class:`LMSettings`)."""
+    return _pool.get(LMSettings(**settings))
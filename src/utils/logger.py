@@ -1,17 +1,142 @@
 from __future__ import annotations
 
+import atexit
+import copy
+import itertools
 import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
 
-from langfuse.logger import console_handler, langfuse_logger
+from config import LOG_LEVEL, LOG_LEVELS, LOG_PAYLOAD_CHARS, LOG_SAMPLE_RATE
+
+# Pass as ``extra=SAMPLED`` on high-volume records to log only a fraction.
+SAMPLED = {"sampled": True}
+
+# Same console format as langfuse's handler, without importing langfuse.
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(
+    logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+)
+
+
+def parse_levels(spec: str) -> dict[str, int]:
+    """Parse ``"gateway=DEBUG,nodes=WARNING"`` into ``{name: level}``."""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.strip().partition("=")
+        if sep and name:
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def level_for(name: str, default: str = LOG_LEVEL, spec: str = LOG_LEVELS) -> int:
+    """Level for logger ``name``; the longest matching module prefix wins."""
+    levels = parse_levels(spec)
+    parts = name.split(".")
+    for i in range(len(parts), 0, -1):
+        level = levels.get(".".join(parts[:i]))
+        if isinstance(level, int):
+            return level
+    return logging.getLevelName(default)
+
+
+class Truncated:
+    """Lazily stringified payload, cut to ``limit`` characters.
+
+    The ``str`` call happens when the record's message is built, i.e. only
+    if the record passes the level check and filters.
+    """
+
+    __slots__ = ("limit", "value")
+
+    def __init__(self, value: Any, limit: int = LOG_PAYLOAD_CHARS):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = str(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text)} chars)"
+
+    __repr__ = __str__
+
+
+def payload(value: Any) -> Truncated:
+    return Truncated(value)
+
+
+class SampleFilter(logging.Filter):
+    """Keep one in ``1 / rate`` records marked with :data:`SAMPLED`."""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        return bool(self.every) and next(self._counter) % self.every == 0
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """Queue handler that leaves the formatter to the listener thread.
+
+    Only ``msg % args`` is built here, before the record is enqueued, so
+    mutable arguments are logged as they were at the call; timestamps,
+    tracebacks and the line layout are formatted on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_handler = _InProcessQueueHandler(_queue)
+_handler.addFilter(SampleFilter())
+_listener: QueueListener | None = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener() -> None:
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = QueueListener(
+                _queue,
+                console_handler,
+                *logging.getLogger("langfuse").handlers,
+                respect_handler_level=True,
+            )
+            _listener.start()
+            atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
 
 
 def get_logger(name: str) -> logging.Logger:
-    """Return module logger emitting to console and Langfuse."""
+    """Return a module logger feeding the shared background log queue.
 
+    Records are enqueued unformatted; console and Langfuse handlers run on
+    a listener thread. The level comes from ``ASGA_LOG_LEVELS`` for the
+    module (or its package), else ``ASGA_LOG_LEVEL``.
+    """
+    _start_listener()
     logger = logging.getLogger(name)
-    if not logger.handlers:
-        logger.addHandler(console_handler)
-        for h in langfuse_logger.handlers:
-            logger.addHandler(h)
-    logger.setLevel(logging.DEBUG)
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
+    logger.setLevel(level_for(name))
     return logger
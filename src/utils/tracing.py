@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import functools
+import inspect
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def observe(**options: Any) -> Callable[[F], F]:
+    """``langfuse.observe`` applied on first call instead of at import.
+
+    Importing langfuse costs more than everything else a node module
+    needs, so the decorated function resolves the traced version lazily.
+    Coroutine functions stay coroutine functions, which LangGraph relies
+    on to pick the async code path.
+    """
+
+    def decorate(fn: F) -> F:
+        traced: Callable[..., Any] | None = None
+
+        def resolve() -> Callable[..., Any]:
+            nonlocal traced
+            if traced is None:
+                from langfuse import observe as langfuse_observe
+
+                traced = langfuse_observe(**options)(fn)
+            return traced
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                return await resolve()(*args, **kwargs)
+
+            return awrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return resolve()(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
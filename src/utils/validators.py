@@ -1,8 +1,82 @@
 from __future__ import annotations
 
 import json
+import threading
+import time
+from collections.abc import Iterable
 from pathlib import Path
-from jsonschema import Draft7Validator, RefResolver
+
+from jsonschema import Draft7Validator, RefResolver, ValidationError
+from jsonschema.exceptions import best_match
+
+SCHEMA_DIR = Path("schemas/mcp")
+
+
+class SchemaRegistry:
+    """Compiled MCP schema validators kept in memory.
+
+    Every ``*.json`` file in ``schema_dir`` is loaded once and compiled into a
+    :class:`Draft7Validator`. ``$ref`` targets such as ``envelope.json`` are
+    served from an in-memory store so validation never touches the disk.
+    Schema files are re-stat'ed at most every ``check_interval`` seconds and
+    the registry is rebuilt when any of them changed.
+    """
+
+    def __init__(self, schema_dir: Path = SCHEMA_DIR, check_interval: float = 1.0):
+        self.schema_dir = Path(schema_dir)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._validators: dict[str, Draft7Validator] = {}
+        self._mtimes: dict[Path, float] = {}
+        self._checked_at = float("-inf")
+
+    def _scan(self) -> dict[Path, float]:
+        return {p: p.stat().st_mtime for p in sorted(self.schema_dir.glob("*.json"))}
+
+    def _load(self, mtimes: dict[Path, float]) -> None:
+        base = self.schema_dir.resolve().as_uri() + "/"
+        schemas = {p.stem: json.loads(p.read_text()) for p in mtimes}
+        store = {base + f"{name}.json": schema for name, schema in schemas.items()}
+        self._validators = {
+            name: Draft7Validator(
+                schema,
+                resolver=RefResolver(base_uri=base, referrer=schema, store=store),
+            )
+            for name, schema in schemas.items()
+        }
+        self._mtimes = mtimes
+
+    def refresh(self, force: bool = False) -> None:
+        """Reload schemas if files were added, removed or modified."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            mtimes = self._scan()
+            if force or mtimes != self._mtimes:
+                self._load(mtimes)
+
+    def get(self, schema_name: str) -> Draft7Validator:
+        """Return the compiled validator for ``schema_name``."""
+        self.refresh()
+        try:
+            return self._validators[schema_name]
+        except KeyError:
+            raise FileNotFoundError(self.schema_dir / f"{schema_name}.json") from None
+
+    def validate(self, data: dict, schema_name: str) -> None:
+        self.get(schema_name).validate(data)
+
+    def validate_many(
+        self, items: Iterable[dict], schema_name: str
+    ) -> list[ValidationError | None]:
+        """Validate ``items`` and return the best error (or ``None``) for each."""
+        validator = self.get(schema_name)
+        return [best_match(validator.iter_errors(item)) for item in items]
+
+
+registry = SchemaRegistry()
 
 
 def validate_envelope(data: dict, schema_name: str) -> None:
@@ -15,10 +89,15 @@ def validate_envelope(data: dict, schema_name: str) -> None:
     schema_name:
         Base name of the schema (without ``.json``) located in ``schemas/mcp``.
     """
-    schema_path = Path("schemas/mcp") / f"{schema_name}.json"
-    schema = json.loads(schema_path.read_text())
-    base = schema_path.parent.resolve().as_uri() + "/"
-    validator = Draft7Validator(
-        schema, resolver=RefResolver(base_uri=base, referrer=schema)
-    )
-    validator.validate(data)
+    registry.validate(data, schema_name)
+
+
+def validate_envelopes(
+    items: Iterable[dict], schema_name: str
+) -> list[ValidationError | None]:
+    """Validate many envelopes against one schema in a single call.
+
+    Returns one entry per envelope: ``None`` when valid, otherwise the most
+    relevant :class:`jsonschema.ValidationError`.
+    """
+    return registry.validate_many(items, schema_name)
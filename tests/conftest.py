@@ -1,3 +1,4 @@
+import os
 import sys
 from pathlib import Path
 
@@ -5,3 +6,11 @@ from pathlib import Path
 SRC_PATH = Path(__file__).resolve().parents[1] / "src"
 if str(SRC_PATH) not in sys.path:
     sys.path.insert(0, str(SRC_PATH))
+
+# Keep the on-disk LLM response cache, checkpoints, artifacts and rate limit
+# state, and the story index, out of test runs
+os.environ.setdefault("ASGA_LLM_CACHE", "0")
+os.environ.setdefault("ASGA_CHECKPOINT_PATH", "")
+os.environ.setdefault("ASGA_ARTIFACT_STORE_PATH", "")
+os.environ.setdefault("ASGA_RATE_LIMIT_PATH", "")
+os.environ.setdefault("ASGA_STORY_INDEX", "0")
@@ -0,0 +1,32 @@
+import dspy
+
+import agent
+from routing import Router
+from utils import ResponseCache
+from utils import cache as cache_module
+
+
+def test_incomplete_prediction_is_retried_and_not_cached(monkeypatch):
+    cache = ResponseCache(path=None, enabled=True)
+    monkeypatch.setattr(cache_module, "_response_cache", cache)
+    monkeypatch.setattr(agent, "get_router", lambda: Router(routes={}))
+    calls = []
+
+    def predict(module, model, kwargs):
+        calls.append(kwargs)
+        return dspy.Prediction(spec="")
+
+    monkeypatch.setattr(agent, "_predict", predict)
+    module = agent.predictors()["spec"]
+    key = agent._cache_key(module, "default", {"user_story": "upload a file"})
+
+    result = agent.call_with_retries(module, user_story="upload a file")
+    assert result.spec == ""
+    assert len(calls) == 3
+    assert cache.get(key) is None
+
+    monkeypatch.setattr(
+        agent, "_predict", lambda module, model, kwargs: dspy.Prediction(spec="- x")
+    )
+    assert agent.call_with_retries(module, user_story="upload a file").spec == "- x"
+    assert cache.get(key) == {"spec": "- x"}
@@ -0,0 +1,39 @@
+from utils import ArtifactStore
+
+
+def test_store_dedups_and_reads_back(tmp_path):
+    path = tmp_path / "artifacts.sqlite"
+    store = ArtifactStore(path=path)
+    digest = store.put("x" * 100)
+    assert store.put(b"x" * 100) == digest
+    assert store.get(digest) == b"x" * 100
+    assert store.stats()["disk_bytes"] == 100
+
+    fresh = ArtifactStore(path=path)
+    assert fresh.get(digest) == b"x" * 100
+    assert fresh.get("0" * 64) is None
+
+
+def test_memory_tier_evicts_least_recently_used():
+    store = ArtifactStore(path=None, memory_bytes=25)
+    first = store.put("a" * 10)
+    second = store.put("b" * 10)
+    store.get(first)
+    third = store.put("c" * 10)
+    assert store.stats()["memory_bytes"] == 20
+    assert store.get(second) is None
+    assert store.get(first) == b"a" * 10
+    assert store.get(third) == b"c" * 10
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    store = ArtifactStore(path=tmp_path / "a.sqlite", memory_bytes=0, disk_bytes=25)
+    digests = [store.put(c * 10) for c in "abc"]
+    assert store.stats()["disk_bytes"] == 20
+    assert store.get(digests[0]) is None
+    assert store.get(digests[2]) == b"c" * 10
+
+
+def test_memory_only():
+    store = ArtifactStore(path=None)
+    assert store.get(store.put("data")) == b"data"
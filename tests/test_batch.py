@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import batch
+from graph import workflow
+from scheduler import JobScheduler
+
+
+class FakeGraph:
+    def stream(self, state, config=None):
+        story = state["feature_request"].user_story
+        if "boom" in story:
+            raise RuntimeError("boom")
+        yield {"spec": {"token_count": 7}}
+        yield {"critic": {"attempts": 1}}
+
+
+async def _lines(items):
+    for item in items:
+        yield item
+
+
+def test_parse_line():
+    request_id, feature = batch.parse_line(
+        json.dumps({"request_id": "r1", "title": "Upload", "body": "a file"}), 1
+    )
+    assert request_id == "r1"
+    assert feature.user_story == "Upload\n\na file"
+    for line in ("{}", "[1]", '"x"', "null"):
+        with pytest.raises(ValueError):
+            batch.parse_line(line, 2)
+
+
+@pytest.mark.asyncio
+async def test_run_batch(monkeypatch):
+    monkeypatch.setattr(workflow, "graph", FakeGraph())
+    lines = [
+        json.dumps({"request_id": "a", "body": "upload"}),
+        "",
+        "not json",
+        json.dumps({"request_id": "b", "user_story": "boom"}),
+        json.dumps({"request_id": "c", "body": "list"}),
+    ]
+    records = [r async for r in batch.run_batch(_lines(lines), concurrency=2)]
+    summary = records[-1]["summary"]
+    by_id = {r["request_id"]: r for r in records[:-1]}
+    assert by_id["a"]["status"] == "ok"
+    assert by_id["a"]["tokens"] == 7
+    assert by_id["b"]["status"] == "error"
+    assert by_id["3"]["status"] == "error"
+    assert summary["total"] == 4
+    assert summary["ok"] == 2
+    assert summary["tokens"] == 14
+    assert summary["latency_p95"] >= summary["latency_p50"]
+
+
+@pytest.mark.asyncio
+async def test_run_batch_shares_scheduler_admission(monkeypatch):
+    monkeypatch.setattr(workflow, "graph", FakeGraph())
+    scheduler = JobScheduler(workers=1, max_pending=1)
+    lines = [json.dumps({"request_id": str(i), "body": "upload"}) for i in range(5)]
+    records = [
+        r
+        async for r in batch.run_batch(
+            _lines(lines), concurrency=4, scheduler=scheduler
+        )
+    ]
+    assert records[-1]["summary"]["ok"] == 5
+    assert scheduler.stats()["finished"] == 5
+    assert scheduler.stats()["active"] == 0
+    scheduler.shutdown()
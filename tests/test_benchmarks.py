@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+import workflow as bench
+from fake_lm import fake_lm
+
+from nodes import spec_agent
+
+
+def test_fake_lm_answers_spec_predictor():
+    with fake_lm() as lm:
+        data, _ = spec_agent._call_llm("upload a file")
+    assert data["endpoint"] == "/files"
+    assert lm.calls == 1
+    assert spec_agent.spec_predictor is None
+
+
+def test_benchmark_reports_every_section():
+    results = bench.main(iterations=2, jobs=2, levels=(1, 2))
+    assert set(results["nodes"]) == {"spec", "tests", "code", "critic", "repair"}
+    assert results["graph"]["runs"] == 2
+    assert set(results["gateway"]) == {"1", "2"}
+    assert results["meta"]["lm_calls"] > 0
+
+
+def test_diff_benchmark_round_trips():
+    import diff_engine
+
+    results = diff_engine.main(lines=400, edits=10)
+    assert set(results) == {"source", "repetitive", "multi_file"}
+    assert results["source"]["patch_bytes"] > 0
+
+
+def test_repo_index_benchmark_runs():
+    import repo_indexing
+
+    results = repo_indexing.main(files=50)
+    assert results["incremental"] == {
+        "files": 50,
+        "changed": 1,
+        "touched": 1,
+        "removed": 0,
+    }
+
+
+def test_rate_limit_benchmark_avoids_retry_storm():
+    import rate_limiting
+
+    results = rate_limiting.main(quota=20, workers=4, calls=6)
+    assert results["rate_limited"]["gave_up"] == 0
+    assert (
+        results["rate_limited"]["rejected_429"]
+        < results["immediate_retry"]["rejected_429"]
+    )
+
+
+def test_story_lookup_benchmark_finds_paraphrases():
+    import story_lookup
+
+    results = story_lookup.main(stories=500, lookups=50)
+    assert results["paraphrase_lookup"]["matched"] > 0.5
+    assert results["unseen_lookup"]["false_matches"] == 0
@@ -0,0 +1,69 @@
+from utils import ResponseCache
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = ResponseCache(path=path, enabled=True)
+    key = cache.make_key("model", "sig", {"user_story": "upload"}, 42)
+    assert cache.get(key) is None
+    cache.set(key, {"endpoint": "/files"})
+    assert cache.get(key) == {"endpoint": "/files"}
+
+    fresh = ResponseCache(path=path, enabled=True)
+    assert fresh.get(key) == {"endpoint": "/files"}
+    assert fresh.stats()["disk_hits"] == 1
+    assert cache.stats() == {
+        "hits": 1,
+        "disk_hits": 0,
+        "misses": 1,
+        "memory_items": 1,
+    }
+
+
+def test_key_depends_on_inputs():
+    make_key = ResponseCache.make_key
+    assert make_key("m", "s", {"a": 1}, 1) == make_key("m", "s", {"a": 1}, 1)
+    assert make_key("m", "s", {"a": 1}, 1) != make_key("m", "s", {"a": 1}, 2)
+    assert make_key("m", "s", {"a": 1}, 1) != make_key("n", "s", {"a": 1}, 1)
+
+
+def test_bypass_and_ttl(tmp_path):
+    cache = ResponseCache(path=tmp_path / "c.sqlite", ttl=0, enabled=True)
+    cache.set("k", 1)
+    assert cache.get("k") is None
+
+    cache.ttl = 60
+    cache.set("k", 1)
+    assert cache.get("k", bypass=True) is None
+    assert cache.get("k") == 1
+
+
+def test_size_eviction(tmp_path):
+    cache = ResponseCache(
+        path=tmp_path / "c.sqlite", max_items=2, max_disk_items=3, enabled=True
+    )
+    for i in range(5):
+        cache.set(str(i), i)
+    assert cache.stats()["memory_items"] == 2
+    fresh = ResponseCache(path=tmp_path / "c.sqlite", enabled=True)
+    assert fresh.get("0") is None
+    assert fresh.get("4") == 4
+
+
+def test_disk_tier_is_trimmed_in_batches(tmp_path):
+    path = tmp_path / "c.sqlite"
+    cache = ResponseCache(path=path, max_items=1, max_disk_items=100, enabled=True)
+    rows = []
+    for i in range(120):
+        cache.set(str(i), i)
+        rows.append(cache._conn().execute("SELECT COUNT(*) FROM responses").fetchone())
+    # the table overshoots by up to 10% and is cut back to the limit at once
+    assert max(rows) == (110,)
+    assert rows[110] == (100,)
+    assert rows[-1] == (109,)
+
+
+def test_disabled():
+    cache = ResponseCache(path=None, enabled=False)
+    cache.set("k", 1)
+    assert cache.get("k") is None
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+
+from checkpoint import BLOB_KEY, BlobSerializer, create_checkpointer
+from contracts import FeatureRequest, Patch
+from graph import workflow
+from nodes import spec_agent
+
+
+@pytest.fixture()
+def fake_llm(monkeypatch):
+    payload = {
+        "endpoint": "/files",
+        "method": "POST",
+        "request_schema": {},
+        "response_schema": {},
+    }
+
+    async def fake_acall(user_story, bypass_cache=False):
+        return payload, 3
+
+    monkeypatch.setattr(spec_agent, "_call_llm", lambda *a, **k: (payload, 3))
+    monkeypatch.setattr(spec_agent, "_acall_llm", fake_acall)
+
+
+def test_large_values_stored_once(tmp_path):
+    path = str(tmp_path / "cp.sqlite")
+    serde = BlobSerializer(path)
+    patch = Patch(diff="+" * 4096)
+    checkpoint = {"channel_values": {"patch": patch, "attempts": 1}}
+
+    first = serde.dumps_typed(checkpoint)
+    second = serde.dumps_typed(checkpoint)
+    assert len(first[1]) < 1024
+    assert first == second
+    stored = serde.inner.loads_typed(first)["channel_values"]["patch"]
+    assert set(stored) == {BLOB_KEY}
+
+    fresh = BlobSerializer(path)
+    assert fresh.loads_typed(first)["channel_values"]["patch"] == patch
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM blobs").fetchone() == (
+        1,
+    )
+
+
+def test_resume_after_crash(tmp_path, monkeypatch, fake_llm):
+    calls = []
+
+    def flaky_code(state):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("worker died")
+        return workflow.code_node(state)
+
+    monkeypatch.setitem(workflow.SYNC_NODES, "code", flaky_code)
+    graph = workflow.create_graph(
+        checkpointer=create_checkpointer(str(tmp_path / "cp.sqlite"))
+    )
+    config = workflow.thread_config("job-1")
+    with pytest.raises(RuntimeError):
+        graph.invoke({"feature_request": FeatureRequest(user_story="upload")}, config)
+    assert graph.get_state(config).next == ("code",)
+
+    resumed = [list(event) for event in graph.stream(None, config)]
+    assert resumed[0] == ["code"]
+    assert graph.get_state(config).values["critique"].score >= 0.8
+
+
+def test_expire_drops_idle_threads_and_unreferenced_blobs(tmp_path, fake_llm):
+    path = str(tmp_path / "cp.sqlite")
+    saver = create_checkpointer(path)
+    graph = workflow.create_graph(checkpointer=saver)
+    for job in ("old", "new"):
+        story = f"upload {job} " + "x" * 512
+        graph.invoke(
+            {"feature_request": FeatureRequest(user_story=story)},
+            workflow.thread_config(job),
+        )
+    db = sqlite3.connect(path)
+    db.execute("UPDATE thread_times SET updated = 0 WHERE thread_id = 'old'")
+    db.commit()
+    blobs = db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+
+    saver.serde._cache.clear()
+    threads, removed = saver.expire(ttl=60)
+    assert threads == 1 and removed > 0
+    assert db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] < blobs
+    assert graph.get_state(workflow.thread_config("old")).created_at is None
+    new = graph.get_state(workflow.thread_config("new"))
+    assert new.values["feature_request"].user_story.startswith("upload new")
+
+    saver.delete_thread("new")
+    # recently used blobs are kept until they leave the cache
+    assert saver.expire(ttl=60) == (0, 0)
+    saver.serde._cache.clear()
+    assert saver.expire(ttl=60) == (0, blobs - removed)
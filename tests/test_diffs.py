@@ -0,0 +1,165 @@
+import difflib
+import random
+import time
+
+import pytest
+
+from diffs import (
+    PatchError,
+    apply_patch,
+    apply_to_tree,
+    diff_files,
+    iter_hunks,
+    parse_patch,
+    unified_diff,
+)
+
+TESTS = "def test_one():\n    assert False\n\n\ndef test_two():\n    assert True\n"
+
+
+def _mutate(lines: list[str], rnd: random.Random, edits: int) -> list[str]:
+    lines = list(lines)
+    for _ in range(edits):
+        at = rnd.randrange(len(lines) + 1)
+        op = rnd.choice("adr")
+        if op == "a":
+            lines.insert(at, f"added {rnd.random()}\n")
+        elif lines and at < len(lines):
+            if op == "d":
+                del lines[at]
+            else:
+                lines[at] = f"changed {rnd.random()}\n"
+    return lines
+
+
+def test_matches_difflib_on_simple_edits():
+    after = TESTS.replace("assert False", "assert 1 == 1")
+    expected = difflib.unified_diff(
+        TESTS.splitlines(keepends=True),
+        after.splitlines(keepends=True),
+        "a/tests.py",
+        "b/tests.py",
+    )
+    assert list(unified_diff(TESTS, after, "a/tests.py", "b/tests.py")) == list(
+        expected
+    )
+    assert list(unified_diff(TESTS, TESTS)) == []
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_edits_round_trip(seed):
+    rnd = random.Random(seed)
+    # repetitive lines exercise the histogram and fallback paths
+    before = [
+        rnd.choice(["pass\n", "x = 1\n", "\n", f"line {i}\n"]) for i in range(300)
+    ]
+    after = _mutate(before, rnd, 25)
+    old, new = "".join(before), "".join(after)
+    diff = "".join(
+        unified_diff(old, new, "a/f.py", "b/f.py", context=rnd.randint(0, 4))
+    )
+    assert apply_patch({"f.py": old}, diff) == {"f.py": new}
+
+
+def test_missing_final_newline_round_trips():
+    old, new = "a\nb", "a\nc"
+    diff = "".join(unified_diff(old, new, "a/f", "b/f"))
+    assert "\\ No newline at end of file" in diff
+    assert apply_patch({"f": old}, diff) == {"f": new}
+
+
+def test_apply_tolerates_moved_hunks():
+    after = TESTS.replace("assert False", "assert True")
+    diff = "".join(unified_diff(TESTS, after, "a/tests.py", "b/tests.py"))
+    files = apply_patch({"tests.py": "# header\n# more\n" + TESTS}, diff)
+    assert files["tests.py"] == "# header\n# more\n" + after
+
+
+def test_apply_rejects_mismatched_context():
+    diff = "".join(unified_diff("x = 1\n", "x = 2\n", "a/tests.py", "b/tests.py"))
+    with pytest.raises(PatchError):
+        apply_patch({"tests.py": TESTS}, diff)
+
+
+def test_multi_file_patch_adds_changes_and_deletes():
+    before = {"keep.py": "a = 1\n", "gone.py": "b = 2\n", "same.py": "c\n"}
+    after = {"keep.py": "a = 10\n", "new/mod.py": "d = 4\n", "same.py": "c\n"}
+    diff = list(diff_files(before, after))
+    assert [(p.source, p.target) for p in parse_patch(diff)] == [
+        ("gone.py", "/dev/null"),
+        ("keep.py", "keep.py"),
+        ("/dev/null", "new/mod.py"),
+    ]
+    assert apply_patch(before, diff) == after
+
+
+def test_empty_files_are_added_and_deleted():
+    before = {"old/__init__.py": "", "mod.py": "x = 1\n"}
+    after = {"new/__init__.py": "", "mod.py": "x = 1\n"}
+    diff = "".join(diff_files(before, after))
+    assert diff == (
+        "--- /dev/null\n+++ b/new/__init__.py\n"
+        "--- a/old/__init__.py\n+++ /dev/null\n"
+    )
+    assert [p.hunks for p in parse_patch(diff)] == [[], []]
+    assert apply_patch(before, diff) == after
+    with pytest.raises(PatchError, match="not empty"):
+        apply_patch(
+            {"old/__init__.py": "x\n"}, "--- a/old/__init__.py\n+++ /dev/null\n"
+        )
+
+
+def test_hunks_stream_lazily():
+    before = [f"{i}\n" for i in range(10_000)]
+    after = list(before)
+    after[10] = "x\n"
+    after[9_000] = "y\n"
+    hunks = iter_hunks(before, after)
+    first = next(hunks)
+    assert (first.a_start, first.a_len) == (7, 7)
+    assert next(hunks).a_start == 8_997
+    assert next(hunks, None) is None
+
+
+def test_large_repetitive_file_is_fast():
+    before = ["    pass\n", "\n"] * 25_000 + [f"def f{i}():\n" for i in range(10_000)]
+    after = list(before)
+    after[100:100] = ["    return 1\n"] * 50
+    after[-5] = "def renamed():\n"
+    start = time.perf_counter()
+    diff = list(unified_diff("".join(before), "".join(after), "a/f", "b/f"))
+    assert time.perf_counter() - start < 2
+    assert apply_patch({"f": "".join(before)}, diff) == {"f": "".join(after)}
+
+
+def test_apply_to_tree_is_all_or_nothing(tmp_path):
+    (tmp_path / "a.py").write_text("one\n")
+    (tmp_path / "b.py").write_text("two\n")
+    diff = list(
+        diff_files(
+            {"a.py": "one\n", "b.py": "two\n"},
+            {"a.py": "ONE\n", "c/d.py": "new\n"},
+        )
+    )
+    assert apply_to_tree(tmp_path, diff, dry_run=True)["a.py"] == "ONE\n"
+    assert (tmp_path / "a.py").read_text() == "one\n"
+
+    (tmp_path / "b.py").write_text("changed\n")
+    with pytest.raises(PatchError):
+        apply_to_tree(tmp_path, diff)
+    assert (tmp_path / "a.py").read_text() == "one\n"
+
+    (tmp_path / "b.py").write_text("two\n")
+    assert apply_to_tree(tmp_path, diff) == {
+        "a.py": "ONE\n",
+        "b.py": None,
+        "c/d.py": "new\n",
+    }
+    assert (tmp_path / "c/d.py").read_text() == "new\n"
+    assert not (tmp_path / "b.py").exists()
+
+
+def test_apply_to_tree_refuses_paths_outside_root(tmp_path):
+    diff = "".join(unified_diff("", "x\n", "/dev/null", "b/../escape.py"))
+    with pytest.raises(PatchError):
+        apply_to_tree(tmp_path / "root", diff)
@@ -0,0 +1,60 @@
+import json
+
+from contracts import Critique, Patch, Spec, Tests
+from events import BASE_KEY, HASH_KEY, EventEncoder, encode
+
+
+def test_encode_matches_asdict():
+    spec = Spec(endpoint="/f", method="GET", request_schema="{}", response_schema="{}")
+    event = {"spec": {"spec": spec, "token_count": 3}}
+    assert json.loads(encode(event)) == {
+        "spec": {
+            "spec": {
+                "endpoint": "/f",
+                "method": "GET",
+                "request_schema": "{}",
+                "response_schema": "{}",
+            },
+            "token_count": 3,
+        }
+    }
+
+
+def test_delta_sends_hashes_and_changed_fields():
+    encoder = EventEncoder()
+    first = json.loads(encoder.encode({"code": {"patch": Patch(diff="x" * 100)}}).delta)
+    patch = first["code"]["patch"]
+    assert patch["diff"] == "x" * 100 and HASH_KEY in patch
+
+    again = encoder.encode({"code": {"patch": Patch(diff="x" * 100)}})
+    assert json.loads(again.delta) == {"code": {"patch": {HASH_KEY: patch[HASH_KEY]}}}
+    assert json.loads(again.full) == {"code": {"patch": {"diff": "x" * 100}}}
+
+    encoder.encode({"critic": {"critique": Critique(score=0.5, feedback="needs work")}})
+    changed = json.loads(
+        encoder.encode(
+            {"critic": {"critique": Critique(score=0.9, feedback="needs work")}}
+        ).delta
+    )["critic"]["critique"]
+    assert changed[BASE_KEY] != changed[HASH_KEY]
+    assert "feedback" not in changed and changed["score"] == 0.9
+
+
+def test_plain_values_pass_through():
+    encoder = EventEncoder()
+    encoded = encoder.encode({"tests": {"tests": Tests(code="c"), "attempts": 2}})
+    assert json.loads(encoded.delta)["tests"]["attempts"] == 2
+
+
+def test_large_fields_become_artifact_handles():
+    from events import ARTIFACT_KEY
+    from utils import ArtifactStore
+
+    store = ArtifactStore(path=None)
+    encoder = EventEncoder(store, inline_bytes=16)
+    event = {"code": {"patch": Patch(diff="+" * 100)}}
+    full = json.loads(encoder.encode(event).full)["code"]["patch"]["diff"]
+    assert full["size"] == 100
+    assert store.get(full[ARTIFACT_KEY]) == b"+" * 100
+    small = json.loads(encoder.encode({"tests": {"tests": Tests(code="ok")}}).full)
+    assert small["tests"]["tests"]["code"] == "ok"
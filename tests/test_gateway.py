@@ -1,7 +1,10 @@
+import asyncio
 import json
+
 import pytest
 from httpx import AsyncClient, ASGITransport
 from gateway import create_app
+from graph import workflow
 
 
 @pytest.fixture()
@@ -63,3 +66,359 @@ async def test_gateway_404s(setup_app):
 
         miss_prompt = await client.get("/prompt/missing")
         assert miss_prompt.status_code == 404
+
+
+class BlockingGraph:
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def astream(self, state, config=None):
+        await asyncio.wait_for(self.release.wait(), 5)
+        yield {"spec": {"endpoint": "/demo"}}
+
+
+@pytest.mark.asyncio
+async def test_admission_control(monkeypatch):
+    graph = BlockingGraph()
+    monkeypatch.setattr(workflow, "agraph", graph)
+    app = create_app(workers=1, max_pending=1)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        first = await client.post("/jobs", json={"user_story": "one"})
+        await asyncio.sleep(0.05)
+        second = await client.post("/jobs", json={"user_story": "two"})
+        assert second.json()["position"] == 1
+        full = await client.post("/jobs", json={"user_story": "three"})
+        assert full.status_code == 429
+        assert int(full.headers["Retry-After"]) >= 1
+
+        graph.release.set()
+        job_id = second.json()["job_id"]
+        async with client.stream("GET", f"/jobs/{job_id}") as sse:
+            lines = [line async for line in sse.aiter_lines() if line]
+        assert "queue" in json.loads(lines[0][6:])
+        assert first.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_stats(setup_app):
+    transport = ASGITransport(app=setup_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.get("/stats")
+        assert res.status_code == 200
+        assert res.json()["jobs"]["jobs"] == 0
+        assert res.json()["scheduler"]["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_resume_with_last_event_id(monkeypatch):
+    class ThreeEvents:
+        async def astream(self, state, config=None):
+            for i in range(3):
+                yield {"step": {"n": i}}
+
+    monkeypatch.setattr(workflow, "agraph", ThreeEvents())
+    app = create_app()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.post("/jobs", json={"user_story": "resume"})
+        job_id = res.json()["job_id"]
+        await asyncio.sleep(0.1)
+
+        headers = {"Last-Event-ID": "1"}
+        async with client.stream("GET", f"/jobs/{job_id}", headers=headers) as sse:
+            lines = [line async for line in sse.aiter_lines() if line]
+        assert lines == [
+            "id: 2",
+            'data: {"step": {"n": 1}}',
+            "id: 3",
+            'data: {"step": {"n": 2}}',
+        ]
+        gone = await client.get(f"/jobs/{job_id}")
+        assert gone.status_code == 410
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint(monkeypatch):
+    class OneEvent:
+        def stream(self, state, config=None):
+            yield {"spec": {"token_count": 3}}
+
+    monkeypatch.setattr(workflow, "graph", OneEvent())
+    app = create_app()
+    body = "\n".join(
+        json.dumps({"request_id": str(i), "body": f"story {i}"}) for i in range(3)
+    )
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.post("/jobs/batch?concurrency=2", content=body)
+        records = [json.loads(line) for line in res.text.splitlines()]
+    assert sorted(r["request_id"] for r in records[:-1]) == ["0", "1", "2"]
+    assert records[-1]["summary"]["tokens"] == 9
+
+
+@pytest.mark.asyncio
+async def test_thread_mode(monkeypatch):
+    class SyncGraph:
+        def stream(self, state, config=None):
+            yield {"spec": {"endpoint": "/sync"}}
+
+    monkeypatch.setattr(workflow, "graph", SyncGraph())
+    app = create_app(async_graph=False)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.post("/jobs", json={"user_story": "threads"})
+        job_id = res.json()["job_id"]
+        async with client.stream("GET", f"/jobs/{job_id}") as sse:
+            lines = [line async for line in sse.aiter_lines() if line]
+    assert lines[-1] == 'data: {"spec": {"endpoint": "/sync"}}'
+
+
+@pytest.mark.asyncio
+async def test_resume_endpoint(tmp_path, monkeypatch):
+    from checkpoint import create_checkpointer
+    from nodes import spec_agent
+
+    async def fake_acall(user_story, bypass_cache=False):
+        return {"endpoint": "/f", "method": "GET"}, 1
+
+    crashed = []
+
+    async def flaky_code(state):
+        if not crashed:
+            crashed.append(1)
+            raise RuntimeError("worker died")
+        return workflow.code_node(state)
+
+    monkeypatch.setattr(spec_agent, "_acall_llm", fake_acall)
+    monkeypatch.setitem(workflow.ASYNC_NODES, "code", flaky_code)
+    saver = create_checkpointer(str(tmp_path / "cp.sqlite"))
+    monkeypatch.setattr(workflow, "checkpointer", saver)
+    monkeypatch.setattr(
+        workflow, "agraph", workflow.create_graph(async_mode=True, checkpointer=saver)
+    )
+
+    app = create_app()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.post("/jobs", json={"user_story": "upload"})
+        job_id = res.json()["job_id"]
+        async with client.stream("GET", f"/jobs/{job_id}") as sse:
+            first = [line async for line in sse.aiter_lines() if line]
+        assert not any("critic" in line for line in first)
+
+        resumed = await client.post(f"/jobs/{job_id}/resume")
+        assert resumed.json()["resume_from"] == ["code"]
+        async with client.stream("GET", f"/jobs/{job_id}") as sse:
+            second = [line async for line in sse.aiter_lines() if line]
+        assert any("critic" in line for line in second)
+
+        done = await client.post(f"/jobs/{job_id}/resume")
+        assert done.status_code == 409
+        # a finished job's checkpoints are dropped
+        assert saver.get_tuple(workflow.thread_config(job_id)) is None
+        missing = await client.post("/jobs/unknown/resume")
+        assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_metrics(setup_app):
+    transport = ASGITransport(app=setup_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.post("/jobs", json={"user_story": "hi"})
+        job_id = res.json()["job_id"]
+        async with client.stream("GET", f"/jobs/{job_id}") as sse:
+            async for _ in sse.aiter_lines():
+                pass
+        res = await client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = res.text
+    assert 'asga_node_duration_seconds_count{node="critic"}' in body
+    assert "asga_llm_call_duration_seconds_count" in body
+    assert "asga_repair_attempts_bucket" in body
+    assert "asga_jobs_finished " in body
+    assert "asga_sse_subscribers 0.0" in body
+
+
+@pytest.mark.asyncio
+async def test_delta_stream(monkeypatch):
+    from contracts import Patch
+
+    class RepeatedPatch:
+        async def astream(self, state, config=None):
+            for _ in range(2):
+                yield {"code": {"patch": Patch(diff="+" * 64)}}
+
+    monkeypatch.setattr(workflow, "agraph", RepeatedPatch())
+    app = create_app()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.post("/jobs", json={"user_story": "delta"})
+        job_id = res.json()["job_id"]
+        async with client.stream("GET", f"/jobs/{job_id}?delta=true") as sse:
+            data = [
+                json.loads(line[6:])
+                async for line in sse.aiter_lines()
+                if line.startswith("data: ")
+            ]
+    first, second = data[1]["code"]["patch"], data[2]["code"]["patch"]
+    assert first["diff"] == "+" * 64
+    assert second == {"$hash": first["$hash"]}
+
+
+@pytest.mark.asyncio
+async def test_artifact_endpoint():
+    app = create_app()
+    digest = app.state.artifacts.put("diff --git a b")
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.get(f"/artifacts/{digest}")
+        assert res.text == "diff --git a b"
+        assert res.headers["etag"] == f'"{digest}"'
+        cached = await client.get(
+            f"/artifacts/{digest}", headers={"If-None-Match": res.headers["etag"]}
+        )
+        assert cached.status_code == 304
+        missing = await client.get("/artifacts/" + "0" * 64)
+        assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_prompt_conditional_get():
+    app = create_app()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.get("/prompt/prompts")
+        assert res.status_code == 200
+        assert res.text == app.state.prompts.text("prompts")
+        etag = res.headers["etag"]
+        cached = await client.get(
+            "/prompt/prompts", headers={"If-None-Match": f'"other", {etag}'}
+        )
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+
+
+class SlowGraph:
+    def __init__(self):
+        self.steps = []
+
+    async def astream(self, state, config=None):
+        yield {"spec": {"token_count": 100}}
+        self.steps.append("spec")
+        await asyncio.sleep(60)
+        self.steps.append("tests")
+        yield {"tests": {}}
+
+
+async def _read_events(client, job_id):
+    async with client.stream("GET", f"/jobs/{job_id}") as sse:
+        return [
+            json.loads(line[6:])
+            async for line in sse.aiter_lines()
+            if line.startswith("data: ")
+        ]
+
+
+@pytest.mark.asyncio
+async def test_cancel_job(monkeypatch):
+    slow = SlowGraph()
+    monkeypatch.setattr(workflow, "agraph", slow)
+    app = create_app()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        job_id = (await client.post("/jobs", json={"user_story": "x"})).json()["job_id"]
+        await asyncio.sleep(0.05)
+        res = await client.delete(f"/jobs/{job_id}")
+        assert res.json() == {"job_id": job_id, "cancelled": "running"}
+        assert (await client.delete(f"/jobs/{job_id}")).status_code == 409
+
+        events = await _read_events(client, job_id)
+        assert events[-1] == {"cancelled": {"reason": "client"}}
+        assert (await client.delete(f"/jobs/{job_id}")).status_code == 410
+        assert (await client.delete("/jobs/unknown")).status_code == 404
+        metrics = (await client.get("/metrics")).text
+    assert slow.steps == ["spec"]
+    assert 'asga_jobs_cancelled_total{reason="client",stage="running"}' in metrics
+
+
+@pytest.mark.asyncio
+async def test_deadline(monkeypatch):
+    monkeypatch.setattr(workflow, "agraph", SlowGraph())
+    app = create_app()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        res = await client.post("/jobs", json={"user_story": "x", "deadline": 0.05})
+        events = await _read_events(client, res.json()["job_id"])
+    assert events[-1] == {"cancelled": {"reason": "deadline"}}
+
+
+@pytest.mark.asyncio
+async def test_threaded_job_stops_between_nodes(monkeypatch):
+    import threading
+
+    release = threading.Event()
+    produced = []
+
+    class BlockingGraph:
+        def stream(self, state, config=None):
+            for step in ("spec", "tests", "code"):
+                produced.append(step)
+                yield {step: {}}
+                release.wait(5)
+
+    monkeypatch.setattr(workflow, "graph", BlockingGraph())
+    app = create_app(async_graph=False)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        job_id = (await client.post("/jobs", json={"user_story": "x"})).json()["job_id"]
+        await asyncio.sleep(0.05)
+        await client.delete(f"/jobs/{job_id}")
+        release.set()
+        events = await _read_events(client, job_id)
+    await asyncio.sleep(0.05)
+    assert produced == ["spec", "tests"]
+    assert events[-1] == {"cancelled": {"reason": "client"}}
+
+
+@pytest.mark.asyncio
+async def test_abandoned_job_is_cancelled(monkeypatch):
+    import gateway
+
+    monkeypatch.setattr(workflow, "agraph", SlowGraph())
+    monkeypatch.setattr(gateway, "JOB_ABANDON_GRACE", 0.01)
+    app = create_app()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        job_id = (await client.post("/jobs", json={"user_story": "x"})).json()["job_id"]
+
+    first_chunk = asyncio.Event()
+
+    async def receive():
+        await first_chunk.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_chunk.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "GET",
+        "path": f"/jobs/{job_id}",
+        "raw_path": f"/jobs/{job_id}".encode(),
+        "query_string": b"",
+        "headers": [],
+        "scheme": "http",
+        "server": ("test", 80),
+        "client": ("test", 1),
+        "root_path": "",
+    }
+    await asyncio.wait_for(app(scope, receive, send), 5)
+    await asyncio.sleep(0.1)
+    job = app.state.jobs.get(job_id)
+    assert job.cancelled == "abandoned"
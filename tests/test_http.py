@@ -0,0 +1,16 @@
+import pytest
+
+from utils import aclose_async_client, get_async_client, use_shared_llm_client
+
+
+@pytest.mark.asyncio
+async def test_shared_client():
+    client = get_async_client()
+    assert get_async_client() is client
+    use_shared_llm_client()
+    import litellm
+
+    assert litellm.aclient_session is client
+    await aclose_async_client()
+    assert get_async_client() is not client
+    await aclose_async_client()
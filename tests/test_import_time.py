@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_PATH = Path(__file__).resolve().parents[1] / "src"
+
+# Loaded on first LLM call or graph run, never by a bare import.
+HEAVY = ("dspy", "litellm", "langfuse", "langgraph.graph", "langchain_core")
+# Seconds for the import itself, interpreter start-up excluded. Roughly a
+# third of what these modules took when they built clients at import time.
+BUDGET = 1.5
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(" ".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def _cold_import(module: str, cwd: Path) -> tuple[float, list[str]]:
+    env = {k: v for k, v in os.environ.items() if k != "OPENROUTER_API_KEY"}
+    env["PYTHONPATH"] = str(SRC_PATH)
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.splitlines()
+    return float(out[-2]), out[-1].split()
+
+
+@pytest.mark.parametrize(
+    "module", ["utils", "nodes", "graph.workflow", "batch", "gateway", "agent"]
+)
+def test_import_is_cheap(module, tmp_path):
+    seconds, loaded = _cold_import(module, tmp_path)
+    assert loaded == []
+    if seconds > BUDGET:
+        # one retry absorbs a cold page cache or a busy machine
+        seconds = min(seconds, _cold_import(module, tmp_path)[0])
+    assert seconds < BUDGET, f"import {module} took {seconds:.2f}s"
+
+
+def test_lm_pool_shares_clients_per_settings():
+    from utils import LMPool, LMSettings
+
+    pool = LMPool(api_key="test")
+    default = pool.get()
+    assert pool.get(LMSettings()) is default
+    warm = pool.get(LMSettings(temperature=0.3))
+    assert warm is not default and warm.kwargs["temperature"] == 0.3
+    assert len(pool) == 2
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+
+from jobs import JobRegistry, Tombstones
+
+
+def _registry(**kwargs):
+    params = {
+        "unclaimed_ttl": 60,
+        "finished_ttl": 60,
+        "tombstone_ttl": 60,
+        "max_events": 3,
+    }
+    return JobRegistry(**{**params, **kwargs})
+
+
+async def _collect(job, after=0):
+    return [item async for item in job.follow(after)]
+
+
+@pytest.mark.asyncio
+async def test_event_buffer_is_capped():
+    registry = _registry()
+    job = registry.create("a")
+    for i in range(5):
+        registry.push("a", i)
+    registry.push("a", None)
+    assert job.dropped == 2
+    assert await _collect(job) == [(3, 2), (4, 3), (5, 4)]
+    assert await _collect(job, after=4) == [(5, 4)]
+    assert job.finished_at is not None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_subscribers():
+    registry = _registry(max_events=10)
+    job = registry.create("a")
+    first = asyncio.create_task(_collect(job))
+    second = asyncio.create_task(_collect(job, after=1))
+    for i in range(3):
+        registry.push("a", i)
+        await asyncio.sleep(0)
+    registry.push("a", None)
+    assert await first == [(1, 0), (2, 1), (3, 2)]
+    assert await second == [(2, 1), (3, 2)]
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe():
+    registry = _registry()
+    registry.create("a")
+    registry.subscribe("a")
+    registry.subscribe("a")
+    registry.unsubscribe("a", completed=True)
+    registry.unsubscribe("a", completed=False)
+    assert "a" in registry
+    registry.subscribe("a")
+    registry.unsubscribe("a", completed=True)
+    assert "a" not in registry
+    assert registry.is_retired("a")
+
+
+@pytest.mark.asyncio
+async def test_unclaimed_jobs_are_evicted():
+    registry = _registry(unclaimed_ttl=0)
+    registry.create("a")
+    registry.create("b")
+    registry.subscribe("b")
+    registry.sweep(force=True)
+    assert "a" not in registry
+    assert "b" in registry
+    assert registry.is_retired("a")
+    assert registry.stats()["evicted"] == 1
+
+    registry.push("a", "late event")
+    assert registry.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_are_evicted():
+    registry = _registry(finished_ttl=0)
+    registry.create("a")
+    registry.sweep(force=True)
+    assert "a" in registry
+    registry.push("a", None)
+    registry.sweep(force=True)
+    assert "a" not in registry
+
+
+def test_tombstones_expire(monkeypatch):
+    tombstones = Tombstones(ttl=4, generations=4)
+    tombstones.add("job")
+    assert "job" in tombstones
+    assert "other" not in tombstones
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+    assert "job" not in tombstones
+    assert len(tombstones) == 0
@@ -0,0 +1,70 @@
+import logging
+import threading
+
+from utils import SAMPLED, get_logger, payload
+from utils.logger import SampleFilter, Truncated, level_for, stop_logging
+
+
+def test_level_for_uses_longest_prefix():
+    spec = "nodes=WARNING,nodes.spec_agent=DEBUG,bogus"
+    assert level_for("nodes.spec_agent", "INFO", spec) == logging.DEBUG
+    assert level_for("nodes.code_agent", "INFO", spec) == logging.WARNING
+    assert level_for("gateway", "ERROR", spec) == logging.ERROR
+
+
+def test_payload_truncates_lazily():
+    class Loud:
+        calls = 0
+
+        def __str__(self):
+            Loud.calls += 1
+            return "x" * 100
+
+    value = Truncated(Loud(), limit=10)
+    assert Loud.calls == 0
+    assert str(value) == "xxxxxxxxxx... (100 chars)"
+    assert str(payload("short")) == "short"
+
+
+def test_queued_records_capture_arguments_at_the_call():
+    from utils.logger import _handler
+
+    state = [1]
+    record = logging.LogRecord("t", logging.INFO, "", 0, "state %s", (state,), None)
+    queued = _handler.prepare(record)
+    state.append(2)
+    assert queued.getMessage() == "state [1]"
+    assert record.args == (state,)
+
+
+def test_sample_filter_keeps_every_nth():
+    sample = SampleFilter(rate=0.25)
+    record = logging.LogRecord("t", logging.DEBUG, "", 0, "m", None, None)
+    assert sample.filter(record)
+    record.sampled = True
+    kept = [sample.filter(record) for _ in range(8)]
+    assert kept.count(True) == 2
+    assert not SampleFilter(rate=0).filter(record)
+
+
+def test_records_are_emitted_off_thread(monkeypatch):
+    seen = []
+
+    class Capture(logging.Handler):
+        def emit(self, record):
+            seen.append((threading.get_ident(), self.format(record)))
+
+    from utils import logger as logger_module
+
+    stop_logging()
+    monkeypatch.setattr(logger_module, "console_handler", Capture())
+    log = get_logger("asga.test")
+    log.setLevel(logging.DEBUG)
+    log.info("payload %s", payload({"a": 1}))
+    log.debug("sampled %d", 1, extra=SAMPLED)
+    stop_logging()
+    monkeypatch.undo()
+    logger_module._start_listener()
+
+    assert seen[0][1] == "payload {'a': 1}"
+    assert all(ident != threading.get_ident() for ident, _ in seen)
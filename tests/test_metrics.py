@@ -0,0 +1,39 @@
+import pytest
+
+from utils import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    calls = Counter("calls_total", "Calls", ["result"], registry=registry)
+    depth = Gauge("depth", "Queue depth", registry=registry)
+    latency = Histogram(
+        "latency_seconds", "Latency", buckets=(0.1, 1), registry=registry
+    )
+
+    calls.labels("ok").inc()
+    calls.labels("ok").inc(2)
+    depth.set(3)
+    for value in (0.05, 0.1, 0.5, 5):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE calls_total counter" in lines
+    assert 'calls_total{result="ok"} 3.0' in lines
+    assert "depth 3.0" in lines
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_count 4" in lines
+    assert "latency_seconds_sum 5.65" in lines
+
+
+def test_label_validation_and_escaping():
+    registry = MetricsRegistry()
+    calls = Counter("c", "C", ["path"], registry=registry)
+    with pytest.raises(ValueError):
+        calls.labels()
+    calls.labels('a"b').inc()
+    assert 'c{path="a\\"b"} 1.0' in registry.render()
+    with pytest.raises(ValueError):
+        Counter("c", "dup", registry=registry)
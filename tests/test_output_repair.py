@@ -0,0 +1,118 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+from fake_lm import FakeLM
+
+import output_repair
+from contracts import Critique, RepairPlan, Spec
+from nodes import spec_agent
+from output_repair import RepairError, loads, repair_contract
+from routing import Router
+
+
+@pytest.mark.parametrize(
+    "text, steps",
+    [
+        ('{"a": [1, 2]}', []),
+        (
+            'Sure! Here it is:\n```json\n{"a": [1, 2]}\n```\nAnything else?',
+            ["extracted"],
+        ),
+        (
+            'The answer is {"a": [1, 2,],} as requested.',
+            ["extracted", "trailing_commas"],
+        ),
+        ("{“a”: [1, 2]}", ["quotes"]),
+        ("{a: [1, 2]}", ["bare_keys"]),
+        ("{'a': [1, 2], 'b': None}", ["python_literal"]),
+    ],
+)
+def test_loads_repairs_near_json(text, steps):
+    value, taken = loads(text)
+    assert value["a"] == [1, 2]
+    assert taken == steps
+
+
+def test_loads_leaves_string_contents_alone():
+    value, _ = loads("{'summary': 'return null if the flag is true', 'ok': true}")
+    assert value == {"summary": "return null if the flag is true", "ok": True}
+    value, _ = loads('{"quote": "He said “hi”", "keys": "{a: 1,}",}')
+    assert value == {"quote": "He said “hi”", "keys": "{a: 1,}"}
+    value, steps = loads("{“note”: “don’t, “stop” now”}")
+    assert value == {"note": "don’t, “stop” now"} and steps == ["quotes"]
+
+
+def test_loads_decodes_extracted_json_as_json():
+    assert loads('Here: {"u": "a\\/b", "n": null}') == (
+        {"u": "a/b", "n": None},
+        ["extracted"],
+    )
+
+
+def test_loads_gives_up_on_prose():
+    with pytest.raises(RepairError):
+        loads("I could not work out a spec for that.")
+
+
+def test_contract_fields_are_matched_coerced_and_validated():
+    raw = {
+        "payload": {
+            "Endpoint": "/files",
+            "method": "POST",
+            "request-schema": {"type": "object"},
+            "response_schema": "{'type': 'object',}",
+        }
+    }
+    data = repair_contract(
+        raw, Spec, schema="spec", json_fields=("request_schema", "response_schema")
+    )
+    assert data == {
+        "endpoint": "/files",
+        "method": "POST",
+        "request_schema": '{"type": "object"}',
+        "response_schema": '{"type": "object"}',
+    }
+
+    assert repair_contract('{"score": "0.75", "feedback": 3}', Critique) == {
+        "score": 0.75,
+        "feedback": "3",
+    }
+    plan = repair_contract({"steps": "- add a test\n- fix the bug"}, RepairPlan)
+    assert plan == {"steps": ["add a test", "fix the bug"]}
+
+    with pytest.raises(RepairError, match="score"):
+        repair_contract({"score": "high", "feedback": "ok"}, Critique)
+    stats = output_repair.stats()["Critique"]
+    assert stats["repaired"] >= 1 and stats["failed"] >= 1
+
+
+class SloppyLM(FakeLM):
+    """Answers in prose-wrapped, not-quite JSON instead of chat sections."""
+
+    def _response(self, messages):
+        response = super()._response(messages)
+        response["choices"][0]["message"]["content"] = (
+            "Sure! Here is the spec:\n```json\n"
+            "{'endpoint': '/files', 'Method': 'POST',"
+            " 'request_schema': {}, 'response_schema': {},}\n```"
+        )
+        return response
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_spec_node_repairs_instead_of_asking_again(monkeypatch):
+    lm = SloppyLM()
+    monkeypatch.setattr(spec_agent, "_lm", lambda model=None: lm)
+    monkeypatch.setattr(spec_agent, "get_router", lambda: Router(routes={}))
+    monkeypatch.setattr(spec_agent, "spec_predictor", spec_agent._new_predictor())
+
+    data, tokens = spec_agent._call_llm("upload a file", bypass_cache=True)
+    assert data["endpoint"] == "/files" and data["request_schema"] == {}
+    assert tokens > 0
+    # no JSON-mode fallback call
+    assert lm.calls == 1
+    assert output_repair.stats()["SpecExtractor"]["repaired"] >= 1
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from prompts import PromptRepository, get_prompts
+
+
+def test_prompts_are_cached_until_mtime_changes(tmp_path):
+    path = tmp_path / "spec.md"
+    path.write_text("v1")
+    repo = PromptRepository(tmp_path, check_interval=0)
+    first = repo.get("spec")
+    assert first.text == "v1"
+    assert repo.get("spec") is first
+    assert repo.stats()["loads"] == 1
+
+    path.write_text("v2")
+    os.utime(path, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+    second = repo.get("spec")
+    assert second.text == "v2"
+    assert second.etag != first.etag
+
+
+def test_hot_reads_skip_the_filesystem(tmp_path):
+    (tmp_path / "spec.md").write_text("v1")
+    repo = PromptRepository(tmp_path, check_interval=60)
+    repo.get("spec")
+    (tmp_path / "spec.md").unlink()
+    assert repo.get("spec").text == "v1"
+    assert repo.stats()["hits"] == 1
+
+
+def test_missing_and_invalid_names(tmp_path):
+    repo = PromptRepository(tmp_path)
+    assert repo.get("missing") is None
+    assert repo.get("../secrets") is None
+    with pytest.raises(KeyError):
+        repo.text("missing")
+
+
+def test_missing_names_are_not_cached(tmp_path):
+    repo = PromptRepository(tmp_path, check_interval=60)
+    for i in range(100):
+        assert repo.get(f"missing-{i}") is None
+    assert repo.stats()["cached"] == 0
+
+    # new files show up once the listing is refreshed
+    (tmp_path / "late.md").write_text("v1")
+    assert repo.get("late") is None
+    repo.check_interval = 0
+    assert repo.get("late").text == "v1"
+
+
+def test_default_root_is_independent_of_cwd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert get_prompts().text("prompts").startswith("# Prompt Pack")
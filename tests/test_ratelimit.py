@@ -0,0 +1,153 @@
+import pytest
+
+from ratelimit import RateLimiter, status_of
+from routing import Router
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class ProviderError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        headers = {"retry-after": str(retry_after)} if retry_after else {}
+        self.response = type("Response", (), {"headers": headers})()
+
+
+class Usage:
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def get_lm_usage(self):
+        return {"m": {"total_tokens": self.tokens}}
+
+
+def _limiter(clock, **kwargs):
+    return RateLimiter(path=None, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_requests_per_minute_refill():
+    clock = FakeClock()
+    limiter = _limiter(clock, rpm=2)
+    assert limiter.acquire() == limiter.acquire() == 0
+    assert limiter.acquire() == pytest.approx(30)
+    assert limiter.acquire() == pytest.approx(30)
+
+
+def test_tokens_per_minute_charges_real_usage():
+    clock = FakeClock()
+    limiter = _limiter(clock, tpm=600)
+    limiter.call(lambda: Usage(900))
+    # the 900-token call left the bucket 300 in debt: 30s to get back to zero,
+    # then enough for the next call's estimate (the running mean, 180)
+    limiter.call(lambda: Usage(0))
+    assert sum(clock.slept) == pytest.approx(30 + 18)
+
+
+def test_backoff_retries_with_jitter_and_retry_after(monkeypatch):
+    monkeypatch.setattr("random.uniform", lambda low, high: high)
+    clock = FakeClock()
+    limiter = _limiter(clock, retries=3, backoff=1, backoff_max=3)
+    errors = [ProviderError(503), ProviderError(502), ProviderError(500)]
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert clock.slept == [1, 2, 3]
+
+    clock.slept.clear()
+    errors[:] = [ProviderError(429, retry_after=2)]
+    assert limiter.call(flaky) == "ok"
+    # the 429 held the shared bucket; the retry waits out the rest of the hold
+    assert clock.slept == [2]
+
+    clock.slept.clear()
+    errors[:] = [ProviderError(429, retry_after=3600)]
+    assert limiter.call(flaky) == "ok"
+    # Retry-After is capped at backoff_max
+    assert clock.slept == [3]
+    assert limiter.stats()["retried"] == 5
+
+
+def test_non_retryable_errors_raise_at_once():
+    clock = FakeClock()
+    limiter = _limiter(clock)
+    with pytest.raises(ProviderError):
+        limiter.call(lambda: (_ for _ in ()).throw(ProviderError(400)))
+    assert clock.slept == [] and status_of(ValueError()) is None
+
+
+def test_processes_share_buckets_through_sqlite(tmp_path):
+    clock = FakeClock()
+    path = tmp_path / "ratelimit.sqlite"
+    worker_a = RateLimiter(rpm=2, path=path, clock=clock, sleep=clock.sleep)
+    worker_b = RateLimiter(rpm=2, path=path, clock=clock, sleep=clock.sleep)
+    assert worker_a.acquire() == worker_b.acquire() == 0
+    assert worker_b.acquire() == pytest.approx(30)
+
+    clock.slept.clear()
+    worker_a.hold(5)
+    worker_b.acquire()
+    # the hold first, then the rest of the refill still owed after it
+    assert clock.slept == [pytest.approx(5), pytest.approx(25)]
+
+
+def test_unlimited_calls_skip_the_shared_file(tmp_path):
+    clock = FakeClock()
+    path = tmp_path / "ratelimit.sqlite"
+    limiter = RateLimiter(rpm=0, tpm=0, path=path, clock=clock, sleep=clock.sleep)
+    assert limiter.call(lambda: "ok") == "ok"
+    limiter.hold(5)
+    assert limiter.acquire() == pytest.approx(5)
+    assert not path.exists()
+
+
+@pytest.mark.asyncio
+async def test_async_calls_share_buckets_through_sqlite(tmp_path):
+    clock = FakeClock()
+    path = tmp_path / "ratelimit.sqlite"
+    limiter = RateLimiter(
+        tpm=600, path=path, retries=1, backoff=0, clock=clock, sleep=clock.sleep
+    )
+    failures = [ProviderError(503)]
+
+    async def fn():
+        if failures:
+            raise failures.pop()
+        return Usage(30)
+
+    assert (await limiter.acall(fn)).tokens == 30
+    assert limiter.stats()["retried"] == 1
+    other = RateLimiter(tpm=600, path=path, clock=clock, sleep=clock.sleep)
+    # the settled usage is visible to another process
+    assert other.acquire(600) == pytest.approx(30 / 10)
+
+
+@pytest.mark.asyncio
+async def test_router_attempts_go_through_limiter():
+    clock = FakeClock()
+    limiter = _limiter(clock, backoff=0)
+    failures = [ProviderError(429)]
+
+    async def fn(model):
+        if failures:
+            raise failures.pop()
+        return model
+
+    router = Router(routes={}, default="m", limiter=limiter)
+    assert await router.acall("spec", fn) == "m"
+    assert router.stats()["error"] == 0 and limiter.stats()["retried"] == 1
@@ -0,0 +1,119 @@
+import os
+
+from nodes import spec_agent
+from repo_index import RepoIndex
+from state import RepoState
+
+UPLOADS = '''"""Upload handling."""
+from .storage import save_blob
+import json
+
+MAX_SIZE = 10
+
+
+class UploadHandler:
+    """Accept file uploads."""
+
+    def save_file(self, path: str) -> None:
+        """Persist an uploaded file."""
+        save_blob(path)
+'''
+STORAGE = "def save_blob(path):\n    return path\n"
+
+
+def _repo(tmp_path):
+    pkg = tmp_path / "src" / "app"
+    pkg.mkdir(parents=True)
+    (pkg / "__init__.py").write_text("")
+    (pkg / "uploads.py").write_text(UPLOADS)
+    (pkg / "storage.py").write_text(STORAGE)
+    (tmp_path / "main.py").write_text("from app.uploads import UploadHandler\n")
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / ".hidden" / "skip.py").write_text("x = 1\n")
+    return tmp_path
+
+
+def test_symbols_and_import_graph(tmp_path):
+    index = RepoIndex(_repo(tmp_path))
+    assert index.refresh()["files"] == 4
+
+    symbols = {s.qualname: s for s in index.symbols("src/app/uploads.py")}
+    assert set(symbols) == {"MAX_SIZE", "UploadHandler", "UploadHandler.save_file"}
+    method = symbols["UploadHandler.save_file"]
+    assert method.kind == "method"
+    assert method.signature == "def save_file(self, path: str) -> None"
+    assert method.doc == "Persist an uploaded file."
+    assert index.find("save_blob")[0].path == "src/app/storage.py"
+
+    assert index.dependencies("src/app/uploads.py") == ["src/app/storage.py"]
+    assert index.dependencies("main.py") == ["src/app/uploads.py"]
+    assert index.dependents("src/app/uploads.py") == ["main.py"]
+
+
+def test_refresh_only_reparses_changed_files(tmp_path):
+    root = _repo(tmp_path)
+    index = RepoIndex(root)
+    index.refresh()
+    assert index.refresh() == {"files": 4, "changed": 0, "touched": 0, "removed": 0}
+
+    storage = root / "src/app/storage.py"
+    before = index.file_hash("src/app/storage.py")
+    os.utime(storage, ns=(1, 1))
+    assert index.refresh()["touched"] == 1
+    assert index.file_hash("src/app/storage.py") == before
+
+    storage.write_text(STORAGE + "\n\ndef load_blob(key):\n    return key\n")
+    (root / "main.py").unlink()
+    stats = index.refresh()
+    assert (stats["changed"], stats["removed"]) == (1, 1)
+    assert index.find("load_blob")
+    assert index.dependents("src/app/uploads.py") == []
+
+
+def test_index_persists_across_instances(tmp_path):
+    root = _repo(tmp_path)
+    RepoIndex(root).refresh()
+    reopened = RepoIndex(root)
+    assert reopened.stats()["symbols"] == 4
+    assert reopened.refresh()["changed"] == 0
+
+
+def test_broken_files_are_recorded_not_fatal(tmp_path):
+    root = _repo(tmp_path)
+    (root / "broken.py").write_text("def (:\n")
+    index = RepoIndex(root)
+    index.refresh()
+    assert index.stats()["unparsed"] == 1
+
+
+def test_context_outlines_relevant_definitions(tmp_path):
+    index = RepoIndex(_repo(tmp_path))
+    index.refresh()
+    context = index.context("upload a file")
+    assert context.startswith("# src/app/uploads.py (imports src/app/storage.py)")
+    assert "def save_file(self, path: str) -> None  # Persist an uploaded file." in (
+        context
+    )
+    assert "return path" not in context
+    assert index.context("upload a file", max_chars=10) == ""
+    assert index.context("zebra") == ""
+
+
+def test_spec_node_receives_repo_context(tmp_path, monkeypatch):
+    root = _repo(tmp_path)
+    seen = []
+
+    def fake_call(text, bypass_cache=False):
+        seen.append(text)
+        return {"endpoint": "/files", "method": "POST"}, 1
+
+    monkeypatch.setattr(spec_agent, "_call_llm", fake_call)
+    spec_agent.spec_node(
+        {
+            "feature_request": spec_agent.FeatureRequest(user_story="upload a file"),
+            "repo_path": str(root),
+        }
+    )
+    assert "Relevant repository code:" in seen[0]
+    assert "UploadHandler" in seen[0]
+    assert RepoState(str(root)).index().stats()["files"] == 4
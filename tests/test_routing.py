@@ -0,0 +1,116 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+from fake_lm import FakeLM
+
+from nodes import spec_agent
+from routing import Router, RoutingError, parse_routes
+
+
+def test_parse_routes():
+    assert parse_routes("spec=small|large, code = large,bad,empty=") == {
+        "spec": ("small", "large"),
+        "code": ("large",),
+    }
+    assert Router(routes={}, default="m").chain("spec") == ("m",)
+
+
+def test_falls_back_on_error_and_timeout():
+    def fn(model):
+        if model == "broken":
+            raise ConnectionError("down")
+        if model == "slow":
+            time.sleep(1)
+        return model
+
+    router = Router(routes={"spec": ("broken", "slow", "ok")}, timeout=0.1)
+    start = time.perf_counter()
+    assert router.call("spec", fn) == "ok"
+    assert time.perf_counter() - start < 0.5
+    stats = router.stats()
+    assert (stats["error"], stats["timeout"], stats["ok"]) == (1, 1, 1)
+
+    with pytest.raises(RoutingError, match="ConnectionError"):
+        router.call("spec", lambda model: fn("broken"))
+
+
+def test_timeout_counts_from_attempt_start():
+    def fn(model):
+        time.sleep(0.5 if model == "stuck" else 0.01)
+        return model
+
+    # one worker: "ok" queues behind the abandoned "stuck" attempt, and its
+    # clock only starts once it gets the worker
+    router = Router(routes={"spec": ("stuck", "ok")}, timeout=0.2, workers=1)
+    assert router.call("spec", fn) == "ok"
+    assert router.stats()["timeout"] == 1
+
+
+def test_hedges_after_observed_tail_latency():
+    delays = {"primary": 0.01, "backup": 0.0}
+
+    def fn(model):
+        time.sleep(delays[model])
+        return model
+
+    router = Router(
+        routes={"spec": ("primary", "backup")}, hedge=True, min_samples=3, timeout=5
+    )
+    for _ in range(3):
+        assert router.call("spec", fn) == "primary"
+    assert router.stats()["hedged"] == 0
+
+    delays["primary"] = 1.0
+    start = time.perf_counter()
+    assert router.call("spec", fn) == "backup"
+    assert time.perf_counter() - start < 0.5
+    assert router.stats()["hedged"] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_hedge_keeps_first_response():
+    delays = {"primary": 0.01, "backup": 1.0}
+    cancelled = []
+
+    async def fn(model):
+        try:
+            await asyncio.sleep(delays[model])
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return model
+
+    router = Router(routes={"spec": ("primary", "backup")}, hedge=True, min_samples=1)
+    assert await router.acall("spec", fn) == "primary"
+
+    # primary now outlives its p95, the hedge fires, but primary still wins
+    delays["primary"] = 0.1
+    assert await router.acall("spec", fn) == "primary"
+    await asyncio.sleep(0)
+    assert router.stats()["hedged"] == 1
+    assert cancelled == ["backup"]
+
+
+class BrokenLM(FakeLM):
+    def forward(self, prompt=None, messages=None, **kwargs):
+        raise ConnectionError("provider down")
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_spec_node_uses_its_model_chain(monkeypatch):
+    lms = {"broken": BrokenLM(), "fake": FakeLM()}
+    monkeypatch.setattr(spec_agent, "_lm", lambda model=None: lms[model])
+    monkeypatch.setattr(
+        spec_agent, "get_router", lambda: Router(routes={"spec": ("broken", "fake")})
+    )
+    monkeypatch.setattr(spec_agent, "spec_predictor", spec_agent._new_predictor())
+
+    data, _ = spec_agent._call_llm("upload a file")
+    assert data["endpoint"] == "/files"
+    assert lms["fake"].calls == 1
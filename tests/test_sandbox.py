@@ -0,0 +1,47 @@
+from contracts import Patch, Tests
+from diffs import unified_diff
+from nodes import critic_agent
+from sandbox import Sandbox
+
+TESTS = "def test_one():\n    assert False\n\n\ndef test_two():\n    assert True\n"
+
+
+def test_sandbox_counts_results_and_caches_pairs():
+    sandbox = Sandbox(workers=2)
+    first = sandbox.run(TESTS, "")
+    assert (first.passed, first.failed, first.score) == (1, 1, 0.5)
+    fixed = "".join(
+        unified_diff(TESTS, TESTS.replace("False", "True"), "a/tests.py", "b/tests.py")
+    )
+    assert sandbox.run(TESTS, fixed).score == 1.0
+
+    again = sandbox.run(TESTS, "")
+    assert again.cached and again.score == 0.5
+    assert sandbox.stats()["misses"] == 2
+
+
+def test_sandbox_shares_in_flight_runs():
+    sandbox = Sandbox(workers=2)
+    futures = [sandbox.submit(TESTS, "") for _ in range(3)]
+    assert len({id(f) for f in futures}) == 1
+    assert futures[0].result().failed == 1
+
+
+def test_sandbox_kills_slow_runs_without_caching():
+    sandbox = Sandbox(timeout=0.5)
+    result = sandbox.run("def test_spin():\n    while True:\n        pass\n", "")
+    assert result.timed_out and result.score == 0.0
+    assert sandbox.stats()["cached"] == 0
+
+
+def test_critic_charges_job_budget(monkeypatch):
+    monkeypatch.setattr(critic_agent, "get_sandbox", lambda: Sandbox())
+    state = {"tests": Tests(code=TESTS), "patch": Patch(diff="")}
+    result = critic_agent.critic_node(state)
+    assert result["critique"].score == 0.5
+    assert result["test_seconds"] > 0
+
+    monkeypatch.setattr(critic_agent, "SANDBOX_JOB_BUDGET", 1.0)
+    result = critic_agent.critic_node({**state, "test_seconds": 1.0})
+    assert result["critique"].score == 0.0
+    assert "budget" in result["critique"].feedback
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+import pytest
+
+from scheduler import JobScheduler, QueueFull
+
+
+@pytest.mark.asyncio
+async def test_bounded_queue():
+    scheduler = JobScheduler(workers=1, max_pending=1)
+    release = threading.Event()
+    scheduler.submit("a", release.wait)
+    await asyncio.sleep(0.05)
+    assert scheduler.stats()["active"] == 1
+
+    scheduler.submit("b", lambda: None)
+    assert scheduler.status("b")["position"] == 1
+    with pytest.raises(QueueFull) as exc:
+        scheduler.submit("c", lambda: None)
+    assert exc.value.retry_after >= 1
+
+    release.set()
+    while scheduler.stats()["finished"] < 2:
+        await asyncio.sleep(0.01)
+    assert scheduler.stats()["queued"] == 0
+    scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_frees_worker():
+    scheduler = JobScheduler(workers=1, max_pending=2)
+
+    def boom():
+        raise RuntimeError("boom")
+
+    scheduler.submit("a", boom)
+    scheduler.submit("b", lambda: None)
+    while scheduler.stats()["finished"] < 2:
+        await asyncio.sleep(0.01)
+    assert scheduler.stats()["active"] == 0
+    scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_coroutine_jobs_run_on_loop():
+    scheduler = JobScheduler(workers=100, max_pending=100)
+    release = asyncio.Event()
+    done = []
+
+    async def job():
+        await release.wait()
+        done.append(threading.current_thread())
+
+    for i in range(100):
+        scheduler.submit(str(i), job)
+    await asyncio.sleep(0.01)
+    assert scheduler.stats()["active"] == 100
+    release.set()
+    while scheduler.stats()["finished"] < 100:
+        await asyncio.sleep(0.01)
+    assert set(done) == {threading.main_thread()}
+    scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_and_running_jobs():
+    scheduler = JobScheduler(workers=1, max_pending=2)
+    started = asyncio.Event()
+
+    async def forever():
+        started.set()
+        await asyncio.sleep(60)
+
+    scheduler.submit("running", forever)
+    scheduler.submit("queued", forever)
+    await started.wait()
+    assert scheduler.cancel("queued") == "queued"
+    assert scheduler.cancel("running") == "running"
+    assert scheduler.cancel("unknown") is None
+    while scheduler.stats()["cancelled"] < 2:
+        await asyncio.sleep(0.01)
+    assert scheduler.stats()["active"] == 0
+    assert scheduler.stats()["queued"] == 0
+    scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_thread_job_keeps_worker_until_it_returns():
+    scheduler = JobScheduler(workers=1, max_pending=1)
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait()
+
+    scheduler.submit("a", job)
+    while not started.is_set():
+        await asyncio.sleep(0.01)
+    scheduler.submit("b", lambda: None)
+    try:
+        assert scheduler.cancel("a") == "running"
+        await asyncio.sleep(0.05)
+        assert scheduler.stats()["active"] == 1
+        assert scheduler.status("b")["position"] == 1
+    finally:
+        release.set()
+    while scheduler.stats()["finished"] < 1:
+        await asyncio.sleep(0.01)
+    assert scheduler.stats()["cancelled"] == 1
+    assert scheduler.stats()["finished"] == 1
+    scheduler.shutdown()
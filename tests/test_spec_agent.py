@@ -3,6 +3,8 @@ from types import SimpleNamespace
 import pytest
 from contracts import FeatureRequest
 from nodes import spec_agent
+from prompts import PromptRepository
+from routing import Router
 
 
 class DummyPredictor:
@@ -10,15 +12,17 @@ class DummyPredictor:
         self.content = content
         self.tokens = tokens
 
+    async def acall(self, user_story: str):
+        return self(user_story)
+
     def __call__(self, user_story: str):
+        usage = {"openrouter/test": {"total_tokens": self.tokens}}
         return SimpleNamespace(
             endpoint=self.content["endpoint"],
             method=self.content["method"],
             request_schema=json.dumps(self.content["request_schema"]),
             response_schema=json.dumps(self.content["response_schema"]),
-            _raw_output=SimpleNamespace(
-                usage=SimpleNamespace(total_tokens=self.tokens)
-            ),
+            get_lm_usage=lambda: usage,
         )
 
 
@@ -72,4 +76,93 @@ def test_budget_exceeded(monkeypatch):
 
     monkeypatch.setattr(spec_agent, "_call_llm", fake_call)
     with pytest.raises(ValueError):
-        spec_agent.spec_node({"feature_request": FeatureRequest(user_story="demo")})
\ No newline at end of file
+        spec_agent.spec_node({"feature_request": FeatureRequest(user_story="demo")})
+
+
+class FakeSimba:
+    compiled = 0
+
+    def __init__(self, **kwargs):
+        pass
+
+    def compile(self, student, trainset, seed):
+        FakeSimba.compiled += 1
+        return student
+
+
+def test_predictor_artifact_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(spec_agent, "ARTIFACT_DIR", str(tmp_path))
+    monkeypatch.setattr("dspy.teleprompt.SIMBA", FakeSimba)
+    monkeypatch.setattr(spec_agent, "spec_predictor", None)
+    FakeSimba.compiled = 0
+
+    first = spec_agent.get_spec_predictor()
+    assert spec_agent.get_spec_predictor() is first
+    assert spec_agent.artifact_path().exists()
+    assert FakeSimba.compiled == 1
+
+    monkeypatch.setattr(spec_agent, "spec_predictor", None)
+    spec_agent.get_spec_predictor()
+    assert FakeSimba.compiled == 1
+
+    spec_agent.compile_spec_predictor(force=True)
+    assert FakeSimba.compiled == 2
+
+
+def test_artifact_key_tracks_inputs(monkeypatch):
+    key = spec_agent.artifact_key()
+    monkeypatch.setattr(spec_agent, "SEED", spec_agent.SEED + 1)
+    assert spec_agent.artifact_key() != key
+    key = spec_agent.artifact_key()
+    router = Router(routes={"spec": ("other/model",)})
+    monkeypatch.setattr(spec_agent, "get_router", lambda: router)
+    assert spec_agent.artifact_key() != key
+
+
+def test_signature_instructions_come_from_prompt_repository(monkeypatch, tmp_path):
+    (tmp_path / "spec_extractor.md").write_text("Return the API spec as JSON.\n")
+    key = spec_agent.artifact_key()
+    prompts = PromptRepository(tmp_path)
+    monkeypatch.setattr(spec_agent, "get_prompts", lambda: prompts)
+    spec_agent.spec_signature.cache_clear()
+    try:
+        signature = spec_agent.spec_signature()
+        assert signature.instructions == "Return the API spec as JSON."
+        assert spec_agent.artifact_key() != key
+    finally:
+        spec_agent.spec_signature.cache_clear()
+
+
+def test_llm_cache(monkeypatch):
+    from utils import ResponseCache
+    from utils import cache as cache_module
+
+    payload = {
+        "endpoint": "/files",
+        "method": "GET",
+        "request_schema": {},
+        "response_schema": {},
+    }
+    monkeypatch.setattr(
+        cache_module, "_response_cache", ResponseCache(path=None, enabled=True)
+    )
+    monkeypatch.setattr(spec_agent, "spec_predictor", DummyPredictor(payload, 5))
+    assert spec_agent._call_llm("list files") == (payload, 5)
+    assert spec_agent._call_llm("list files") == (payload, 0)
+    assert spec_agent._call_llm("list files", bypass_cache=True) == (payload, 5)
+
+
+@pytest.mark.asyncio
+async def test_async_node(monkeypatch):
+    payload = {
+        "endpoint": "/files",
+        "method": "POST",
+        "request_schema": {},
+        "response_schema": {},
+    }
+    monkeypatch.setattr(spec_agent, "spec_predictor", DummyPredictor(payload, 42))
+    result = await spec_agent.aspec_node(
+        {"feature_request": FeatureRequest(user_story="upload")}
+    )
+    assert result["spec"].endpoint == "/files"
+    assert result["token_count"] == 42
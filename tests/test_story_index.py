@@ -0,0 +1,141 @@
+import json
+import threading
+
+import pytest
+
+from contracts import FeatureRequest
+from nodes import spec_agent
+from story_index import StoryIndex, normalise
+
+SPEC = {
+    "endpoint": "/files",
+    "method": "POST",
+    "request_schema": {},
+    "response_schema": {},
+}
+
+
+def _index(path=None, **kwargs):
+    return StoryIndex(path=path, enabled=True, **kwargs)
+
+
+def test_paraphrase_reuses_and_near_story_hints():
+    index = _index()
+    index.add("upload a file", SPEC)
+    index.add("As an admin I want to delete old invoices", {"endpoint": "/x"})
+
+    assert normalise("Let users upload files") == "upload file"
+    match = index.lookup("Let users upload files")
+    assert match.reuse and match.similarity == 1.0 and match.spec == SPEC
+
+    hint = index.lookup("upload a large file")
+    assert hint is not None and not hint.reuse
+    assert hint.spec == SPEC and 0.5 <= hint.similarity < 0.8
+
+    assert index.lookup("show the weather forecast") is None
+    assert index.stats() == {"enabled": True, "lookups": 3, "reused": 1, "hinted": 1}
+
+
+def test_index_persists_and_replaces_duplicates(tmp_path):
+    path = tmp_path / "stories.sqlite"
+    first = _index(path)
+    first.add("upload a file", SPEC)
+    first.add("Upload files!", {**SPEC, "endpoint": "/uploads"})
+    assert len(first) == 1
+
+    match = _index(path).lookup("upload a file")
+    assert match.spec["endpoint"] == "/uploads"
+
+
+def test_scopes_do_not_match_each_other():
+    index = _index()
+    index.add("upload a file", SPEC, scope="/repo/a")
+    assert index.lookup("upload a file", scope="/repo/a").reuse
+    assert index.lookup("upload a file", scope="/repo/b") is None
+    assert index.lookup("upload a file") is None
+
+
+def test_disabled_index_does_nothing():
+    index = StoryIndex(path=None, enabled=False)
+    index.add("upload a file", SPEC)
+    assert index.lookup("upload a file") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_async", [False, True])
+async def test_spec_node_reuses_similar_story(tmp_path, monkeypatch, use_async):
+    index = _index()
+    monkeypatch.setattr(spec_agent, "get_story_index", lambda: index)
+    prompts = []
+    tokens = 5
+
+    def fake_call(text, bypass_cache=False):
+        prompts.append(text)
+        return dict(SPEC), tokens
+
+    async def fake_acall(text, bypass_cache=False):
+        return fake_call(text, bypass_cache)
+
+    monkeypatch.setattr(spec_agent, "_call_llm", fake_call)
+    monkeypatch.setattr(spec_agent, "_acall_llm", fake_acall)
+
+    async def run(story, **state):
+        state["feature_request"] = FeatureRequest(user_story=story)
+        if use_async:
+            return await spec_agent.aspec_node(state)
+        return spec_agent.spec_node(state)
+
+    first = await run("upload a file")
+    assert first["token_count"] == 5 and len(prompts) == 1
+
+    reused = await run("Let users upload files")
+    assert reused["token_count"] == 0 and len(prompts) == 1
+    assert reused["spec"] == first["spec"]
+
+    # less similar: one LLM call, with the stored story as an example
+    await run("upload a large file")
+    assert len(prompts) == 2
+    assert "A similar earlier story" in prompts[1]
+    assert json.dumps(SPEC) in prompts[1]
+
+    # no_cache skips the index
+    await run("upload a file", no_cache=True)
+    assert len(prompts) == 3
+
+    # specs written against a repository stay with it
+    await run("upload a file", repo_path=str(tmp_path))
+    assert len(prompts) == 4
+    await run("upload a file", repo_path=str(tmp_path))
+    assert len(prompts) == 4
+
+    # a spec over the token budget is not remembered
+    tokens = spec_agent.MAX_TOKENS
+    with pytest.raises(ValueError, match="budget"):
+        await run("export the audit log as csv")
+    assert index.lookup("export the audit log as csv") is None
+
+
+@pytest.mark.asyncio
+async def test_async_spec_node_keeps_index_off_the_event_loop(monkeypatch):
+    index = _index()
+    monkeypatch.setattr(spec_agent, "get_story_index", lambda: index)
+    threads = []
+
+    def recorded(method):
+        def call(*args):
+            threads.append(threading.current_thread())
+            return method(*args)
+
+        return call
+
+    monkeypatch.setattr(index, "lookup", recorded(index.lookup))
+    monkeypatch.setattr(index, "add", recorded(index.add))
+
+    async def fake_acall(text, bypass_cache=False):
+        return dict(SPEC), 5
+
+    monkeypatch.setattr(spec_agent, "_acall_llm", fake_acall)
+    state = {"feature_request": FeatureRequest(user_story="upload a file")}
+    await spec_agent.aspec_node(state)
+    assert len(threads) == 2
+    assert threading.current_thread() not in threads
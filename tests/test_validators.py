@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from jsonschema import ValidationError
+
+from utils import SchemaRegistry, validate_envelope, validate_envelopes, validators
+
+SCHEMA_DIR = Path("schemas/mcp")
+
+
+def _spec_envelope(**payload):
+    base = {
+        "endpoint": "/files",
+        "method": "GET",
+        "request_schema": "{}",
+        "response_schema": "{}",
+    }
+    return {"context": {}, "payload": {**base, **payload}, "tool_calls": []}
+
+
+def test_validate_envelope():
+    validate_envelope(_spec_envelope(), "spec")
+    with pytest.raises(ValidationError):
+        validate_envelope({"payload": {}}, "spec")
+
+
+def test_validate_envelopes_batch():
+    bad = _spec_envelope(method=1)
+    results = validate_envelopes([_spec_envelope(), bad, {"payload": {}}], "spec")
+    assert results[0] is None
+    assert isinstance(results[1], ValidationError)
+    assert isinstance(results[2], ValidationError)
+
+
+def test_registry_compiles_once():
+    registry = SchemaRegistry(SCHEMA_DIR, check_interval=60)
+    first = registry.get("critique")
+    assert registry.get("critique") is first
+    with pytest.raises(FileNotFoundError):
+        registry.get("missing")
+
+
+def test_registry_reloads_on_change(tmp_path):
+    schema_dir = tmp_path / "mcp"
+    shutil.copytree(SCHEMA_DIR, schema_dir)
+    registry = SchemaRegistry(schema_dir, check_interval=0)
+    envelope = {"context": {}, "payload": {"score": 1, "feedback": "ok"}}
+    registry.validate(envelope, "critique")
+
+    path = schema_dir / "envelope.json"
+    schema = json.loads(path.read_text())
+    schema["required"].append("tool_calls")
+    path.write_text(json.dumps(schema))
+    registry.refresh(force=True)
+
+    with pytest.raises(ValidationError):
+        registry.validate(envelope, "critique")
+
+
+def test_registry_rechecks_mtimes_after_interval(tmp_path, monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(
+        validators, "time", SimpleNamespace(monotonic=lambda: clock.now)
+    )
+    schema_dir = tmp_path / "mcp"
+    shutil.copytree(SCHEMA_DIR, schema_dir)
+    registry = SchemaRegistry(schema_dir, check_interval=60)
+    first = registry.get("critique")
+
+    path = schema_dir / "critique.json"
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    clock.now += 30
+    registry.refresh()
+    assert registry.get("critique") is first
+
+    clock.now += 31
+    registry.refresh()
+    assert registry.get("critique") is not first
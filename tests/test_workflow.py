@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+
+from contracts import Critique, FeatureRequest, Patch, Tests
+from graph import workflow
+from nodes import spec_agent
+
+
+@pytest.fixture()
+def fake_spec(monkeypatch):
+    async def fake_acall(user_story, bypass_cache=False):
+        payload = {
+            "endpoint": "/files",
+            "method": "POST",
+            "request_schema": {},
+            "response_schema": {},
+        }
+        return payload, 3
+
+    monkeypatch.setattr(spec_agent, "_acall_llm", fake_acall)
+
+
+@pytest.mark.asyncio
+async def test_async_graph(fake_spec):
+    graph = workflow.create_graph(async_mode=True)
+    steps = []
+    async for event in graph.astream(
+        {"feature_request": FeatureRequest(user_story="upload a file")}
+    ):
+        steps.extend(event)
+    assert steps[:4] == ["spec", "tests", "code", "critic"]
+
+    state = await graph.ainvoke(
+        {"feature_request": FeatureRequest(user_story="upload a file")}
+    )
+    assert state["spec"].endpoint == "/files"
+    assert state["critique"].score >= 0.8
+
+
+SCORES = [0.3, 0.6, 0.5, 0.9]
+
+
+def fake_code(state):
+    return {"patch": Patch(diff=str(state["candidate"]))}
+
+
+def fake_critic(state):
+    return {"critique": Critique(score=SCORES[int(state["patch"].diff)], feedback="")}
+
+
+def test_best_of_n_keeps_highest_score():
+    node = workflow.best_of_n(fake_code, fake_critic, 3, 3, accept=1.0)
+    result = node({"tests": Tests(code="")})
+    assert result["patch"].diff == "1"
+    assert result["critique"].score == 0.6
+
+
+def test_best_of_n_stops_at_accept_score():
+    seen = []
+
+    def code(state):
+        seen.append(state["candidate"])
+        if state["candidate"] > 1:
+            time.sleep(0.05)
+        return fake_code(state)
+
+    node = workflow.best_of_n(code, fake_critic, 4, 1, accept=0.5)
+    assert node({})["critique"].score == 0.6
+    assert 3 not in seen
+
+
+@pytest.mark.asyncio
+async def test_abest_of_n_runs_candidates_concurrently():
+    running = []
+    peak = []
+
+    async def code(state):
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return fake_code(state)
+
+    async def critic(state):
+        return fake_critic(state)
+
+    node = workflow.abest_of_n(code, critic, 4, 2, accept=0.95)
+    result = await node({})
+    assert result["patch"].diff == "3"
+    assert max(peak) == 2
+
+
+@pytest.mark.asyncio
+async def test_fan_out_graph_skips_critic_node(fake_spec):
+    graph = workflow.create_graph(async_mode=True, candidates=3)
+    steps = []
+    async for event in graph.astream(
+        {"feature_request": FeatureRequest(user_story="upload a file")}
+    ):
+        steps.extend(event)
+    assert steps == ["spec", "tests", "code"]
+
+
+@pytest.mark.asyncio
+async def test_accept_score_decides_when_to_repair(fake_spec):
+    graph = workflow.create_graph(async_mode=True, accept_score=1.1)
+    state = await graph.ainvoke(
+        {"feature_request": FeatureRequest(user_story="upload a file")}
+    )
+    assert state["critique"].score < 1.1
+    assert state["attempts"] == 3